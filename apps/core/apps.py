@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.core'
+    verbose_name = 'Project Tools'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core import checks
+        from config.throttling import check_cache_store, check_shared_cache
+        checks.register(check_cache_store, checks.Tags.caches)
+        checks.register(check_shared_cache, checks.Tags.caches, deploy=True)
+        if settings.SLOW_QUERY_ENABLED:
+            from config.slow_queries import install
+            install()
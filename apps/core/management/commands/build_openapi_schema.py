@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.openapi import content_hash, generate_schema, read_manifest, write_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema into content-hashed files served by the docs views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error if the committed schema is out of date')
+
+    def handle(self, *args, **options):
+        directory = settings.OPENAPI_SCHEMA_DIR
+        documents = generate_schema()
+
+        if options['check']:
+            manifest = read_manifest(directory) or {}
+            stale = [
+                fmt for fmt, content in documents.items()
+                if manifest.get(fmt, {}).get('etag') != content_hash(content)
+            ]
+            if stale:
+                raise CommandError(
+                    f'OpenAPI schema in {directory} is out of date ({", ".join(stale)}), '
+                    f'run "python manage.py build_openapi_schema" and commit the result.'
+                )
+            self.stdout.write(self.style.SUCCESS('OpenAPI schema is up to date'))
+            return
+
+        manifest = write_schema(documents, directory)
+        for fmt, entry in sorted(manifest.items()):
+            self.stdout.write(f'{fmt}: {directory / entry["file"]}')
+        self.stdout.write(self.style.SUCCESS('OpenAPI schema written'))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import QueryFingerprint, SlowQuery
+from apps.core.views import FINGERPRINT_ORDERINGS
+from config.slow_queries import recorder
+
+
+class Command(BaseCommand):
+    help = 'Show query statistics per fingerprint and the latest slow queries with their plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', choices=list(FINGERPRINT_ORDERINGS), default='total')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--fingerprint', help='Only slow queries of this fingerprint')
+        parser.add_argument('--plans', action='store_true', help='Print the plan of each slow query')
+        parser.add_argument('--reset', action='store_true',
+                            help='Delete all statistics and slow queries')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            fingerprints = QueryFingerprint.objects.all().delete()[0]
+            slow_queries = SlowQuery.objects.all().delete()[0]
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {fingerprints} fingerprints and {slow_queries} slow queries'
+            ))
+            return
+        if options['limit'] < 1:
+            raise CommandError('--limit must be positive')
+
+        recorder.flush()
+        if not options['fingerprint']:
+            self.stdout.write(f'{"fingerprint":<17}{"tenant":>7}{"calls":>10}{"slow":>8}{"total ms":>12}'
+                              f'{"avg ms":>10}{"max ms":>10}  sql')
+            fingerprints = (QueryFingerprint.objects.filter(calls__gt=0)
+                            .order_by(FINGERPRINT_ORDERINGS[options['order']])[:options['limit']])
+            for entry in fingerprints:
+                self.stdout.write(
+                    f'{entry.fingerprint:<17}{entry.tenant_id or "-":>7}{entry.calls:>10}{entry.slow_calls:>8}'
+                    f'{entry.total_ms:>12.1f}{entry.avg_ms:>10.2f}{entry.max_ms:>10.1f}  {entry.sql[:120]}'
+                )
+            self.stdout.write('')
+
+        slow_queries = SlowQuery.objects.order_by('-created_at')
+        if options['fingerprint']:
+            slow_queries = slow_queries.filter(fingerprint=options['fingerprint'])
+        for entry in slow_queries[:options['limit']]:
+            self.stdout.write(
+                f'{entry.created_at:%Y-%m-%d %H:%M:%S} {entry.duration_ms:.1f}ms '
+                f'{entry.url_name or "-"} role={entry.role or "-"} db={entry.database} '
+                f'[{entry.fingerprint}]'
+            )
+            self.stdout.write(f'  {entry.sql}')
+            if options['plans'] and entry.plan:
+                for line in entry.plan.splitlines():
+                    self.stdout.write(f'    {line}')
@@ -0,0 +1,47 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.startup import import_time_report
+
+
+class Command(BaseCommand):
+    help = 'Report per-module import time of a worker boot and check it against the budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', default='api', choices=['api', 'full'],
+                            help='APP_PROFILE of the measured boot (default: api)')
+        parser.add_argument('--entry-point', default='config.wsgi')
+        parser.add_argument('--budget-ms', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS,
+                            help='Fail when the total import time exceeds this')
+        parser.add_argument('--top', type=int, default=20, help='Modules and packages to list')
+        parser.add_argument('--output', help='Also write the full report as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            report = import_time_report(options['entry_point'], options['profile'])
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        top = options['top']
+        self.stdout.write('Packages (self time):')
+        for entry in report['packages'][:top]:
+            self.stdout.write(f'  {entry["self_ms"]:>9.1f} ms  {entry["package"]}')
+        self.stdout.write('Modules (self time / cumulative):')
+        for entry in report['modules'][:top]:
+            chain = ' < '.join(entry['imported_by'][:4])
+            self.stdout.write(
+                f'  {entry["self_ms"]:>9.1f} ms  {entry["cumulative_ms"]:>9.1f} ms  {entry["module"]}'
+                + (f'  (via {chain})' if chain else '')
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        total, budget = report['total_ms'], options['budget_ms']
+        summary = f'{options["profile"]} profile imports took {total:.1f} ms (budget {budget:.0f} ms)'
+        if total > budget:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=16, unique=True)),
+                ('sql', models.TextField(help_text='Normalized SQL, literals replaced by ?')),
+                ('calls', models.BigIntegerField(default=0)),
+                ('slow_calls', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Query fingerprint',
+                'verbose_name_plural': 'Query fingerprints',
+                'db_table': 'query_fingerprints',
+            },
+        ),
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(db_index=True, max_length=16)),
+                ('sql', models.TextField(help_text='As executed, parameters not stored')),
+                ('duration_ms', models.FloatField()),
+                ('database', models.CharField(max_length=64)),
+                ('url_name', models.CharField(blank=True, max_length=200)),
+                ('role', models.CharField(blank=True, max_length=20)),
+                ('tenant_id', models.BigIntegerField(blank=True, null=True)),
+                ('plan', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Slow query',
+                'verbose_name_plural': 'Slow queries',
+                'db_table': 'slow_queries',
+            },
+        ),
+    ]
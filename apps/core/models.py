@@ -0,0 +1,65 @@
+from django.db import models
+from django.utils import timezone
+
+from apps.tenants.models import Tenant, TenantManager
+
+
+class QueryFingerprint(models.Model):
+    """
+    Execution statistics of one normalized statement in one tenant, summed
+    over every worker by ``config.slow_queries``
+    """
+    # Null for queries run outside a tenant, e.g. by management commands
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='+')
+    fingerprint = models.CharField(max_length=16)
+    sql = models.TextField(help_text='Normalized SQL, literals replaced by ?')
+    calls = models.BigIntegerField(default=0)
+    slow_calls = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    objects = TenantManager()
+
+    class Meta:
+        db_table = 'query_fingerprints'
+        verbose_name = 'Query fingerprint'
+        verbose_name_plural = 'Query fingerprints'
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'fingerprint'],
+                                    condition=models.Q(tenant__isnull=False),
+                                    name='query_fingerprints_tenant_uniq'),
+            models.UniqueConstraint(fields=['fingerprint'],
+                                    condition=models.Q(tenant__isnull=True),
+                                    name='query_fingerprints_global_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.fingerprint}: {self.sql[:80]}"
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+class SlowQuery(models.Model):
+    """One execution over ``SLOW_QUERY_THRESHOLD_MS``, with its plan"""
+    fingerprint = models.CharField(max_length=16, db_index=True)
+    sql = models.TextField(help_text='As executed, parameters not stored')
+    duration_ms = models.FloatField()
+    database = models.CharField(max_length=64)
+    url_name = models.CharField(max_length=200, blank=True)
+    role = models.CharField(max_length=20, blank=True)
+    tenant_id = models.BigIntegerField(null=True, blank=True)
+    plan = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = 'slow_queries'
+        verbose_name = 'Slow query'
+        verbose_name_plural = 'Slow queries'
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f}ms {self.url_name or '-'}: {self.sql[:80]}"
@@ -0,0 +1,24 @@
+from rest_framework import serializers
+
+from .models import QueryFingerprint, SlowQuery
+
+
+class QueryFingerprintSerializer(serializers.ModelSerializer):
+    avg_ms = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = QueryFingerprint
+        fields = ('fingerprint', 'sql', 'calls', 'slow_calls', 'total_ms', 'avg_ms',
+                  'max_ms', 'first_seen', 'last_seen')
+
+
+class SlowQuerySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SlowQuery
+        fields = ('id', 'fingerprint', 'sql', 'duration_ms', 'database', 'url_name',
+                  'role', 'plan', 'created_at')
+
+
+class SlowQueryListSerializer(SlowQuerySerializer):
+    class Meta(SlowQuerySerializer.Meta):
+        fields = tuple(field for field in SlowQuerySerializer.Meta.fields if field != 'plan')
@@ -0,0 +1,15 @@
+from django.urls import path
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    # Request profiling (admins only)
+    path('profiles/', views.profile_list_view, name='profile-list'),
+    path('profiles/token/', views.profile_token_view, name='profile-token'),
+    path('profiles/<str:profile_id>/', views.profile_detail_view, name='profile-detail'),
+
+    # Slow query recorder (admins only)
+    path('slow-queries/', views.slow_query_list_view, name='slow-query-list'),
+    path('slow-queries/<int:pk>/', views.slow_query_detail_view, name='slow-query-detail'),
+]
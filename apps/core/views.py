@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db.models import F
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from apps.users.permissions import IsAdministrator
+from config import profiling
+from config.slow_queries import recorder
+from .models import QueryFingerprint, SlowQuery
+from .serializers import QueryFingerprintSerializer, SlowQueryListSerializer, SlowQuerySerializer
+
+# Orderings of the fingerprint statistics, shared with "manage.py slow_queries"
+FINGERPRINT_ORDERINGS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'calls': '-calls',
+    'slow': '-slow_calls',
+    'avg': (F('total_ms') / F('calls')).desc(),
+}
+
+
+@api_view(['POST'])
+@permission_classes([IsAdministrator])
+def profile_token_view(request):
+    """
+    Issue a token that profiles the requests carrying it (admins only)
+    Send it as the X-Profile-Token header or the _profile query parameter
+    """
+    if not settings.PROFILING_ENABLED:
+        return Response({'error': 'Profiling is disabled (PROFILING_ENABLED).'},
+                        status=status.HTTP_409_CONFLICT)
+    return Response({
+        'token': profiling.make_token(request.user),
+        'header': 'X-Profile-Token',
+        'query_param': profiling.QUERY_PARAM,
+        'expires_in': settings.PROFILING_TOKEN_MAX_AGE,
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdministrator])
+def profile_list_view(request):
+    """
+    Recorded request profiles of the current tenant, newest first (admins only)
+    """
+    return Response(profiling.list_profiles(tenant_id=request.tenant_id))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdministrator])
+def profile_detail_view(request, profile_id):
+    """
+    Summary of one profile (admins only), ?download=1 returns the pstats dump
+    """
+    summary_path = profiling.profile_path(profile_id, '.json')
+    if summary_path is None:
+        raise Http404
+    summary = profiling.read_summary(summary_path)
+    if summary.get('tenant_id') != request.tenant_id:
+        raise Http404
+
+    if request.query_params.get('download'):
+        dump = profiling.profile_path(profile_id, '.prof')
+        if dump is None:
+            raise Http404
+        return FileResponse(open(dump, 'rb'), as_attachment=True, filename=dump.name)
+    return Response(summary)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdministrator])
+def slow_query_list_view(request):
+    """
+    Query statistics per fingerprint and the latest slow queries of the
+    current tenant (admins only)
+
+    Query parameters:
+    - order: total (default), avg, max, calls or slow
+    - limit: number of fingerprints and slow queries (default 50, max 500)
+    """
+    ordering = FINGERPRINT_ORDERINGS.get(request.query_params.get('order', 'total'))
+    if ordering is None:
+        return Response({'error': f'order must be one of {", ".join(FINGERPRINT_ORDERINGS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(int(request.query_params.get('limit', 50)), 500)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Include what this worker has not flushed yet
+    recorder.flush()
+    # Scoped to the current tenant by its manager
+    fingerprints = QueryFingerprint.objects.filter(calls__gt=0).order_by(ordering)[:limit]
+    slow_queries = SlowQuery.objects.filter(tenant_id=request.tenant_id).order_by('-created_at')[:limit]
+    return Response({
+        'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+        'fingerprints': QueryFingerprintSerializer(fingerprints, many=True).data,
+        'slow_queries': SlowQueryListSerializer(slow_queries, many=True).data,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdministrator])
+def slow_query_detail_view(request, pk):
+    """
+    One slow query with its plan (admins only)
+    """
+    slow_query = get_object_or_404(SlowQuery, pk=pk, tenant_id=request.tenant_id)
+    return Response(SlowQuerySerializer(slow_query).data)
@@ -0,0 +1,22 @@
+from django.contrib import admin, messages
+
+from .models import Job
+from .queue import cancel
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'progress_done', 'progress_total',
+                    'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'task', 'created_at')
+    list_select_related = ('created_by',)
+    search_fields = ('task', 'idempotency_key', 'created_by__email')
+    raw_id_fields = ('created_by',)
+    ordering = ('-created_at',)
+    readonly_fields = ('worker', 'lease_expires_at', 'started_at', 'finished_at', 'result', 'error')
+    actions = ['cancel_jobs']
+
+    @admin.action(description='Cancel selected jobs', permissions=['change'])
+    def cancel_jobs(self, request, queryset):
+        cancelled = sum(cancel(job) for job in queryset.exclude(status__in=Job.FINISHED))
+        self.message_user(request, f'{cancelled} jobs cancelled or asked to stop.', messages.SUCCESS)
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.jobs.pool import MODES, run_pool
+from apps.jobs.registry import all_tasks
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers until interrupted (SIGINT/SIGTERM finish the running jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOBS_WORKERS)
+        parser.add_argument('--mode', choices=MODES, default=settings.JOBS_WORKER_MODE,
+                            help='Threads of this process, or one process per worker')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help='Seconds between two looks at an empty queue')
+        parser.add_argument('--task', action='append', dest='tasks',
+                            help='Only run jobs of this task, may be repeated')
+
+    def handle(self, *args, **options):
+        known = {registered.name for registered in all_tasks()}
+        unknown = set(options['tasks'] or ()) - known
+        if unknown:
+            raise CommandError(f'Unknown tasks: {", ".join(sorted(unknown))}. '
+                               f'Registered: {", ".join(sorted(known))}')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        self.stdout.write(
+            f'Starting {options["workers"]} {options["mode"]} workers'
+            f'{" (burst)" if options["burst"] else ""}, tasks: '
+            f'{", ".join(options["tasks"] or sorted(known))}'
+        )
+        run_pool(
+            options['workers'],
+            mode=options['mode'],
+            burst=options['burst'],
+            poll_interval=options['poll_interval'],
+            task_names=options['tasks'],
+        )
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from apps.tenants.models import TenantScopedModel
+
+
+class Job(TenantScopedModel):
+    """
+    One run of a registered task, queued in the database and executed by
+    "manage.py run_workers"
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    )
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                   null=True, blank=True, related_name='jobs')
+    # Unique per tenant, see Meta.constraints
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Not claimed before this time: retry backoff
+    run_after = models.DateTimeField(default=timezone.now)
+    cancel_requested = models.BooleanField(default=False)
+
+    # Claim of the running attempt, renewed by the worker's heartbeat
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+    progress_done = models.BigIntegerField(default=0)
+    progress_total = models.BigIntegerField(null=True, blank=True)
+    progress_message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'jobs'
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'idempotency_key'],
+                                    name='jobs_tenant_idempotency_uniq',
+                                    condition=models.Q(idempotency_key__isnull=False)),
+        ]
+        indexes = [
+            # Partial indexes: workers only look at queued and running jobs
+            models.Index(fields=['run_after'], name='jobs_queued_idx',
+                         condition=models.Q(status='queued')),
+            models.Index(fields=['lease_expires_at'], name='jobs_running_lease_idx',
+                         condition=models.Q(status='running')),
+            models.Index(fields=['tenant', '-created_at'], name='jobs_tenant_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.task} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED
+
+    @property
+    def percent(self):
+        if not self.progress_total:
+            return 100.0 if self.status == self.SUCCEEDED else None
+        return round(min(self.progress_done / self.progress_total, 1) * 100, 1)
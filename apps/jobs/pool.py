@@ -0,0 +1,74 @@
+"""
+Pool of job workers for "manage.py run_workers".
+
+Workers run as threads of this process, or as spawned processes for tasks
+that are CPU bound. SIGINT and SIGTERM stop claiming new jobs; running jobs
+are finished first. Nothing here touches the app registry at import time, so
+spawned processes can import it before setting Django up.
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.db import connections
+
+MODES = ('thread', 'process')
+
+
+def _process_main(stop_event, burst, poll_interval, task_names):
+    import django
+    django.setup()
+    # The parent turns SIGINT into stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    from .worker import Worker
+    name = f'{socket.gethostname()}:{os.getpid()}'
+    Worker(name, stop_event, poll_interval, task_names).run(burst)
+
+
+def run_pool(workers, mode='thread', burst=False, poll_interval=None, task_names=None):
+    """
+    Run ``workers`` workers until stopped by a signal or, with ``burst``,
+    until no job is due
+    """
+    if mode not in MODES:
+        raise ValueError(f'Unknown worker mode "{mode}", expected one of {", ".join(MODES)}')
+
+    if mode == 'process':
+        context = multiprocessing.get_context('spawn')
+        stop_event = context.Event()
+        # Children open their own connections
+        connections.close_all()
+        members = [
+            context.Process(target=_process_main, name=f'job-worker-{index}',
+                            args=(stop_event, burst, poll_interval, task_names))
+            for index in range(workers)
+        ]
+    else:
+        from .worker import Worker
+        stop_event = threading.Event()
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        members = [
+            threading.Thread(
+                target=Worker(f'{prefix}:{index}', stop_event, poll_interval, task_names).run,
+                args=(burst,), name=f'job-worker-{index}',
+            )
+            for index in range(workers)
+        ]
+
+    def stop(signum, frame):
+        stop_event.set()
+
+    previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for member in members:
+            member.start()
+        while any(member.is_alive() for member in members):
+            for member in members:
+                member.join(0.5)
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
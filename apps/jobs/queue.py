@@ -0,0 +1,112 @@
+"""
+Database-backed job queue.
+
+``enqueue`` stores a ``Job``; workers started by "manage.py run_workers"
+(see ``apps.jobs.worker``) claim due jobs, run their task and record the
+outcome. No broker is involved: the ``jobs`` table is the queue.
+
+An idempotency key makes enqueueing safe to repeat: the second request with
+the same key, in the same tenant, returns the job of the first one.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.tenants.context import get_current_tenant_id
+from apps.tenants.models import Tenant
+from .models import Job
+from .registry import get_task
+
+
+class UnknownTask(Exception):
+    """No task is registered under this name"""
+
+
+class IdempotencyConflict(Exception):
+    """The idempotency key was used for a different task or payload"""
+
+    def __init__(self, job):
+        super().__init__(f'Idempotency key already used by job #{job.pk} with another task or payload.')
+        self.job = job
+
+
+class Cancelled(Exception):
+    """Raised inside a task once its job was cancelled"""
+
+
+class PermanentError(Exception):
+    """Fails the job without retrying it"""
+
+
+def enqueue(task_name, payload=None, user=None, idempotency_key=None, run_after=None):
+    """
+    Queue a run of ``task_name`` in the current tenant. Returns
+    ``(job, created)``; ``created`` is ``False`` when ``idempotency_key``
+    matched an existing job.
+    """
+    registered = get_task(task_name)
+    if registered is None:
+        raise UnknownTask(f'Unknown task "{task_name}"')
+    payload = payload or {}
+    tenant_id = get_current_tenant_id() or Tenant.objects.get_default_id()
+
+    try:
+        with transaction.atomic():
+            job = Job.objects.create(
+                tenant_id=tenant_id,
+                task=task_name,
+                payload=payload,
+                created_by=user,
+                idempotency_key=idempotency_key or None,
+                max_attempts=registered.max_attempts or settings.JOBS_MAX_ATTEMPTS,
+                run_after=run_after or timezone.now(),
+            )
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        job = Job._base_manager.get(tenant_id=tenant_id, idempotency_key=idempotency_key)
+        if job.task != task_name or job.payload != payload:
+            raise IdempotencyConflict(job)
+        return job, False
+    return job, True
+
+
+def cancel(job):
+    """
+    Cancel a queued job right away; a running job is asked to stop and is
+    cancelled by its worker at the task's next progress report. Returns
+    ``False`` when the job had already finished.
+    """
+    jobs = Job._base_manager.filter(pk=job.pk)
+    cancelled = jobs.filter(status=Job.QUEUED).update(
+        status=Job.CANCELLED, cancel_requested=True, finished_at=timezone.now(),
+    )
+    if not cancelled:
+        cancelled = jobs.filter(status=Job.RUNNING).update(cancel_requested=True)
+    job.refresh_from_db()
+    return bool(cancelled)
+
+
+def artifact_dir():
+    return Path(settings.JOBS_ARTIFACT_DIR)
+
+
+def artifact_location(name):
+    """
+    Path of the artifact ``name`` recorded in a job result. Names are written
+    by JobRun.artifact_path, never a path: anything else is cut to its last
+    component, so a result can not point outside ``JOBS_ARTIFACT_DIR``.
+    """
+    return artifact_dir() / Path(name).name
+
+
+def artifact_file(job):
+    """File produced by a finished job, ``None`` when it has none"""
+    if job.status != Job.SUCCEEDED or not isinstance(job.result, dict):
+        return None
+    if not job.result.get('artifact'):
+        return None
+    path = artifact_location(job.result['artifact'])
+    return path if path.is_file() else None
@@ -0,0 +1,78 @@
+"""
+Registry of the tasks jobs can run.
+
+Apps declare tasks in their ``tasks`` module::
+
+    @task('users.archive', roles=('admin',), serializer=ArchiveJobSerializer)
+    def archive(run, retention_days=None):
+        ...
+        return {'users': archived}
+
+A task is called with a ``JobRun`` and the job payload as keyword arguments,
+inside the job's tenant. It reports progress with ``run.progress()``, which
+also raises ``Cancelled`` once cancellation was requested. The return value,
+JSON serializable, becomes the job result.
+
+``roles`` may enqueue the task through the API; ``serializer`` validates the
+payload sent there.
+
+The ``tasks`` modules are imported on the first lookup, not at startup:
+web processes only need them once a job is queued or listed.
+"""
+import threading
+
+from django.utils.module_loading import autodiscover_modules
+
+
+class Task:
+    def __init__(self, name, func, roles, max_attempts=None, serializer=None):
+        self.name = name
+        self.func = func
+        self.roles = tuple(roles)
+        self.max_attempts = max_attempts
+        self.serializer = serializer
+        self.description = (func.__doc__ or '').strip().split('\n')[0]
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+
+_tasks = {}
+_discovered = False
+_discover_lock = threading.RLock()
+
+
+def _discover():
+    global _discovered
+    if _discovered:
+        return
+    with _discover_lock:
+        if not _discovered:
+            autodiscover_modules('tasks')
+            _discovered = True
+
+
+def task(name, roles=('admin',), max_attempts=None, serializer=None):
+    """Register the decorated function as task ``name``"""
+    def decorator(func):
+        if name in _tasks and _tasks[name].func is not func:
+            raise ValueError(f'Task "{name}" is already registered')
+        _tasks[name] = Task(name, func, roles, max_attempts, serializer)
+        return func
+    return decorator
+
+
+def get_task(name):
+    """The task registered as ``name``, ``None`` when unknown"""
+    _discover()
+    return _tasks.get(name)
+
+
+def tasks_for_role(role):
+    _discover()
+    return [registered for registered in _tasks.values() if role in registered.roles]
+
+
+def all_tasks():
+    _discover()
+    return list(_tasks.values())
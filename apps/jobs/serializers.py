@@ -0,0 +1,48 @@
+from rest_framework import serializers
+
+from .models import Job
+from .registry import get_task
+
+
+class JobProgressSerializer(serializers.Serializer):
+    done = serializers.IntegerField(source='progress_done')
+    total = serializers.IntegerField(source='progress_total', allow_null=True)
+    percent = serializers.FloatField(allow_null=True)
+    message = serializers.CharField(source='progress_message')
+
+
+class JobSerializer(serializers.ModelSerializer):
+    progress = JobProgressSerializer(source='*', read_only=True)
+
+    class Meta:
+        model = Job
+        fields = ('id', 'task', 'status', 'payload', 'idempotency_key', 'created_by',
+                  'attempts', 'max_attempts', 'run_after', 'cancel_requested', 'progress',
+                  'result', 'error', 'created_at', 'started_at', 'finished_at')
+        read_only_fields = fields
+
+
+class JobCreateSerializer(serializers.Serializer):
+    task = serializers.CharField(max_length=100)
+    payload = serializers.DictField(required=False, default=dict)
+    idempotency_key = serializers.CharField(max_length=100, required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        registered = get_task(attrs['task'])
+        user = self.context['request'].user
+        # Unknown tasks and tasks of other roles look the same
+        if registered is None or user.role not in registered.roles:
+            raise serializers.ValidationError({'task': f'Unknown task "{attrs["task"]}".'})
+
+        if registered.serializer is not None:
+            payload = registered.serializer(data=attrs['payload'])
+            if not payload.is_valid():
+                raise serializers.ValidationError({'payload': payload.errors})
+            # Representation, so dates and decimals are stored as JSON
+            attrs['payload'] = dict(payload.data)
+        return attrs
+
+
+class JobTaskSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    description = serializers.CharField()
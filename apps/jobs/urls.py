@@ -0,0 +1,13 @@
+from django.urls import path
+from . import views
+
+app_name = 'jobs'
+
+urlpatterns = [
+    # Background jobs, visible by role
+    path('jobs/', views.JobListView.as_view(), name='job-list'),
+    path('jobs/tasks/', views.job_task_list_view, name='job-task-list'),
+    path('jobs/<int:pk>/', views.JobDetailView.as_view(), name='job-detail'),
+    path('jobs/<int:pk>/cancel/', views.job_cancel_view, name='job-cancel'),
+    path('jobs/<int:pk>/artifact/', views.job_artifact_view, name='job-artifact'),
+]
@@ -0,0 +1,117 @@
+from django.db.models import Q
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters, generics, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from apps.users.permissions import IsAuthenticated
+from .models import Job
+from .queue import IdempotencyConflict, artifact_file, cancel, enqueue
+from .registry import tasks_for_role
+from .serializers import JobCreateSerializer, JobSerializer, JobTaskSerializer
+
+
+def visible_jobs(user):
+    """
+    Jobs of the current tenant ``user`` may follow: administrators see all,
+    moderators their own and those of regular users, users their own
+    """
+    jobs = Job.objects.all()
+    if user.is_administrator:
+        return jobs
+    elif user.is_moderator:
+        return jobs.filter(Q(created_by=user) | Q(created_by__role='user'))
+    return jobs.filter(created_by=user)
+
+
+class JobListView(generics.ListCreateAPIView):
+    """
+    List visible jobs, newest first, or queue a job
+    POST returns 200 with the existing job when idempotency_key was used before
+    """
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['status', 'task']
+    ordering_fields = ['created_at', 'finished_at']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation
+            return Job.objects.none()
+        return visible_jobs(self.request.user)
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return JobCreateSerializer
+        return JobSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job, created = enqueue(
+                serializer.validated_data['task'],
+                serializer.validated_data['payload'],
+                user=request.user,
+                idempotency_key=serializer.validated_data.get('idempotency_key'),
+            )
+        except IdempotencyConflict as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response(JobSerializer(job).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    """
+    Status, progress and result of a job
+    """
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation
+            return Job.objects.none()
+        return visible_jobs(self.request.user)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def job_cancel_view(request, pk):
+    """
+    Cancel a job (its creator or an administrator)
+    A queued job is cancelled at once (200), a running one at its next
+    progress report (202)
+    """
+    job = get_object_or_404(visible_jobs(request.user), pk=pk)
+    if job.created_by_id != request.user.pk and not request.user.is_administrator:
+        return Response({'error': 'Only the creator or an administrator can cancel a job.'},
+                        status=status.HTTP_403_FORBIDDEN)
+    if not cancel(job):
+        return Response({'error': f'Job already {job.status}.'}, status=status.HTTP_409_CONFLICT)
+    return Response(JobSerializer(job).data,
+                    status=status.HTTP_200_OK if job.is_finished else status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_artifact_view(request, pk):
+    """
+    Download the file produced by a succeeded job, e.g. an export
+    """
+    job = get_object_or_404(visible_jobs(request.user), pk=pk)
+    path = artifact_file(job)
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_task_list_view(request):
+    """
+    Tasks the caller's role may queue through POST /api/jobs/
+    """
+    tasks = sorted(tasks_for_role(request.user.role), key=lambda registered: registered.name)
+    return Response(JobTaskSerializer(tasks, many=True).data)
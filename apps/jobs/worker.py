@@ -0,0 +1,267 @@
+"""
+Job worker: claims due jobs and runs their task.
+
+Claiming is a conditional ``UPDATE`` of a queued row, picked with
+``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it, so any
+number of workers, threads or processes, can share the table.
+
+A claimed job carries a lease. The worker's heartbeat thread renews it every
+``HEARTBEAT_INTERVAL`` seconds and picks up cancellation requests; a job
+whose lease ran out (the worker was killed) is queued again by the next
+worker's maintenance sweep, or failed once out of attempts.
+
+A failing attempt is retried after an exponential backoff of
+``JOBS_RETRY_BACKOFF`` seconds, doubled per attempt up to
+``JOBS_RETRY_BACKOFF_MAX``, until ``max_attempts``. ``PermanentError``
+fails the job right away.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.tenants.context import tenant_context
+from .models import Job
+from .queue import Cancelled, PermanentError, artifact_dir, artifact_location
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two progress writes of one job
+PROGRESS_INTERVAL = 1.0
+# Seconds between two lease renewals and cancellation checks
+HEARTBEAT_INTERVAL = 5.0
+# Seconds between two sweeps for expired leases and old jobs, per worker
+MAINTENANCE_INTERVAL = 60.0
+
+
+def retry_delay(attempt):
+    """Seconds to wait after failed attempt number ``attempt``"""
+    delay = min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempt - 1), settings.JOBS_RETRY_BACKOFF_MAX)
+    # Jitter spreads the retries of jobs that failed together
+    return delay * random.uniform(0.75, 1.0)
+
+
+class JobRun:
+    """Handle passed to a task: progress, cancellation and artifacts of its job"""
+
+    def __init__(self, job, worker_name):
+        self.job = job
+        self.worker_name = worker_name
+        self.cancelled = threading.Event()
+        self._written_at = 0.0
+
+    @property
+    def user(self):
+        """User who enqueued the job, ``None`` for jobs queued by commands"""
+        return self.job.created_by
+
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise Cancelled(f'Job #{self.job.pk} was cancelled')
+
+    def progress(self, done, total=None, message=None):
+        """
+        Record progress, written at most once per ``PROGRESS_INTERVAL``.
+        Raises ``Cancelled`` when the job should stop.
+        """
+        self.check_cancelled()
+        job = self.job
+        job.progress_done = done
+        if total is not None:
+            job.progress_total = total
+        if message is not None:
+            job.progress_message = message[:255]
+
+        now = time.monotonic()
+        if now - self._written_at >= PROGRESS_INTERVAL:
+            self._written_at = now
+            Job._base_manager.filter(pk=job.pk, status=Job.RUNNING, worker=self.worker_name).update(
+                progress_done=job.progress_done,
+                progress_total=job.progress_total,
+                progress_message=job.progress_message,
+            )
+
+    def artifact_path(self, name):
+        """Path of a file produced by the job, served by /api/jobs/<id>/artifact/"""
+        directory = artifact_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f'{self.job.pk}-{name}'
+
+
+class Worker:
+    """Runs jobs one at a time until ``stop_event`` is set"""
+
+    def __init__(self, name, stop_event=None, poll_interval=None, task_names=None):
+        self.name = name
+        self.stop_event = stop_event or threading.Event()
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.task_names = task_names
+        self._lock = threading.Lock()
+        self._current = None
+        self._next_maintenance = 0.0
+
+    def run(self, burst=False):
+        """Claim and run jobs; with ``burst``, return once no job is due"""
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(done,),
+                                     name=f'{self.name}-heartbeat', daemon=True)
+        heartbeat.start()
+        logger.info('Worker %s started', self.name)
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                self.maintain()
+                job = self.claim()
+                if job is None:
+                    if burst:
+                        break
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                try:
+                    self.execute(job)
+                except Exception:
+                    # The job stays running until its lease expires and is then retried
+                    logger.exception('Worker %s could not record the outcome of job #%s',
+                                     self.name, job.pk)
+        finally:
+            done.set()
+            heartbeat.join()
+            connections.close_all()
+            logger.info('Worker %s stopped', self.name)
+
+    def claim(self):
+        """Mark the next due job as running on this worker, ``None`` when there is none"""
+        due = Job._base_manager.filter(status=Job.QUEUED, run_after__lte=timezone.now())
+        if self.task_names:
+            due = due.filter(task__in=self.task_names)
+
+        # Another worker may win the race where rows can not be locked
+        for _ in range(3):
+            now = timezone.now()
+            with transaction.atomic():
+                pk = (due.select_for_update(skip_locked=True).order_by('run_after', 'pk')
+                      .values_list('pk', flat=True).first())
+                if pk is None:
+                    return None
+                claimed = Job._base_manager.filter(pk=pk, status=Job.QUEUED).update(
+                    status=Job.RUNNING,
+                    worker=self.name,
+                    attempts=F('attempts') + 1,
+                    started_at=now,
+                    lease_expires_at=now + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+                )
+            if claimed:
+                return Job._base_manager.get(pk=pk)
+        return None
+
+    def execute(self, job):
+        run = JobRun(job, self.name)
+        with self._lock:
+            self._current = run
+        try:
+            registered = get_task(job.task)
+            try:
+                if registered is None:
+                    raise PermanentError(f'Unknown task "{job.task}"')
+                with tenant_context(job.tenant_id):
+                    result = registered.func(run, **job.payload)
+            except Cancelled:
+                close_old_connections()
+                self._finish(run, Job.CANCELLED)
+            except Exception as exc:
+                close_old_connections()
+                error = f'{type(exc).__name__}: {exc}'
+                if isinstance(exc, PermanentError) or job.attempts >= job.max_attempts:
+                    logger.exception('Job #%s (%s) failed', job.pk, job.task)
+                    self._finish(run, Job.FAILED, error=error)
+                else:
+                    delay = retry_delay(job.attempts)
+                    logger.warning('Job #%s (%s) failed attempt %s of %s, retrying in %.0fs',
+                                   job.pk, job.task, job.attempts, job.max_attempts, delay,
+                                   exc_info=True)
+                    self._retry(run, error, delay)
+            else:
+                self._finish(run, Job.SUCCEEDED, result=result)
+        finally:
+            with self._lock:
+                self._current = None
+
+    def _owned(self, job):
+        return Job._base_manager.filter(pk=job.pk, status=Job.RUNNING, worker=self.name)
+
+    def _finish(self, run, status, result=None, error=''):
+        job = run.job
+        updated = self._owned(job).update(
+            status=status,
+            result=result,
+            error=error,
+            finished_at=timezone.now(),
+            lease_expires_at=None,
+            progress_done=job.progress_done,
+            progress_total=job.progress_total,
+            progress_message=job.progress_message,
+        )
+        if not updated:
+            logger.warning('Job #%s is no longer leased by %s, outcome %s dropped',
+                           job.pk, self.name, status)
+
+    def _retry(self, run, error, delay):
+        self._owned(run.job).update(
+            status=Job.QUEUED,
+            error=error,
+            worker='',
+            lease_expires_at=None,
+            run_after=timezone.now() + timedelta(seconds=delay),
+        )
+
+    def _heartbeat(self, done):
+        while not done.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                run = self._current
+            if run is None:
+                continue
+            try:
+                lease = timezone.now() + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+                if not self._owned(run.job).update(lease_expires_at=lease):
+                    # Finished meanwhile, or taken over after an expired lease
+                    run.cancelled.set()
+                elif self._owned(run.job).filter(cancel_requested=True).exists():
+                    run.cancelled.set()
+            except DatabaseError:
+                logger.warning('Heartbeat of worker %s failed', self.name, exc_info=True)
+        connections.close_all()
+
+    def maintain(self):
+        """Recover jobs of dead workers and purge finished jobs past retention"""
+        if time.monotonic() < self._next_maintenance:
+            return
+        self._next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+        now = timezone.now()
+
+        expired = Job._base_manager.filter(status=Job.RUNNING, lease_expires_at__lt=now)
+        cancelled = expired.filter(cancel_requested=True).update(
+            status=Job.CANCELLED, finished_at=now, lease_expires_at=None,
+        )
+        failed = expired.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, error='Worker lost: lease expired', finished_at=now,
+            lease_expires_at=None,
+        )
+        requeued = expired.update(status=Job.QUEUED, worker='', lease_expires_at=None, run_after=now)
+        if cancelled or failed or requeued:
+            logger.warning('Expired leases: %s jobs requeued, %s failed, %s cancelled',
+                           requeued, failed, cancelled)
+
+        cutoff = now - timedelta(days=settings.JOBS_RETENTION_DAYS)
+        old = Job._base_manager.filter(status__in=Job.FINISHED, finished_at__lt=cutoff)
+        rows = list(old.values_list('pk', 'result')[:1000])
+        for _, result in rows:
+            if isinstance(result, dict) and result.get('artifact'):
+                artifact_location(result['artifact']).unlink(missing_ok=True)
+        Job._base_manager.filter(pk__in=[pk for pk, _ in rows]).delete()
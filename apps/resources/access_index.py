@@ -0,0 +1,607 @@
+"""
+Reverse access index: which users can read a resource, and which resources
+a user can read, without evaluating permissions object by object.
+
+Readers of a resource depend only on its effective level and its owner
+(``ACCESS_CEILINGS``): every active user of a role whose ``any`` ceiling
+covers the level, plus the owner when the level is above the owner's
+``any`` ceiling but within ``own``. The index keeps compressed bitmaps of
+user ids per role and of resource ids per effective level, and the
+(resource, owner) pairs of those owner exceptions, so membership and
+cardinality answers combine a handful of bitmaps.
+
+``refresh`` applies users saved (``updated_at``) and change feed entries
+logged since the previous refresh, re-encoding only the bitmap containers
+they touch. It runs in the resources.refresh_access_index job, queued by
+readers that find the index stale. The index of a tenant is one file in
+``ACCESS_INDEX_DIR``; every process maps it read-only and shares the pages,
+and a refreshed index atomically replaces the file.
+"""
+import fcntl
+import json
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from apps.tenants.context import get_current_tenant_id
+from apps.users.models import User
+from config.db_routing import pin_to_primary
+from .changefeed import settled_head
+from .models import ACCESS_CEILINGS, MockResource, ResourceChange
+
+ROLES = ('user', 'moderator', 'admin')
+LEVELS = (1, 2, 3, 4)
+# A container holds the ids sharing their upper 16 bits: a sorted uint16
+# array up to ARRAY_LIMIT ids, above that a 2**16 bit bitmap (8 KiB)
+ARRAY_LIMIT = 4096
+BITMAP_WORDS = 4096
+FETCH_CHUNK = 20000
+MAGIC = b'ACCESSIX'
+REFRESH_TASK = 'resources.refresh_access_index'
+FORMAT_VERSION = 1
+
+
+class Bitmap:
+    """Roaring-style compressed set of ids in ``[0, 2**32)``"""
+
+    def __init__(self, keys, cards, offsets, data):
+        # Upper 16 bits per container (sorted), ids per container, start of
+        # each container in ``data`` (uint16 low bits or bitmap words)
+        self.keys = keys
+        self.cards = cards
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def from_ids(cls, ids):
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if len(ids) and (ids[0] < 0 or ids[-1] >= 2 ** 32):
+            raise ValueError('Bitmap ids must be in [0, 2**32)')
+        keys, starts, counts = np.unique(ids >> 16, return_index=True, return_counts=True)
+        return cls._assemble(keys, counts, [_pack((ids[start:start + count] & 0xFFFF).astype(np.uint16))
+                                            for start, count in zip(starts, counts)])
+
+    @classmethod
+    def _assemble(cls, keys, cards, containers):
+        offsets = np.zeros(len(containers), dtype=np.int64)
+        np.cumsum([len(container) for container in containers[:-1]], out=offsets[1:])
+        return cls(
+            np.asarray(keys, dtype=np.uint32),
+            np.asarray(cards, dtype=np.uint32),
+            offsets,
+            np.concatenate(containers) if containers else np.zeros(0, dtype=np.uint16),
+        )
+
+    def __len__(self):
+        return int(self.cards.sum(dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.cards.nbytes + self.offsets.nbytes + self.data.nbytes
+
+    def _find(self, key):
+        index = int(np.searchsorted(self.keys, key))
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return None
+
+    def _low(self, index):
+        offset, card = int(self.offsets[index]), int(self.cards[index])
+        if card <= ARRAY_LIMIT:
+            return self.data[offset:offset + card]
+        words = self.data[offset:offset + BITMAP_WORDS].view(np.uint8)
+        return np.flatnonzero(np.unpackbits(words, bitorder='little')).astype(np.uint16)
+
+    def __contains__(self, value):
+        value = int(value)
+        if not 0 <= value < 2 ** 32:
+            return False
+        index = self._find(value >> 16)
+        if index is None:
+            return False
+        low, offset, card = value & 0xFFFF, int(self.offsets[index]), int(self.cards[index])
+        if card <= ARRAY_LIMIT:
+            array = self.data[offset:offset + card]
+            position = int(np.searchsorted(array, low))
+            return position < card and int(array[position]) == low
+        words = self.data[offset:offset + BITMAP_WORDS].view(np.uint8)
+        return bool(words[low >> 3] >> (low & 7) & 1)
+
+    def contains(self, ids):
+        """Membership mask of an array of ids"""
+        ids = np.asarray(ids, dtype=np.int64)
+        found = np.zeros(len(ids), dtype=bool)
+        high = ids >> 16
+        for key in np.unique(high):
+            index = self._find(key)
+            if index is not None:
+                matched = high == key
+                found[matched] = np.isin((ids[matched] & 0xFFFF).astype(np.uint16), self._low(index))
+        return found
+
+    def to_ids(self):
+        """All ids, sorted, as int64"""
+        if not len(self.keys):
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([
+            (int(key) << 16) + self._low(index).astype(np.int64)
+            for index, key in enumerate(self.keys)
+        ])
+
+    def update(self, add=(), remove=()):
+        """New bitmap with ``remove`` taken out, then ``add`` put in"""
+        add = np.unique(np.asarray(add, dtype=np.int64))
+        remove = np.unique(np.asarray(remove, dtype=np.int64))
+        touched = set(np.union1d(add >> 16, remove >> 16).tolist())
+        keys, cards, containers = [], [], []
+        for key in np.union1d(self.keys, np.unique(add >> 16)).tolist():
+            index = self._find(key)
+            if key not in touched:
+                # Untouched containers are copied as encoded
+                offset, card = int(self.offsets[index]), int(self.cards[index])
+                keys.append(key)
+                cards.append(card)
+                containers.append(self.data[offset:offset + (card if card <= ARRAY_LIMIT else BITMAP_WORDS)])
+                continue
+            bits = np.zeros(2 ** 16, dtype=bool)
+            if index is not None:
+                bits[self._low(index)] = True
+            bits[remove[(remove >> 16) == key] & 0xFFFF] = False
+            bits[add[(add >> 16) == key] & 0xFFFF] = True
+            card = int(np.count_nonzero(bits))
+            if card:
+                keys.append(key)
+                cards.append(card)
+                containers.append(_pack_bits(bits, card))
+        return Bitmap._assemble(keys, cards, containers)
+
+
+def _pack(low):
+    if len(low) <= ARRAY_LIMIT:
+        return np.ascontiguousarray(low, dtype=np.uint16)
+    bits = np.zeros(2 ** 16, dtype=bool)
+    bits[low] = True
+    return _pack_bits(bits, len(low))
+
+
+def _pack_bits(bits, card):
+    if card <= ARRAY_LIMIT:
+        return np.flatnonzero(bits).astype(np.uint16)
+    return np.packbits(bits, bitorder='little').view(np.uint16)
+
+
+def _fetch(queryset, fields):
+    """``values_list`` rows as an int64 array"""
+    rows = queryset.order_by().values_list(*fields).iterator(chunk_size=FETCH_CHUNK)
+    flat = np.fromiter((value for row in rows for value in row), dtype=np.int64)
+    return flat.reshape(-1, len(fields))
+
+
+def _exceptions(rows, role_of):
+    """(resource, owner) pairs of ``rows`` (pk, level, owner) readable only by their owner"""
+    resources, owners = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    roles = role_of(rows[:, 2])
+    for role in ROLES:
+        ceilings = ACCESS_CEILINGS[role]
+        if ceilings['own'] <= ceilings['any']:
+            continue
+        matched = (roles == role) & (rows[:, 1] > ceilings['any']) & (rows[:, 1] <= ceilings['own'])
+        resources.append(rows[matched, 0])
+        owners.append(rows[matched, 2])
+    return np.concatenate(resources), np.concatenate(owners)
+
+
+class AccessIndex:
+    """Role and level bitmaps of one tenant, with the owner exceptions"""
+
+    def __init__(self, meta, users, levels, exception_resources, exception_owners):
+        self.meta = meta
+        self.users = users
+        self.levels = levels
+        # Sorted by resource; at most one owner per resource
+        self.exception_resources = exception_resources
+        self.exception_owners = exception_owners
+
+    @property
+    def age(self):
+        return time.time() - self.meta['refreshed_at']
+
+    @property
+    def nbytes(self):
+        return (sum(bitmap.nbytes for bitmap in (*self.users.values(), *self.levels.values()))
+                + self.exception_resources.nbytes + self.exception_owners.nbytes)
+
+    def role_of(self, user_id):
+        """Role of an active user, ``None`` for unknown or inactive users"""
+        for role, bitmap in self.users.items():
+            if user_id in bitmap:
+                return role
+        return None
+
+    def level_of(self, resource_id):
+        for level, bitmap in self.levels.items():
+            if resource_id in bitmap:
+                return level
+        return None
+
+    def _roles_of(self, user_ids):
+        roles = np.full(len(user_ids), '', dtype=object)
+        for role, bitmap in self.users.items():
+            roles[bitmap.contains(user_ids)] = role
+        return roles
+
+    def exception_owner(self, resource_id):
+        position = int(np.searchsorted(self.exception_resources, resource_id))
+        if position < len(self.exception_resources) and self.exception_resources[position] == resource_id:
+            return int(self.exception_owners[position])
+        return None
+
+    def owner_exceptions(self, user_id):
+        return self.exception_resources[self.exception_owners == user_id]
+
+    def reader_roles(self, level):
+        return [role for role in ROLES if level <= ACCESS_CEILINGS[role]['any']]
+
+    def visible_levels(self, role):
+        return [level for level in LEVELS if level <= ACCESS_CEILINGS[role]['any']]
+
+    def can_read(self, user_id, resource_id):
+        role, level = self.role_of(user_id), self.level_of(resource_id)
+        if role is None or level is None:
+            return False
+        return role in self.reader_roles(level) or self.exception_owner(resource_id) == user_id
+
+    def reader_counts(self, resource_id):
+        """``(level, readers per role, owner exception)``, ``None`` for unknown resources"""
+        level = self.level_of(resource_id)
+        if level is None:
+            return None
+        readers = {role: len(self.users[role]) if role in self.reader_roles(level) else 0
+                   for role in ROLES}
+        owner = self.exception_owner(resource_id)
+        if owner is not None:
+            readers[self.role_of(owner)] += 1
+        return level, readers, owner
+
+    def readers(self, resource_id):
+        """Sorted ids of the active users that can read the resource"""
+        level = self.level_of(resource_id)
+        if level is None:
+            return np.zeros(0, dtype=np.int64)
+        parts = [self.users[role].to_ids() for role in self.reader_roles(level)]
+        owner = self.exception_owner(resource_id)
+        if owner is not None:
+            parts.append(np.array([owner], dtype=np.int64))
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def resource_counts(self, user_id):
+        """``(role, readable resources per level)``, ``None`` for unknown or inactive users"""
+        role = self.role_of(user_id)
+        if role is None:
+            return None
+        counts = {level: len(self.levels[level]) if level in self.visible_levels(role) else 0
+                  for level in LEVELS}
+        owned = self.owner_exceptions(user_id)
+        for level, bitmap in self.levels.items():
+            counts[level] += int(np.count_nonzero(bitmap.contains(owned)))
+        return role, counts
+
+    def resources(self, user_id):
+        """Sorted ids of the resources the user can read"""
+        role = self.role_of(user_id)
+        if role is None:
+            return np.zeros(0, dtype=np.int64)
+        parts = [self.levels[level].to_ids() for level in self.visible_levels(role)]
+        parts.append(self.owner_exceptions(user_id).astype(np.int64))
+        return np.sort(np.concatenate(parts))
+
+    def stats(self):
+        return {
+            'tenant': self.meta['tenant_id'],
+            'built_at': self.meta['built_at'],
+            'refreshed_at': datetime.fromtimestamp(self.meta['refreshed_at'], dt_timezone.utc).isoformat(),
+            'age_seconds': round(self.age, 1),
+            'change_cursor': self.meta['resource_cursor'],
+            'users': {role: len(bitmap) for role, bitmap in self.users.items()},
+            'resources': {str(level): len(bitmap) for level, bitmap in self.levels.items()},
+            'owner_exceptions': len(self.exception_resources),
+            'bytes': self.nbytes,
+        }
+
+
+def _empty_meta(tenant_id):
+    now = timezone.now()
+    return {
+        'tenant_id': tenant_id,
+        'built_at': now.isoformat(),
+        'refreshed_at': time.time(),
+        'user_marker': now.isoformat(),
+        'resource_cursor': 0,
+        'ceilings': ACCESS_CEILINGS,
+    }
+
+
+def build():
+    """Index of the current tenant, read from scratch"""
+    meta = _empty_meta(get_current_tenant_id())
+    meta['resource_cursor'] = settled_head()
+
+    user_pks, user_roles = [], []
+    for role in ROLES:
+        pks = _fetch(User.objects.filter(is_active=True, role=role), ['pk'])[:, 0]
+        user_pks.append(pks)
+        user_roles.append(np.full(len(pks), role, dtype=object))
+    user_pks, user_roles = np.concatenate(user_pks), np.concatenate(user_roles)
+    order = np.argsort(user_pks)
+    user_pks, user_roles = user_pks[order], user_roles[order]
+
+    def role_of(owners):
+        if not len(user_pks):
+            return np.full(len(owners), '', dtype=object)
+        positions = np.minimum(np.searchsorted(user_pks, owners), len(user_pks) - 1)
+        return np.where(user_pks[positions] == owners, user_roles[positions], '')
+
+    rows = _fetch(MockResource.objects.filter(effective_level__isnull=False),
+                  ['pk', 'effective_level', 'owner_id'])
+    exception_resources, exception_owners = _exceptions(rows, role_of)
+    order = np.argsort(exception_resources)
+    return AccessIndex(
+        meta,
+        users={role: Bitmap.from_ids(user_pks[user_roles == role]) for role in ROLES},
+        levels={level: Bitmap.from_ids(rows[rows[:, 1] == level, 0]) for level in LEVELS},
+        exception_resources=exception_resources[order],
+        exception_owners=exception_owners[order],
+    )
+
+
+def _changed_resources(index, rows, removed):
+    """Exception pairs with ``removed`` resources dropped and ``rows`` (pk, level, owner) added"""
+    keep = ~np.isin(index.exception_resources, removed)
+    added_resources, added_owners = _exceptions(rows, index._roles_of)
+    resources = np.concatenate([index.exception_resources[keep], added_resources])
+    owners = np.concatenate([index.exception_owners[keep], added_owners])
+    resources, positions = np.unique(resources, return_index=True)
+    return resources, owners[positions]
+
+
+def refresh(index):
+    """
+    Apply user saves and resource changes since the last refresh. Falls back
+    to ``build`` when the rules changed, users vanished without a save (the
+    active count disagrees) or most resources changed.
+    """
+    if index.meta['ceilings'] != ACCESS_CEILINGS:
+        return build()
+    meta = dict(index.meta)
+    started = timezone.now()
+    head = settled_head()
+
+    # Users first: owner exceptions of resources depend on the owner's role
+    since = datetime.fromisoformat(meta['user_marker']) - timedelta(
+        seconds=settings.ACCESS_INDEX_REFRESH_OVERLAP)
+    changed = list(User.all_objects.filter(updated_at__gte=since).values_list('pk', 'role', 'is_active'))
+    if changed:
+        pks = [pk for pk, _, _ in changed]
+        users = {
+            role: bitmap.update(add=[pk for pk, user_role, active in changed if active and user_role == role],
+                                remove=pks)
+            for role, bitmap in index.users.items()
+        }
+        keep = ~np.isin(index.exception_owners, pks)
+        index = AccessIndex(meta, users, index.levels,
+                            index.exception_resources[keep], index.exception_owners[keep])
+        owned = [pk for pk, _, active in changed if active]
+        for start in range(0, len(owned), FETCH_CHUNK):
+            rows = _fetch(MockResource.objects.filter(owner_id__in=owned[start:start + FETCH_CHUNK],
+                                                      effective_level__isnull=False),
+                          ['pk', 'effective_level', 'owner_id'])
+            resources, owners = _changed_resources(index, rows, [])
+            index = AccessIndex(meta, index.users, index.levels, resources, owners)
+    if sum(len(bitmap) for bitmap in index.users.values()) != User.objects.filter(is_active=True).count():
+        return build()
+
+    # Entries after the settled head are applied now and again next time:
+    # the current state of a resource is re-read either way
+    resource_ids = np.unique(_fetch(
+        ResourceChange.objects.using(DEFAULT_DB_ALIAS).filter(id__gt=meta['resource_cursor'],
+                                                             object_type='resource'),
+        ['object_id'],
+    )[:, 0])
+    if len(resource_ids) > max(sum(len(bitmap) for bitmap in index.levels.values()), FETCH_CHUNK) // 4:
+        return build()
+    if len(resource_ids):
+        rows = np.concatenate([np.zeros((0, 3), dtype=np.int64)] + [
+            _fetch(MockResource.objects.filter(pk__in=resource_ids[start:start + FETCH_CHUNK].tolist(),
+                                               effective_level__isnull=False),
+                   ['pk', 'effective_level', 'owner_id'])
+            for start in range(0, len(resource_ids), FETCH_CHUNK)
+        ])
+        levels = {
+            level: bitmap.update(add=rows[rows[:, 1] == level, 0], remove=resource_ids)
+            for level, bitmap in index.levels.items()
+        }
+        resources, owners = _changed_resources(index, rows, resource_ids)
+        index = AccessIndex(meta, index.users, levels, resources, owners)
+
+    meta['user_marker'] = started.isoformat()
+    meta['resource_cursor'] = max(meta['resource_cursor'], head)
+    meta['refreshed_at'] = time.time()
+    return AccessIndex(meta, index.users, index.levels,
+                       index.exception_resources, index.exception_owners)
+
+
+def _arrays(index):
+    arrays = {}
+    for prefix, bitmaps in (('users', index.users), ('levels', index.levels)):
+        for name, bitmap in bitmaps.items():
+            for field in ('keys', 'cards', 'offsets', 'data'):
+                arrays[f'{prefix}.{name}.{field}'] = getattr(bitmap, field)
+    arrays['exceptions.resources'] = index.exception_resources.astype(np.int64)
+    arrays['exceptions.owners'] = index.exception_owners.astype(np.int64)
+    return arrays
+
+
+def save(index, path):
+    """
+    Write ``index`` as ``MAGIC``, a JSON header length (uint64) and header,
+    then every array 8-byte aligned, so ``load`` can map it without copying
+    """
+    arrays = _arrays(index)
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, offset, len(array)]
+        offset += -(-array.nbytes // 8) * 8
+    header = json.dumps({'version': FORMAT_VERSION, 'meta': index.meta, 'arrays': layout}).encode()
+    header += b' ' * (-len(header) % 8)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f'{path.name}.{os.getpid()}.part')
+    try:
+        with open(partial, 'wb') as stream:
+            stream.write(MAGIC + np.uint64(len(header)).tobytes() + header)
+            for array in arrays.values():
+                data = np.ascontiguousarray(array).tobytes()
+                stream.write(data + b'\0' * (-len(data) % 8))
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def load(path):
+    """Map an index file read-only; ``None`` if missing or of another format"""
+    try:
+        with open(path, 'rb') as stream:
+            if os.fstat(stream.fileno()).st_size < len(MAGIC) + 8:
+                return None
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    if mapped[:len(MAGIC)] != MAGIC:
+        return None
+    length = int(np.frombuffer(mapped, dtype=np.uint64, count=1, offset=len(MAGIC))[0])
+    start = len(MAGIC) + 8 + length
+    header = json.loads(mapped[len(MAGIC) + 8:start])
+    if header['version'] != FORMAT_VERSION:
+        return None
+    arrays = {
+        name: np.frombuffer(mapped, dtype=np.dtype(dtype), count=count, offset=start + offset)
+        for name, (dtype, offset, count) in header['arrays'].items()
+    }
+
+    def bitmap(prefix):
+        return Bitmap(*(arrays[f'{prefix}.{field}'] for field in ('keys', 'cards', 'offsets', 'data')))
+
+    return AccessIndex(
+        header['meta'],
+        users={role: bitmap(f'users.{role}') for role in ROLES},
+        levels={level: bitmap(f'levels.{level}') for level in LEVELS},
+        exception_resources=arrays['exceptions.resources'],
+        exception_owners=arrays['exceptions.owners'],
+    )
+
+
+def index_path(tenant_id=None):
+    tenant_id = get_current_tenant_id() if tenant_id is None else tenant_id
+    return Path(settings.ACCESS_INDEX_DIR) / f'tenant-{tenant_id or "all"}.idx'
+
+
+# Mapped index per file, reloaded when another process replaces the file
+_mapped = {}
+_mapped_lock = threading.Lock()
+
+
+def _current(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns)
+    with _mapped_lock:
+        cached = _mapped.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    index = load(path)
+    if index is not None:
+        with _mapped_lock:
+            _mapped[path] = (version, index)
+    return index
+
+
+@contextmanager
+def _exclusive(path):
+    """One refresh per tenant at a time, across processes"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class IndexUnavailable(Exception):
+    """The tenant has no index file yet; ``job`` builds it"""
+
+    def __init__(self, job):
+        super().__init__(f'The access index is being built (job #{job.pk}).')
+        self.job = job
+
+
+# When this process last queued a refresh, per index file
+_requested = {}
+
+
+def _request_refresh(path, max_age):
+    """
+    Queue resources.refresh_access_index unless this process did within
+    ``max_age`` seconds or a refresh is already queued or running
+    """
+    from apps.jobs.models import Job
+    from apps.jobs.queue import enqueue
+
+    now = time.monotonic()
+    with _mapped_lock:
+        if path in _requested and now - _requested[path] < max_age:
+            return None
+        _requested[path] = now
+    pending = Job.objects.filter(task=REFRESH_TASK, status__in=(Job.QUEUED, Job.RUNNING)).first()
+    return pending or enqueue(REFRESH_TASK, {'full': False})[0]
+
+
+def get_index(max_age=None):
+    """
+    Index of the current tenant. Never built on the request path: an index
+    older than ``max_age`` seconds (``ACCESS_INDEX_MAX_AGE``) is served as
+    is while a job refreshes it; without an index file, the build is queued
+    and ``IndexUnavailable`` raised.
+    """
+    max_age = settings.ACCESS_INDEX_MAX_AGE if max_age is None else max_age
+    path = index_path()
+    index = _current(path)
+    if index is None:
+        _requested.pop(path, None)
+        raise IndexUnavailable(_request_refresh(path, max_age))
+    if index.age > max_age:
+        _request_refresh(path, max_age)
+    return index
+
+
+def update_index(full=False):
+    """Refresh (or with ``full`` rebuild) the current tenant's index now"""
+    # Rows are read past the settled head of the log, which is the primary's
+    pin_to_primary()
+    path = index_path()
+    with _exclusive(path):
+        index = None if full else _current(path)
+        save(build() if index is None else refresh(index), path)
+    return _current(path)
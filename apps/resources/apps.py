@@ -5,3 +5,7 @@ class ResourcesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.resources'
     verbose_name = 'Resources Management'
+
+    def ready(self):
+        from .changefeed import connect_signals
+        connect_signals()
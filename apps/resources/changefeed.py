@@ -0,0 +1,391 @@
+"""
+Change feed for resources and categories.
+
+Signal handlers append a ``ResourceChange`` row for every create, update and
+delete. ``changes_since`` reads the log by primary key range, so the cost of
+a poll depends on the number of changes since the cursor, not on the size of
+``mock_resources``.
+
+Ids are assigned at insert, not at commit: a long transaction may commit a
+lower id after a reader moved past it. On PostgreSQL every transaction
+writing to the log first holds a shared advisory lock keyed by a fresh value
+of the id sequence (``_appending``), so all its entries get higher ids, and
+readers never move past the lowest key still held (``settled_horizon``).
+SQLite serializes writers, so ids commit in order there.
+
+The horizon is read on the primary, so every read of the log bounded by it
+goes to the primary too: a lagging replica may lack committed entries below
+the horizon, and a cursor moved past them would never deliver them.
+"""
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import ACCESS_CEILINGS, ACCESS_LEVEL_RANKS, ResourceCategory, MockResource, ResourceChange
+
+# Category access levels visible per role, mirrors ResourceCategoryListView
+CATEGORY_LEVELS = {
+    'admin': ('public', 'internal', 'confidential', 'restricted'),
+    'moderator': ('public', 'internal', 'confidential'),
+    'user': ('public', 'internal'),
+}
+
+
+def resource_visible(user, effective_level, owner_id):
+    """Python twin of the role filter in MockResourceListView.get_queryset"""
+    if effective_level is None:
+        return False
+    if user.is_administrator:
+        return True
+    if user.is_moderator:
+        return effective_level <= ACCESS_CEILINGS['moderator']['any']
+    ceilings = ACCESS_CEILINGS['user']
+    return effective_level <= ceilings['any'] or (owner_id == user.id and effective_level <= ceilings['own'])
+
+
+def category_visible(user, access_level):
+    return access_level in CATEGORY_LEVELS.get(user.role, ())
+
+
+def _visibility_filter(user, prefix=''):
+    """Entries whose state (current, or previous with ``prefix``) the user can see"""
+    level = f'{prefix}effective_level'
+    owner = f'{prefix}owner_id'
+    access = f'{prefix}access_level'
+
+    if user.is_administrator:
+        resources = Q()
+    elif user.is_moderator:
+        resources = Q(**{f'{level}__lte': ACCESS_CEILINGS['moderator']['any']})
+    else:
+        ceilings = ACCESS_CEILINGS['user']
+        resources = (Q(**{f'{level}__lte': ceilings['any']}) |
+                     Q(**{owner: user.id, f'{level}__lte': ceilings['own']}))
+
+    categories = Q(**{f'{access}__in': CATEGORY_LEVELS.get(user.role, ())})
+    return (Q(object_type='resource') & resources) | (Q(object_type='category') & categories)
+
+
+def visible_changes(user):
+    return ResourceChange.objects.filter(
+        _visibility_filter(user) | _visibility_filter(user, 'previous_')
+    )
+
+
+def settled_horizon():
+    """
+    Lowest id a transaction in progress may still commit to the log, or
+    ``None`` when every committed entry is final
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    table = ResourceChange._meta.db_table
+    with connection.cursor() as cursor:
+        # The sequence first: a writer locking after this point draws a
+        # higher key than the sequence value read here
+        cursor.execute("SELECT pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass)",
+                       [table])
+        last = cursor.fetchone()[0] or 0
+        cursor.execute(
+            "SELECT min((classid::bigint << 32) | objid::bigint) FROM pg_locks "
+            "WHERE locktype = 'advisory' AND objsubid = 1 "
+            "AND database = (SELECT oid FROM pg_database WHERE datname = current_database())"
+        )
+        held = cursor.fetchone()[0]
+    return min(last + 1, held) if held is not None else last + 1
+
+
+def _settled(queryset, horizon):
+    queryset = queryset.using(DEFAULT_DB_ALIAS)
+    return queryset if horizon is None else queryset.filter(id__lt=horizon)
+
+
+def settled_head(horizon=None, queryset=None):
+    """Newest id no transaction in progress can still precede"""
+    if horizon is None:
+        horizon = settled_horizon()
+    queryset = ResourceChange.objects.all() if queryset is None else queryset
+    return _settled(queryset, horizon).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def head_cursor():
+    return settled_head()
+
+
+def changes_since(user, cursor, limit):
+    """
+    Return ``(entries, next_cursor, has_more)`` for changes after ``cursor``.
+
+    Several entries for one object within the page collapse into the latest.
+    """
+    horizon = settled_horizon()
+    entries = list(
+        _settled(visible_changes(user), horizon).filter(id__gt=cursor).order_by('id')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_cursor = entries[-1].id if entries else cursor
+    if not has_more:
+        # Skip past entries the caller can not see so they are not rescanned
+        next_cursor = max(next_cursor, settled_head(horizon, ResourceChange.objects.filter(id__gt=next_cursor)))
+
+    latest = {}
+    for entry in entries:
+        latest[(entry.object_type, entry.object_id)] = entry
+    return sorted(latest.values(), key=lambda entry: entry.id), next_cursor, has_more
+
+
+def wait_for_changes(user, cursor, timeout):
+    """Block up to ``timeout`` seconds until a visible change follows ``cursor``"""
+    deadline = time.monotonic() + timeout
+    queryset = visible_changes(user).filter(id__gt=cursor)
+    while True:
+        if _settled(queryset, settled_horizon()).exists():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(settings.CHANGE_FEED_POLL_INTERVAL, remaining))
+
+
+def changed_resource_ids(since):
+    """
+    Ids of resources changed after the marker ``since``. Called with ``None``
+    it returns the current marker. Unscoped: covers every tenant.
+    """
+    if since is None:
+        return ResourceChange._base_manager.using(DEFAULT_DB_ALIAS).order_by('-id').values_list(
+            'id', flat=True).first() or 0
+    return set(
+        ResourceChange._base_manager.using(DEFAULT_DB_ALIAS).filter(id__gt=since, object_type='resource')
+        .values_list('object_id', flat=True)
+    )
+
+
+def change_action(user, entry):
+    """
+    Action as seen by ``user``: an object that left the caller's visible set
+    is reported as deleted.
+    """
+    if entry.action == 'deleted':
+        return 'deleted'
+    if entry.object_type == 'resource':
+        visible = resource_visible(user, entry.effective_level, entry.owner_id)
+    else:
+        visible = category_visible(user, entry.access_level)
+    return entry.action if visible else 'deleted'
+
+
+@contextmanager
+def _appending():
+    """Wrap every write to the log, see the module docstring"""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock_shared(nextval(pg_get_serial_sequence(%s, 'id')))",
+                    [ResourceChange._meta.db_table],
+                )
+        yield
+
+
+def record_created(object_type, instances):
+    """Log creations performed without ``save()``, e.g. raw inserts"""
+    with _appending():
+        ResourceChange.objects.bulk_create([
+            ResourceChange(tenant_id=instance.tenant_id, object_type=object_type,
+                           object_id=instance.pk, action='created', **_state(instance))
+            for instance in instances
+        ])
+
+
+def _state(instance, prefix=''):
+    if isinstance(instance, MockResource):
+        return {
+            f'{prefix}effective_level': instance.effective_level,
+            f'{prefix}owner_id': instance.owner_id,
+        }
+    return {f'{prefix}access_level': instance.access_level}
+
+
+def _object_type(sender):
+    return 'resource' if sender is MockResource else 'category'
+
+
+def _remember_previous_state(sender, instance, raw=False, **kwargs):
+    instance._changefeed_previous = None
+    if raw or instance.pk is None:
+        return
+    fields = ['effective_level', 'owner_id'] if sender is MockResource else ['access_level']
+    instance._changefeed_previous = (
+        sender.objects.using(DEFAULT_DB_ALIAS).filter(pk=instance.pk).values(*fields).first()
+    )
+
+
+def _log_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_changefeed_previous', None) or {}
+    previous_access = previous.get('access_level')
+    with _appending():
+        if sender is ResourceCategory and previous_access not in (None, instance.access_level):
+            _log_category_cascade(instance, ACCESS_LEVEL_RANKS[previous_access], instance.level)
+        ResourceChange.objects.create(
+            tenant_id=instance.tenant_id,
+            object_type=_object_type(sender),
+            object_id=instance.pk,
+            action='created' if created else 'updated',
+            **_state(instance),
+            **{f'previous_{field}': value for field, value in previous.items()}
+        )
+
+
+def _log_category_cascade(category, previous_level, level):
+    """
+    A category level change rewrites effective_level of its resources with a
+    bulk UPDATE, which sends no signals. Log the affected resources with one
+    ``INSERT ... SELECT``.
+    """
+    quote = connection.ops.quote_name
+    columns = ['tenant_id', 'object_type', 'object_id', 'action', 'effective_level',
+               'previous_effective_level', 'owner_id', 'previous_owner_id',
+               'access_level', 'previous_access_level', 'created_at']
+    now = ResourceChange._meta.get_field('created_at').get_db_prep_value(
+        timezone.now(), connection
+    )
+    sql = (
+        'INSERT INTO {changes} ({columns}) '
+        "SELECT {tenant}, 'resource', {id}, 'updated', "
+        'CASE WHEN {sensitivity} > %s THEN {sensitivity} ELSE %s END, '
+        'CASE WHEN {sensitivity} > %s THEN {sensitivity} ELSE %s END, '
+        "{owner}, {owner}, '', '', %s "
+        'FROM {resources} WHERE {category} = %s AND {sensitivity} < %s'
+    ).format(
+        changes=quote(ResourceChange._meta.db_table),
+        columns=', '.join(quote(column) for column in columns),
+        tenant=quote('tenant_id'),
+        id=quote('id'),
+        sensitivity=quote('sensitivity_level'),
+        owner=quote('owner_id'),
+        resources=quote(MockResource._meta.db_table),
+        category=quote('category_id'),
+    )
+    # Only resources whose sensitivity does not dominate both levels change
+    params = [level, level, previous_level, previous_level, now,
+              category.pk, max(level, previous_level)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_resources_updated(queryset, effective_level, owner_id=None):
+    """
+    Log a set-based update of ``queryset`` that sets ``effective_level`` (an
+    expression), and ``owner_id`` when given, with one ``INSERT ... SELECT``.
+    Call before the update.
+    """
+    quote = connection.ops.quote_name
+    new_owner = F('owner_id') if owner_id is None else Value(owner_id)
+    rows = queryset.order_by().annotate(
+        new_effective_level=effective_level, new_owner_id=new_owner,
+    ).values_list('tenant_id', 'id', 'new_effective_level', 'effective_level', 'new_owner_id', 'owner_id')
+    select, params = rows.query.sql_with_params()
+    columns = ['tenant_id', 'object_type', 'object_id', 'action', 'effective_level',
+               'previous_effective_level', 'owner_id', 'previous_owner_id',
+               'access_level', 'previous_access_level', 'created_at']
+    now = ResourceChange._meta.get_field('created_at').get_db_prep_value(
+        timezone.now(), connection
+    )
+    sql = (
+        'INSERT INTO {changes} ({columns}) '
+        "SELECT changed.tenant_id, 'resource', changed.id, 'updated', "
+        'changed.new_effective_level, changed.effective_level, '
+        "changed.new_owner_id, changed.owner_id, '', '', %s "
+        'FROM ({select}) changed'
+    ).format(
+        changes=quote(ResourceChange._meta.db_table),
+        columns=', '.join(quote(column) for column in columns),
+        select=select,
+    )
+    with _appending(), connection.cursor() as cursor:
+        cursor.execute(sql, [now, *params])
+
+
+def record_resources_deleted(queryset):
+    """
+    Log every resource of ``queryset`` as deleted with one
+    ``INSERT ... SELECT``. Call before the delete.
+    """
+    quote = connection.ops.quote_name
+    rows = queryset.order_by().values_list('tenant_id', 'id', 'effective_level', 'owner_id')
+    select, params = rows.query.sql_with_params()
+    columns = ['tenant_id', 'object_type', 'object_id', 'action',
+               'previous_effective_level', 'previous_owner_id',
+               'access_level', 'previous_access_level', 'created_at']
+    now = ResourceChange._meta.get_field('created_at').get_db_prep_value(
+        timezone.now(), connection
+    )
+    sql = (
+        'INSERT INTO {changes} ({columns}) '
+        "SELECT deleted.tenant_id, 'resource', deleted.id, 'deleted', "
+        "deleted.effective_level, deleted.owner_id, '', '', %s "
+        'FROM ({select}) deleted'
+    ).format(
+        changes=quote(ResourceChange._meta.db_table),
+        columns=', '.join(quote(column) for column in columns),
+        select=select,
+    )
+    with _appending(), connection.cursor() as cursor:
+        cursor.execute(sql, [now, *params])
+
+
+def record_table_deleted(table):
+    """
+    Log every resource in ``table`` (a detached partition) as deleted with
+    one ``INSERT ... SELECT``
+    """
+    quote = connection.ops.quote_name
+    columns = ['tenant_id', 'object_type', 'object_id', 'action',
+               'previous_effective_level', 'previous_owner_id',
+               'access_level', 'previous_access_level', 'created_at']
+    now = ResourceChange._meta.get_field('created_at').get_db_prep_value(
+        timezone.now(), connection
+    )
+    sql = (
+        'INSERT INTO {changes} ({columns}) '
+        "SELECT {tenant}, 'resource', {id}, 'deleted', {level}, {owner}, '', '', %s "
+        'FROM {table}'
+    ).format(
+        changes=quote(ResourceChange._meta.db_table),
+        columns=', '.join(quote(column) for column in columns),
+        tenant=quote('tenant_id'),
+        id=quote('id'),
+        level=quote('effective_level'),
+        owner=quote('owner_id'),
+        table=quote(table),
+    )
+    with _appending(), connection.cursor() as cursor:
+        cursor.execute(sql, [now])
+
+
+def _log_delete(sender, instance, **kwargs):
+    with _appending():
+        ResourceChange.objects.create(
+            tenant_id=instance.tenant_id,
+            object_type=_object_type(sender),
+            object_id=instance.pk,
+            action='deleted',
+            **_state(instance, 'previous_')
+        )
+
+
+def connect_signals():
+    for model in (MockResource, ResourceCategory):
+        uid = f'changefeed-{model._meta.label_lower}'
+        pre_save.connect(_remember_previous_state, sender=model, dispatch_uid=uid)
+        post_save.connect(_log_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_log_delete, sender=model, dispatch_uid=uid)
@@ -0,0 +1,257 @@
+"""
+Chunked deletion of categories and users with many resources.
+
+``MockResource.category`` and ``MockResource.owner`` cascade: deleting the
+parent through the ORM collects every resource into memory and deletes them
+in one transaction, holding locks throughout. Instead:
+
+* ``request_category_deletion`` / ``request_user_deletion`` set
+  ``deletion_requested_at``, which hides the parent from the default
+  managers at once (a user is also deactivated and signed out), and queue a
+  deletion job;
+* the job deletes the resources, or reassigns them to another category or
+  owner, in primary key ranges of at most ``DELETION_BATCH_SIZE`` rows, one
+  short transaction per range, logged to the change feed set-based;
+* the parent itself is deleted last, once no resource points at it.
+
+Every range is read from what is left, so an interrupted deletion resumes
+where it stopped: the job's retry, a repeated request, or
+"manage.py resume_deletions".
+"""
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from apps.jobs.models import Job
+from apps.jobs.queue import IdempotencyConflict, enqueue
+from apps.users.models import User
+from apps.users.sessions import revoke_sessions
+from . import changefeed
+from .models import MockResource, ResourceCategory
+
+CATEGORY_TASK = 'resources.delete_category'
+USER_TASK = 'users.delete_user'
+
+
+class DeletionError(ValueError):
+    """The deletion can not be requested or carried out as asked"""
+
+
+class DeletionInProgress(DeletionError):
+    """Another deletion of the same parent, with other options, is running"""
+
+
+def _key(task_name, pk):
+    return f'{task_name}:{pk}'
+
+
+def _queue(task_name, payload, pk, user):
+    """Job deleting ``pk``: the running one, or a new one; ``(job, created)``"""
+    key = _key(task_name, pk)
+    # A finished attempt releases its key, so repeating the request resumes
+    for finished in Job.objects.filter(idempotency_key=key, status__in=Job.FINISHED):
+        finished.idempotency_key = f'{key}#{finished.pk}'
+        finished.save(update_fields=['idempotency_key'])
+    try:
+        return enqueue(task_name, payload, user=user, idempotency_key=key)
+    except IdempotencyConflict as exc:
+        raise DeletionInProgress(f'A deletion with other options is in progress (job #{exc.job.pk}).')
+
+
+def _reassign_category(category_id, reassign_to):
+    if reassign_to is None:
+        return None
+    target = ResourceCategory.objects.filter(pk=reassign_to).first()
+    if target is None or target.pk == category_id:
+        raise DeletionError(f'Category {reassign_to} can not receive the resources.')
+    return target
+
+
+def _reassign_owner(user_id, reassign_to):
+    if reassign_to is None:
+        return None
+    target = User.objects.filter(pk=reassign_to, is_active=True).first()
+    if target is None or target.pk == user_id:
+        raise DeletionError(f'User {reassign_to} can not receive the resources.')
+    return target
+
+
+def mark_category(category_id):
+    """Hide the category; no-op when it is already pending deletion"""
+    now = timezone.now()
+    return ResourceCategory.all_objects.filter(pk=category_id, deletion_requested_at__isnull=True).update(
+        deletion_requested_at=now, updated_at=now,
+    )
+
+
+def mark_user(user_id):
+    """Deactivate, sign out and hide the user; no-op when already pending deletion"""
+    now = timezone.now()
+    with transaction.atomic():
+        marked = User.all_objects.filter(pk=user_id, deletion_requested_at__isnull=True).update(
+            deletion_requested_at=now, is_active=False, updated_at=now,
+        )
+        User.all_objects.filter(pk=user_id, deleted_at__isnull=True).update(deleted_at=now)
+        if marked:
+            revoke_sessions([user_id])
+    return marked
+
+
+def request_category_deletion(category, reassign_to=None, user=None):
+    """
+    Hide ``category`` and queue the deletion of its resources (or their move
+    to category ``reassign_to``). Returns ``(job, created)``.
+    """
+    _reassign_category(category.pk, reassign_to)
+    with transaction.atomic():
+        mark_category(category.pk)
+        return _queue(CATEGORY_TASK, {'category': category.pk, 'reassign_to': reassign_to},
+                      category.pk, user)
+
+
+def request_user_deletion(target, reassign_to=None, user=None):
+    """
+    Deactivate and hide ``target`` and queue the deletion of the account and
+    its resources (or their transfer to user ``reassign_to``). Returns
+    ``(job, created)``.
+    """
+    if user is not None and target.pk == user.pk:
+        raise DeletionError('You can not delete your own account this way.')
+    _reassign_owner(target.pk, reassign_to)
+    with transaction.atomic():
+        mark_user(target.pk)
+        return _queue(USER_TASK, {'user': target.pk, 'reassign_to': reassign_to}, target.pk, user)
+
+
+def _ranges(children, batch_size):
+    """
+    ``(first, last)`` primary key ranges of at most ``batch_size``
+    children, read from what is left after the previous range was processed
+    """
+    last = 0
+    while True:
+        pks = list(children.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks[0], pks[-1]
+        last = pks[-1]
+
+
+def _process(column, parent_id, batch_size=None, pause=None, progress=None, **changes):
+    """
+    Delete the resources whose ``column`` is ``parent_id``, or apply
+    ``changes`` (``effective_level`` expression, new ``category_id`` or
+    ``owner_id``) to them, range by range. Returns the rows processed.
+    """
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    pause = settings.DELETION_PAUSE if pause is None else pause
+    children = MockResource._base_manager.filter(**{column: parent_id})
+    quote = connection.ops.quote_name
+    sql = 'DELETE FROM {table} WHERE {column} = %s AND {pk} BETWEEN %s AND %s'.format(
+        table=quote(MockResource._meta.db_table),
+        column=quote(column),
+        pk=quote(MockResource._meta.pk.column),
+    )
+
+    done = 0
+    if progress is not None:
+        progress(done)
+    for first, last in _ranges(children, batch_size):
+        batch = children.filter(pk__gte=first, pk__lte=last)
+        with transaction.atomic():
+            if changes:
+                changefeed.record_resources_updated(
+                    batch, changes.get('effective_level', F('effective_level')),
+                    owner_id=changes.get('owner_id'),
+                )
+                done += batch.update(**changes, updated_at=timezone.now())
+            else:
+                # update() and raw deletes send no signals, the change feed
+                # entries are written set-based before
+                changefeed.record_resources_deleted(batch)
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [parent_id, first, last])
+                    done += cursor.rowcount
+        if progress is not None:
+            progress(done)
+        if pause:
+            time.sleep(pause)
+    return done
+
+
+def delete_category(category_id, reassign_to=None, batch_size=None, progress=None):
+    """
+    Carry out the deletion of a category: its resources in ranges, then the
+    category. ``progress`` is called with ``(done, remaining at start)``.
+    """
+    category = ResourceCategory.all_objects.filter(pk=category_id).first()
+    if category is None:
+        # Deleted by an earlier attempt
+        return {'resources': 0, 'reassigned_to': reassign_to}
+    target = _reassign_category(category_id, reassign_to)
+    mark_category(category_id)
+
+    total = MockResource._base_manager.filter(category_id=category_id).count()
+    report = (lambda done: progress(done, total)) if progress is not None else None
+    changes = {}
+    if target is not None:
+        level = target.level
+        changes = {
+            'category_id': target.pk,
+            'effective_level': Case(When(sensitivity_level__gt=level, then=F('sensitivity_level')),
+                                    default=Value(level)),
+        }
+    done = _process('category_id', category_id, batch_size, progress=report, **changes)
+
+    with transaction.atomic():
+        # Resources created meanwhile cascade, a handful at most
+        category.delete()
+    return {'resources': done, 'reassigned_to': reassign_to}
+
+
+def delete_user(user_id, reassign_to=None, batch_size=None, progress=None):
+    """
+    Carry out the deletion of a user: their resources in ranges, then the
+    account. ``progress`` is called with ``(done, remaining at start)``.
+    """
+    target_user = User.all_objects.filter(pk=user_id).first()
+    if target_user is None:
+        return {'resources': 0, 'reassigned_to': reassign_to}
+    target = _reassign_owner(user_id, reassign_to)
+    mark_user(user_id)
+
+    total = MockResource._base_manager.filter(owner_id=user_id).count()
+    report = (lambda done: progress(done, total)) if progress is not None else None
+    changes = {'owner_id': target.pk} if target is not None else {}
+    done = _process('owner_id', user_id, batch_size, progress=report, **changes)
+
+    with transaction.atomic():
+        revoke_sessions([user_id])
+        target_user.delete()
+    return {'resources': done, 'reassigned_to': reassign_to}
+
+
+def pending_deletions():
+    """Categories and users of the current tenant whose deletion has not finished"""
+    return (
+        list(ResourceCategory.all_objects.filter(deletion_requested_at__isnull=False).order_by('pk')),
+        list(User.all_objects.filter(deletion_requested_at__isnull=False).order_by('pk')),
+    )
+
+
+def resume(task_name, pk, user=None):
+    """
+    Queue the last deletion job of ``pk`` again, with its options. Returns
+    ``(job, created)``, or ``None`` when no job is on record.
+    """
+    key = _key(task_name, pk)
+    last = (Job.objects.filter(Q(idempotency_key=key) | Q(idempotency_key__startswith=f'{key}#'))
+            .order_by('-created_at', '-pk').first())
+    if last is None:
+        return None
+    if not last.is_finished:
+        return last, False
+    return _queue(task_name, last.payload, pk, user)
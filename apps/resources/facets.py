@@ -0,0 +1,73 @@
+"""
+Facet counts of the caller's visible resources.
+
+Each facet is one GROUP BY over the filtered queryset of the resource list,
+so the counts match the list exactly. Results are cached per role and
+filters (per user for regular users, whose visible set includes their own
+resources). The cache key contains the newest change feed id of the
+tenant: every write to resources or categories appends to the feed in the
+same transaction, so a write makes older entries unreachable in every
+worker without explicit invalidation.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .changefeed import head_cursor
+
+# Query parameters that do not change the counts
+IGNORED_PARAMS = ('page', 'page_size', 'ordering')
+
+
+def facet_counts(queryset, owner_limit):
+    """``{'total', 'category', 'sensitivity_level', 'owner'}`` for ``queryset``"""
+    base = queryset.select_related(None).order_by()
+    levels = list(
+        base.values('sensitivity_level').annotate(count=Count('pk')).order_by('sensitivity_level')
+    )
+    categories = (
+        base.values('category_id', 'category__name').annotate(count=Count('pk'))
+        .order_by('-count', 'category_id')
+    )
+    owners = (
+        base.values('owner_id', 'owner__email').annotate(count=Count('pk'))
+        .order_by('-count', 'owner_id')[:owner_limit]
+    )
+    return {
+        'total': sum(row['count'] for row in levels),
+        'category': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'sensitivity_level': [
+            {'value': row['sensitivity_level'], 'count': row['count']} for row in levels
+        ],
+        'owner': [
+            {'id': row['owner_id'], 'email': row['owner__email'], 'count': row['count']}
+            for row in owners
+        ],
+    }
+
+
+def cache_key(user, tenant_id, query_params):
+    params = sorted(
+        (key, value) for key, values in query_params.lists() if key not in IGNORED_PARAMS
+        for value in values
+    )
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()
+    # The visible set of a regular user depends on who they are
+    audience = f'user{user.pk}' if user.is_regular_user else user.role
+    return f'facets:{tenant_id}:{head_cursor()}:{audience}:{digest}'
+
+
+def cached_facet_counts(queryset, user, tenant_id, query_params, owner_limit):
+    """Returns ``(facets, cached)``"""
+    key = cache_key(user, tenant_id, query_params)
+    facets = cache.get(key)
+    if facets is not None:
+        return facets, True
+    facets = facet_counts(queryset, owner_limit)
+    cache.set(key, facets, settings.FACETS_CACHE_TTL)
+    return facets, False
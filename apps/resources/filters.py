@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+import django_filters
+from django.utils import timezone
+
+from .models import MockResource
+
+
+class MockResourceFilter(django_filters.FilterSet):
+    """
+    Resource list filters. The created_at bounds let PostgreSQL skip the
+    monthly partitions outside the requested window.
+    """
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+    days = django_filters.NumberFilter(method='filter_days', min_value=0,
+                                       label='Created within the last N days')
+
+    class Meta:
+        model = MockResource
+        fields = ['category', 'sensitivity_level']
+
+    def filter_days(self, queryset, name, value):
+        return queryset.filter(created_at__gte=timezone.now() - timedelta(days=float(value)))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.resources.models import reconcile_effective_levels
+
+
+class Command(BaseCommand):
+    help = 'Verify MockResource.effective_level against sensitivity_level and category access_level'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Primary key range checked per query')
+        parser.add_argument('--fix', action='store_true', help='Recompute inconsistent rows')
+
+    def handle(self, *args, **options):
+        mismatched, samples = reconcile_effective_levels(options['batch_size'], fix=options['fix'])
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('effective_level is consistent'))
+            return
+
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {mismatched} resources'))
+            return
+
+        raise CommandError(
+            f'{mismatched} resources have a stale effective_level, e.g. ids {samples}. '
+            f'Run with --fix to recompute them.'
+        )
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.resources import partitions
+from config.partitioning import PartitioningError
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintain monthly created_at partitions of mock_resources (PostgreSQL only): '
+        'create future partitions and detach or archive expired ones'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Migrate the unpartitioned table to monthly partitions first')
+        parser.add_argument('--months-ahead', type=int,
+                            default=settings.RESOURCE_PARTITION_MONTHS_AHEAD)
+        parser.add_argument('--retention-months', type=int,
+                            default=settings.RESOURCE_PARTITION_RETENTION_MONTHS,
+                            help='Detach partitions older than this many months (0 keeps all)')
+        parser.add_argument('--archive', action='store_true',
+                            help='Move detached rows to mock_resources_archive and drop the partitions')
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Rows copied per transaction by --convert')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report which partitions would be detached')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL.')
+
+        try:
+            if options['convert']:
+                partitions.convert(options['months_ahead'], options['batch_size'], self.stdout)
+            if not partitions.is_range_partitioned():
+                raise CommandError(
+                    f'{partitions.TABLE} is not range partitioned, run with --convert first.'
+                )
+
+            retention = options['retention_months']
+            if options['dry_run']:
+                expired = partitions.expired_partitions(retention) if retention else []
+                self.stdout.write(f'{len(expired)} partitions would be detached: {", ".join(expired)}')
+                return
+
+            created, failed = partitions.create_future_partitions(options['months_ahead'])
+            self.stdout.write(f'Created {len(created)} partitions')
+            for name, error in failed:
+                self.stderr.write(f'Could not create {name}: {error}')
+
+            if retention:
+                detached = partitions.detach_expired(retention, archive=options['archive'])
+                verb = 'Archived' if options['archive'] else 'Detached'
+                self.stdout.write(f'{verb} {len(detached)} partitions: {", ".join(detached)}')
+        except PartitioningError as exc:
+            raise CommandError(str(exc))
+
+        if failed:
+            raise CommandError(f'{len(failed)} partitions could not be created, see above.')
+        self.stdout.write(self.style.SUCCESS('Partitions are up to date'))
@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tenants.context import tenant_context
+from apps.tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Refresh (or rebuild) the reverse access index file of each tenant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', default=[],
+                            help='Tenant slug, repeatable; default: every tenant')
+        parser.add_argument('--full', action='store_true', help='Rebuild from scratch')
+
+    def handle(self, *args, **options):
+        from apps.resources.access_index import update_index
+
+        tenants = Tenant.objects.order_by('pk')
+        if options['tenant']:
+            tenants = tenants.filter(slug__in=options['tenant'])
+            missing = set(options['tenant']) - set(tenants.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f'Unknown tenants: {", ".join(sorted(missing))}')
+
+        for tenant in tenants:
+            started = time.perf_counter()
+            with tenant_context(tenant.pk):
+                index = update_index(full=options['full'])
+            elapsed = (time.perf_counter() - started) * 1000
+            stats = index.stats()
+            self.stdout.write(
+                f'{tenant.slug}: {json.dumps(stats["users"])} users, '
+                f'{sum(stats["resources"].values())} resources, '
+                f'{stats["owner_exceptions"]} owner exceptions, '
+                f'{stats["bytes"] / 2 ** 20:.1f} MiB in {elapsed:.0f} ms'
+            )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tenants.context import tenant_context
+from apps.tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Queue again the interrupted deletions of categories and users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', default=[],
+                            help='Tenant slug, repeatable; default: every tenant')
+
+    def handle(self, *args, **options):
+        from apps.resources import deletion
+
+        tenants = Tenant.objects.order_by('pk')
+        if options['tenant']:
+            tenants = tenants.filter(slug__in=options['tenant'])
+            missing = set(options['tenant']) - set(tenants.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f'Unknown tenants: {", ".join(sorted(missing))}')
+
+        for tenant in tenants:
+            with tenant_context(tenant.pk):
+                categories, users = deletion.pending_deletions()
+                pending = [(deletion.CATEGORY_TASK, 'category', obj) for obj in categories]
+                pending += [(deletion.USER_TASK, 'user', obj) for obj in users]
+                for task_name, label, obj in pending:
+                    result = deletion.resume(task_name, obj.pk)
+                    if result is None:
+                        # The options of the deletion are unknown, reassigning
+                        # or deleting the resources is left to an admin
+                        self.stdout.write(self.style.WARNING(
+                            f'{tenant.slug}: {label} {obj.pk} has no deletion job on record, '
+                            f'request the deletion again'
+                        ))
+                        continue
+                    job, created = result
+                    state = 'queued again' if created else f'already {job.status}'
+                    self.stdout.write(f'{tenant.slug}: {label} {obj.pk} {state} (job #{job.pk})')
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0002_archivedresource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('resource', 'Resource'), ('category', 'Category')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('sensitivity_level', models.IntegerField(null=True)),
+                ('previous_sensitivity_level', models.IntegerField(null=True)),
+                ('owner_id', models.BigIntegerField(null=True)),
+                ('previous_owner_id', models.BigIntegerField(null=True)),
+                ('access_level', models.CharField(blank=True, max_length=20)),
+                ('previous_access_level', models.CharField(blank=True, max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'resource_changes',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:12
+
+from django.db import migrations, models
+
+ACCESS_LEVEL_RANKS = {
+    'public': 1,
+    'internal': 2,
+    'confidential': 3,
+    'restricted': 4,
+}
+
+
+def backfill_effective_level(apps, schema_editor):
+    """One UPDATE per category: max(sensitivity_level, category rank)"""
+    ResourceCategory = apps.get_model('resources', 'ResourceCategory')
+    MockResource = apps.get_model('resources', 'MockResource')
+    db_alias = schema_editor.connection.alias
+
+    for pk, access_level in ResourceCategory.objects.using(db_alias).values_list('pk', 'access_level'):
+        level = ACCESS_LEVEL_RANKS[access_level]
+        MockResource.objects.using(db_alias).filter(category_id=pk).update(
+            effective_level=models.Case(
+                models.When(sensitivity_level__gt=level, then=models.F('sensitivity_level')),
+                default=models.Value(level),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0003_resourcechange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mockresource',
+            name='effective_level',
+            field=models.IntegerField(db_index=True, default=1, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='mockresource',
+            index=models.Index(fields=['owner', 'effective_level'], name='mock_res_owner_level_idx'),
+        ),
+        migrations.RunPython(backfill_effective_level, migrations.RunPython.noop),
+        migrations.RenameField(
+            model_name='resourcechange',
+            old_name='sensitivity_level',
+            new_name='effective_level',
+        ),
+        migrations.RenameField(
+            model_name='resourcechange',
+            old_name='previous_sensitivity_level',
+            new_name='previous_effective_level',
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_default_tenant(apps, schema_editor):
+    Tenant = apps.get_model('tenants', 'Tenant')
+    db_alias = schema_editor.connection.alias
+    tenant = Tenant.objects.using(db_alias).get(slug=settings.DEFAULT_TENANT_SLUG)
+    for model_name, field in (('ResourceCategory', 'tenant'), ('MockResource', 'tenant'),
+                             ('ResourceChange', 'tenant'), ('ArchivedResource', 'tenant_id')):
+        model = apps.get_model('resources', model_name)
+        model.objects.using(db_alias).filter(**{field: None}).update(**{field: tenant.pk})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0001_initial'),
+        ('resources', '0004_effective_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedresource',
+            name='tenant_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='mockresource',
+            name='tenant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AddField(
+            model_name='resourcecategory',
+            name='tenant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AddField(
+            model_name='resourcechange',
+            name='tenant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='resourcecategory',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='mockresource',
+            index=models.Index(fields=['tenant', 'effective_level', '-created_at'], name='mock_res_tenant_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mockresource',
+            index=models.Index(fields=['tenant', '-created_at'], name='mock_res_tenant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resourcechange',
+            index=models.Index(fields=['tenant', 'id'], name='resource_changes_tenant_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resourcecategory',
+            constraint=models.UniqueConstraint(fields=('tenant', 'name'), name='resource_categories_tenant_name_uniq'),
+        ),
+        migrations.RunPython(assign_default_tenant, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='resourcecategory',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='mockresource',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='resourcechange',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='archivedresource',
+            name='tenant_id',
+            field=models.BigIntegerField(),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0005_tenant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourcecategory',
+            name='deletion_requested_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,13 +1,74 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
 from django.conf import settings
 
+from apps.tenants.models import TenantManager, TenantScopedModel
 
-class ResourceCategory(models.Model):
+# Numeric rank of a category access level, comparable to sensitivity_level
+ACCESS_LEVEL_RANKS = {
+    'public': 1,
+    'internal': 2,
+    'confidential': 3,
+    'restricted': 4,
+}
+
+# Highest effective_level each role sees: any resource, and resources it owns.
+# Read by the role filters and simulated by apps.resources.simulation.
+ACCESS_CEILINGS = {
+    'user': {'any': 1, 'own': 2},
+    'moderator': {'any': 3, 'own': 3},
+    'admin': {'any': 4, 'own': 4},
+}
+
+
+def access_level_rank(field='access_level'):
+    """SQL expression mapping an access level column to its numeric rank"""
+    return models.Case(
+        *[models.When(**{field: level}, then=models.Value(rank))
+          for level, rank in ACCESS_LEVEL_RANKS.items()],
+        output_field=models.IntegerField(),
+    )
+
+
+def effective_level_expression(sensitivity_level=None):
+    """
+    SQL expression computing ``MockResource.effective_level`` from the source
+    fields, usable in ``update()`` and for consistency checks. Pass
+    ``sensitivity_level`` when it is updated in the same statement.
+    """
+    category_rank = ResourceCategory.objects.filter(
+        pk=models.OuterRef('category_id')
+    ).annotate(rank=access_level_rank()).values('rank')[:1]
+    if sensitivity_level is None:
+        sensitivity = models.F('sensitivity_level')
+    else:
+        sensitivity = models.Value(sensitivity_level)
+    return Greatest(sensitivity, models.Subquery(category_rank))
+
+
+class CategoryManager(TenantManager):
+    """
+    Categories of the current tenant. Those pending deletion (see
+    ``apps.resources.deletion``) are hidden unless ``include_pending``.
+    """
+
+    def __init__(self, include_pending=False):
+        super().__init__()
+        self.include_pending = include_pending
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.include_pending:
+            queryset = queryset.filter(deletion_requested_at__isnull=True)
+        return queryset
+
+
+class ResourceCategory(TenantScopedModel):
     """
     Mock resource category for access control testing
     """
-    objects = None
-    name = models.CharField(max_length=100, unique=True)
+    # Unique per tenant, see Meta.constraints
+    name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     access_level = models.CharField(
         max_length=20,
@@ -21,20 +82,52 @@ class ResourceCategory(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when a chunked deletion starts; the category is hidden from then on
+    deletion_requested_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = CategoryManager()
+    all_objects = CategoryManager(include_pending=True)
 
     class Meta:
         db_table = 'resource_categories'
         verbose_name_plural = 'Resource categories'
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'name'],
+                                    name='resource_categories_tenant_name_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.access_level})"
 
+    @property
+    def level(self):
+        return ACCESS_LEVEL_RANKS[self.access_level]
+
+    def save(self, *args, **kwargs):
+        previous = None
+        if self.pk is not None:
+            previous = (ResourceCategory.objects.filter(pk=self.pk)
+                        .values_list('access_level', flat=True).first())
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous is not None and previous != self.access_level:
+                self.refresh_effective_levels()
+
+    def refresh_effective_levels(self):
+        """Recompute effective_level of all resources in one UPDATE"""
+        level = self.level
+        return MockResource.objects.filter(category_id=self.pk).update(
+            effective_level=models.Case(
+                models.When(sensitivity_level__gt=level, then=models.F('sensitivity_level')),
+                default=models.Value(level),
+            )
+        )
 
-class MockResource(models.Model):
+
+class MockResource(TenantScopedModel):
     """
     Mock resource object for access control testing
     """
-    objects = None
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     category = models.ForeignKey(ResourceCategory, on_delete=models.CASCADE)
@@ -57,12 +150,151 @@ class MockResource(models.Model):
         related_name='owned_resources'
     )
 
+    # Denormalized max(sensitivity_level, category access level rank),
+    # so role filters are a range predicate on one indexed column
+    effective_level = models.IntegerField(default=1, db_index=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'mock_resources'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', 'effective_level'], name='mock_res_owner_level_idx'),
+            # Tenant-leading indexes for the role-filtered, newest-first lists
+            models.Index(fields=['tenant', 'effective_level', '-created_at'],
+                         name='mock_res_tenant_level_idx'),
+            models.Index(fields=['tenant', '-created_at'], name='mock_res_tenant_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} (Level {self.sensitivity_level})"
+
+    def compute_effective_level(self):
+        return max(self.sensitivity_level, self.category.level)
+
+    def save(self, *args, **kwargs):
+        self.effective_level = self.compute_effective_level()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'effective_level'}
+        super().save(*args, **kwargs)
+
+
+def visible_resources(user):
+    """
+    Resources ``user`` may see. effective_level combines the resource
+    sensitivity and the category access level.
+    """
+    if user.is_administrator:
+        return MockResource.objects.all()
+    elif user.is_moderator:
+        return MockResource.objects.filter(effective_level__lte=ACCESS_CEILINGS['moderator']['any'])
+    else:  # Regular user
+        # Users can see their own resources up to level 2, and public resources
+        ceilings = ACCESS_CEILINGS['user']
+        return MockResource.objects.filter(
+            models.Q(owner=user, effective_level__lte=ceilings['own']) |
+            models.Q(effective_level__lte=ceilings['any'])
+        )
+
+
+def reconcile_effective_levels(batch_size=10000, fix=False, progress=None):
+    """
+    Compare effective_level with its source fields in primary key ranges of
+    ``batch_size``, recomputing stale rows with ``fix``. ``progress`` is
+    called with the range start and the last primary key after each range.
+    Returns ``(stale rows, up to 10 sample ids)``.
+    """
+    last_pk = MockResource.objects.aggregate(last=models.Max('pk'))['last'] or 0
+
+    mismatched = 0
+    samples = []
+    for start in range(0, last_pk + 1, batch_size):
+        pks = list(
+            MockResource.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+            .annotate(expected=effective_level_expression())
+            .exclude(effective_level=models.F('expected'))
+            .values_list('pk', flat=True)
+        )
+        if pks:
+            mismatched += len(pks)
+            samples.extend(pks[:10 - len(samples)])
+            if fix:
+                MockResource.objects.filter(pk__in=pks).update(
+                    effective_level=effective_level_expression()
+                )
+        if progress is not None:
+            progress(min(start + batch_size, last_pk), last_pk)
+    return mismatched, samples
+
+
+class ArchivedResource(models.Model):
+    """
+    Resource moved out of ``mock_resources`` together with its archived owner
+    """
+    id = models.BigIntegerField(primary_key=True)
+    tenant_id = models.BigIntegerField()
+    name = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    category_id = models.BigIntegerField()
+    sensitivity_level = models.IntegerField()
+    owner_id = models.BigIntegerField(db_index=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    COPIED_FIELDS = (
+        'id', 'tenant_id', 'name', 'description', 'category_id', 'sensitivity_level',
+        'owner_id', 'created_at', 'updated_at',
+    )
+
+    class Meta:
+        db_table = 'mock_resources_archive'
+
+    def __str__(self):
+        return f"{self.name} (archived)"
+
+
+class ResourceChange(TenantScopedModel):
+    """
+    Append-only change log for resources and categories.
+
+    The auto-increment ``id`` is the change-feed cursor. Visibility inputs are
+    stored for both the new and the previous state, so deleted rows and rows
+    that left a caller's visible set can still be filtered by role.
+    """
+    OBJECT_TYPES = (
+        ('resource', 'Resource'),
+        ('category', 'Category'),
+    )
+    ACTIONS = (
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+    )
+
+    object_type = models.CharField(max_length=20, choices=OBJECT_TYPES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+
+    # Visibility inputs after and before the change
+    effective_level = models.IntegerField(null=True)
+    previous_effective_level = models.IntegerField(null=True)
+    owner_id = models.BigIntegerField(null=True)
+    previous_owner_id = models.BigIntegerField(null=True)
+    access_level = models.CharField(max_length=20, blank=True)
+    previous_access_level = models.CharField(max_length=20, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'resource_changes'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['tenant', 'id'], name='resource_changes_tenant_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.object_type} {self.object_id} {self.action}"
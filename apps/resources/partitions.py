@@ -0,0 +1,183 @@
+"""
+Monthly range partitioning of ``mock_resources`` by ``created_at``
+(PostgreSQL only).
+
+Partitions are named ``mock_resources_pYYYYMM`` and cover one calendar month
+in UTC. A ``mock_resources_default`` partition catches rows outside the
+prepared range, so inserts never fail when partitions were not created in
+time; such rows move to their partition once it is created. Expired
+partitions are detached, which is a catalog change instead of a large
+``DELETE``, and committed on their own. Logging their rows to the change
+feed and archiving them then works on the standalone table, which is kept
+as ``mock_resources_detached_pYYYYMM`` or moved to
+``mock_resources_archive``. A detached table not processed yet keeps its
+partition name, so an interrupted run is completed by the next one.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from config import partitioning
+
+from .changefeed import changed_resource_ids, record_table_deleted
+from .models import ArchivedResource, MockResource
+
+TABLE = MockResource._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+DETACHED_PREFIX = f'{TABLE}_detached_p'
+# Longest wait for the lock on mock_resources before a detach gives up
+DETACH_LOCK_TIMEOUT = '5s'
+
+
+def month_start(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def partition_month(name):
+    """Month covered by a partition created here, ``None`` for other tables"""
+    prefix = f'{TABLE}_p'
+    if not name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(name[len(prefix):], '%Y%m').replace(tzinfo=dt_timezone.utc)
+    except ValueError:
+        return None
+
+
+def _bounds(month):
+    return f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def _months(first, last):
+    month = first
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def is_range_partitioned():
+    return connection.vendor == 'postgresql' and partitioning.partition_strategy(TABLE) == 'range'
+
+
+def convert(months_ahead, batch_size=50000, stdout=None):
+    """Migrate the plain table to monthly partitions without downtime"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min("created_at") FROM {connection.ops.quote_name(TABLE)}')
+        oldest = cursor.fetchone()[0]
+    current = month_start(timezone.now())
+    first = month_start(oldest) if oldest else current
+
+    partitions = [
+        (partition_name(month), _bounds(month))
+        for month in _months(first, add_months(current, months_ahead))
+    ]
+    partitions.append((DEFAULT_PARTITION, 'DEFAULT'))
+    partitioning.convert_to_partitioned(
+        TABLE,
+        partition_by='RANGE (created_at)',
+        partition_key='created_at',
+        partitions=partitions,
+        changed_ids=changed_resource_ids,
+        batch_size=batch_size,
+        stdout=stdout,
+    )
+
+
+def _default_holds(condition, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {connection.ops.quote_name(DEFAULT_PARTITION)} '
+            f'WHERE {condition})',
+            params,
+        )
+        return cursor.fetchone()[0]
+
+
+def create_future_partitions(months_ahead):
+    """
+    Create the partitions up to ``months_ahead`` months from now. Returns the
+    new names and ``(name, error)`` of the months that failed.
+    """
+    existing = set(partitioning.attached_partitions(TABLE))
+    has_default = DEFAULT_PARTITION in existing
+    current = month_start(timezone.now())
+    created, failed = [], []
+    for month in _months(current, add_months(current, months_ahead)):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        condition = '"created_at" >= %s AND "created_at" < %s'
+        params = [month, add_months(month, 1)]
+        try:
+            if has_default and _default_holds(condition, params):
+                partitioning.split_default_partition(
+                    TABLE, DEFAULT_PARTITION, name, _bounds(month), condition, params,
+                )
+            else:
+                partitioning.create_partition(TABLE, name, _bounds(month))
+        except DatabaseError as exc:
+            failed.append((name, str(exc).strip()))
+            continue
+        created.append(name)
+    return created, failed
+
+
+def expired_partitions(retention_months):
+    """Attached monthly partitions entirely older than the retention window"""
+    cutoff = add_months(month_start(timezone.now()), -retention_months)
+    return [
+        name for name in partitioning.attached_partitions(TABLE)
+        if (partition_month(name) or cutoff) < cutoff
+    ]
+
+
+def _detached_pending():
+    """Detached monthly partitions whose rows were not logged or archived yet"""
+    return [name for name in partitioning.standalone_tables(f'{TABLE}_p') if partition_month(name)]
+
+
+def detach_expired(retention_months, archive=False):
+    """
+    Detach partitions older than ``retention_months``, then log their rows
+    as deleted and keep the tables as ``mock_resources_detached_pYYYYMM``,
+    or with ``archive`` copy the rows to ``mock_resources_archive`` and drop
+    the tables. Returns the names processed.
+    """
+    quote = connection.ops.quote_name
+    for name in expired_partitions(retention_months):
+        # Only the catalog change holds the lock on mock_resources
+        partitioning.detach_partition(TABLE, name, lock_timeout=DETACH_LOCK_TIMEOUT)
+
+    processed = []
+    for name in _detached_pending():
+        with transaction.atomic():
+            record_table_deleted(name)
+            with connection.cursor() as cursor:
+                if archive:
+                    columns = ', '.join(quote(field) for field in ArchivedResource.COPIED_FIELDS)
+                    now = ArchivedResource._meta.get_field('archived_at').get_db_prep_value(
+                        timezone.now(), connection
+                    )
+                    cursor.execute(
+                        f'INSERT INTO {quote(ArchivedResource._meta.db_table)} '
+                        f'({columns}, {quote("archived_at")}) '
+                        f'SELECT {columns}, %s FROM {quote(name)}',
+                        [now],
+                    )
+                    cursor.execute(f'DROP TABLE {quote(name)}')
+                else:
+                    kept = DETACHED_PREFIX + name[len(f'{TABLE}_p'):]
+                    cursor.execute(f'ALTER TABLE {quote(name)} RENAME TO {quote(kept)}')
+        processed.append(name)
+    return processed
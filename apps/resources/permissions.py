@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .models import ACCESS_CEILINGS, ACCESS_LEVEL_RANKS
+
 
 class ResourceAccessPermission(permissions.BasePermission):
     """
@@ -23,13 +25,16 @@ class ResourceAccessPermission(permissions.BasePermission):
         if user.is_administrator:
             return True
 
-        # Moderators can access up to level 3 resources
+        # Moderators can access up to level 3 resources and categories
         if user.is_moderator:
-            return obj.sensitivity_level <= 3
+            ceiling = ACCESS_CEILINGS['moderator']['any']
+            if hasattr(obj, 'effective_level'):
+                return obj.effective_level <= ceiling
+            return ACCESS_LEVEL_RANKS.get(obj.access_level, 4) <= ceiling
 
         # Regular users can only access their own resources up to level 2
         if hasattr(obj, 'owner'):
-            return (obj.owner == user and obj.sensitivity_level <= 2)
+            return (obj.owner == user and obj.effective_level <= ACCESS_CEILINGS['user']['own'])
 
         # For categories, regular users can only see up to internal level
         if hasattr(obj, 'access_level'):
@@ -26,3 +26,98 @@ class MockResourceCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = MockResource
         fields = ('name', 'description', 'category', 'sensitivity_level')
+
+
+class CategoryFacetSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class SensitivityLevelFacetSerializer(serializers.Serializer):
+    value = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class OwnerFacetSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    email = serializers.EmailField()
+    count = serializers.IntegerField()
+
+
+class ResourceFacetsSerializer(serializers.Serializer):
+    total = serializers.IntegerField()
+    category = CategoryFacetSerializer(many=True)
+    sensitivity_level = SensitivityLevelFacetSerializer(many=True)
+    owner = OwnerFacetSerializer(many=True)
+    cached = serializers.BooleanField()
+
+
+class ResourceExportJobSerializer(serializers.Serializer):
+    """Payload of the resources.export job: the resource list filters and search"""
+    category = serializers.IntegerField(min_value=1, required=False)
+    sensitivity_level = serializers.ChoiceField(
+        choices=MockResource._meta.get_field('sensitivity_level').choices, required=False,
+    )
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    days = serializers.FloatField(min_value=0, required=False)
+    search = serializers.CharField(required=False, allow_blank=True)
+
+
+class EffectiveLevelJobSerializer(serializers.Serializer):
+    """Payload of the resources.reconcile_effective_levels job"""
+    batch_size = serializers.IntegerField(min_value=100, max_value=100000, default=10000)
+    fix = serializers.BooleanField(default=False)
+
+
+class RoleCeilingSerializer(serializers.Serializer):
+    """Highest effective level a role sees; 0 hides every resource"""
+    any = serializers.IntegerField(min_value=0, max_value=4, required=False)
+    own = serializers.IntegerField(min_value=0, max_value=4, required=False)
+
+
+class RuleTableSerializer(serializers.Serializer):
+    user = RoleCeilingSerializer(required=False)
+    moderator = RoleCeilingSerializer(required=False)
+    admin = RoleCeilingSerializer(required=False)
+
+
+class ResourceMoveSerializer(serializers.Serializer):
+    """Resources matching every given criterion get the set_* values"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False,
+                                max_length=100000)
+    category = serializers.IntegerField(min_value=1, required=False)
+    sensitivity_level = serializers.IntegerField(min_value=1, max_value=4, required=False)
+    set_category = serializers.IntegerField(min_value=1, required=False)
+    set_sensitivity_level = serializers.IntegerField(min_value=1, max_value=4, required=False)
+
+    def validate(self, attrs):
+        if not any(field in attrs for field in ('ids', 'category', 'sensitivity_level')):
+            raise serializers.ValidationError('Match resources on ids, category or sensitivity_level.')
+        if not any(field in attrs for field in ('set_category', 'set_sensitivity_level')):
+            raise serializers.ValidationError('Set set_category and/or set_sensitivity_level.')
+        return attrs
+
+
+class AccessSimulationSerializer(serializers.Serializer):
+    """Proposed changes to the access rules and resources, see apps.resources.simulation"""
+    rules = RuleTableSerializer(required=False)
+    category_access_levels = serializers.DictField(
+        child=serializers.ChoiceField(choices=ResourceCategory._meta.get_field('access_level').choices),
+        required=False, help_text='Category id -> proposed access level',
+    )
+    moves = ResourceMoveSerializer(many=True, required=False)
+
+
+class AccessIndexRefreshSerializer(serializers.Serializer):
+    """Refresh of the reverse access index, also the resources.refresh_access_index job payload"""
+    full = serializers.BooleanField(default=False, help_text='Rebuild from scratch')
+
+
+class DeletionRequestSerializer(serializers.Serializer):
+    """Chunked deletion of a category or user, see apps.resources.deletion"""
+    reassign_to = serializers.IntegerField(
+        min_value=1, required=False, allow_null=True, default=None,
+        help_text='Move the resources to this category (or owner) instead of deleting them',
+    )
@@ -0,0 +1,361 @@
+"""
+What-if simulation of resource access.
+
+Access depends on a user only through the user's role and whether the user
+owns the resource (``ACCESS_CEILINGS``): a role sees every resource up to
+its ``any`` ceiling and its own resources up to its ``own`` ceiling. For
+each resource and role the users × resources pairs therefore reduce to the
+owner and "every other active user of the role", and the exact number of
+pairs gaining or losing access comes from per-role user counts and
+vectorized comparisons over the resource arrays. Resources are evaluated in
+chunks of ``SIMULATION_CHUNK_SIZE`` so temporaries stay bounded.
+
+``load_snapshot`` reads the active users (pk, role) and the resources
+(owner, sensitivity level, category) of the current tenant into NumPy
+arrays of a few bytes per row. ``get_snapshot`` keeps one per tenant and
+process for ``SIMULATION_SNAPSHOT_TTL`` seconds, or until a resource
+changes. ``simulate`` evaluates a proposal:
+
+* ``rules``: new ``any``/``own`` ceilings per role
+* ``category_access_levels``: new access level per category id
+* ``moves``: resources matched on their current ids, category and/or
+  sensitivity level get a new category and/or sensitivity level
+
+Gains are reported under the proposed category and effective level of a
+resource, losses under the current ones.
+"""
+import itertools
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from apps.tenants.context import get_current_tenant_id
+from apps.users.models import User
+from .changefeed import head_cursor
+from .models import ACCESS_CEILINGS, ACCESS_LEVEL_RANKS, MockResource, ResourceCategory
+
+ROLES = ('user', 'moderator', 'admin')
+LEVELS = (1, 2, 3, 4)
+# Rows per database round trip while loading
+FETCH_CHUNK = 20000
+
+
+class SimulationError(ValueError):
+    """The proposal refers to unknown categories or values"""
+
+
+class Snapshot:
+    """Active users and resources of one tenant as NumPy arrays"""
+
+    def __init__(self, user_pks, user_roles, category_pks, category_ranks, category_info,
+                 resource_pks, owners, sensitivity, categories):
+        # Users sorted by pk; roles as indexes into ROLES
+        self.user_pks = user_pks
+        self.user_roles = user_roles
+        self.role_counts = np.bincount(user_roles, minlength=len(ROLES)).astype(np.int64)
+        # Categories sorted by pk, with access level rank, name and level
+        self.category_pks = category_pks
+        self.category_ranks = category_ranks
+        self.category_info = category_info
+        # Resources: owner as index into the user arrays (-1: inactive
+        # owner), category as index into the category arrays
+        self.resource_pks = resource_pks
+        self.owners = owners
+        self.sensitivity = sensitivity
+        self.categories = categories
+        self.loaded_at = time.monotonic()
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.user_pks, self.user_roles, self.category_pks, self.category_ranks,
+            self.resource_pks, self.owners, self.sensitivity, self.categories,
+        ))
+
+
+def _fetch(queryset, fields):
+    """``values_list`` rows as an int64 array, without a list of tuples in between"""
+    rows = queryset.order_by().values_list(*fields).iterator(chunk_size=FETCH_CHUNK)
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64)
+    return flat.reshape(-1, len(fields))
+
+
+def load_snapshot():
+    """Read the current tenant's active users and resources"""
+    pks, roles = [], []
+    for code, role in enumerate(ROLES):
+        role_pks = _fetch(User.objects.filter(is_active=True, role=role), ['pk'])[:, 0]
+        pks.append(role_pks)
+        roles.append(np.full(len(role_pks), code, dtype=np.int8))
+    user_pks = np.concatenate(pks)
+    order = np.argsort(user_pks)
+    user_pks, user_roles = user_pks[order], np.concatenate(roles)[order]
+
+    categories = sorted(ResourceCategory.objects.values_list('pk', 'name', 'access_level'))
+    category_pks = np.array([pk for pk, _, _ in categories], dtype=np.int64)
+    category_ranks = np.array([ACCESS_LEVEL_RANKS.get(level, 4) for _, _, level in categories],
+                              dtype=np.int8)
+    category_info = [(name, level) for _, name, level in categories]
+
+    rows = _fetch(MockResource.objects.all(), ['pk', 'owner_id', 'sensitivity_level', 'category_id'])
+    owners = np.searchsorted(user_pks, rows[:, 1])
+    found = owners < len(user_pks)
+    found[found] = user_pks[owners[found]] == rows[found, 1]
+    owners = np.where(found, owners, -1).astype(np.int32)
+
+    return Snapshot(
+        user_pks, user_roles, category_pks, category_ranks, category_info,
+        resource_pks=rows[:, 0].copy(),
+        owners=owners,
+        sensitivity=rows[:, 2].astype(np.int8),
+        categories=np.searchsorted(category_pks, rows[:, 3]).astype(np.int32),
+    )
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot():
+    """Cached snapshot of the current tenant; returns ``(snapshot, cached)``"""
+    tenant_id = get_current_tenant_id()
+    head = head_cursor()
+    with _snapshots_lock:
+        cached = _snapshots.get(tenant_id)
+    if (cached is not None and cached[0] == head
+            and time.monotonic() - cached[1].loaded_at < settings.SIMULATION_SNAPSHOT_TTL):
+        return cached[1], True
+
+    snapshot = load_snapshot()
+    with _snapshots_lock:
+        _snapshots[tenant_id] = (head, snapshot)
+    return snapshot, False
+
+
+def _rule_table(rules=None):
+    table = {role: dict(ACCESS_CEILINGS[role]) for role in ROLES}
+    for role, ceilings in (rules or {}).items():
+        if role not in table:
+            raise SimulationError(f'Unknown role "{role}"')
+        table[role].update(ceilings)
+    for ceilings in table.values():
+        # Owners always see at least what everyone of their role sees
+        ceilings['own'] = max(ceilings['own'], ceilings['any'])
+    any_ceiling = np.array([table[role]['any'] for role in ROLES], dtype=np.int8)
+    own_ceiling = np.array([table[role]['own'] for role in ROLES], dtype=np.int8)
+    return table, any_ceiling, own_ceiling
+
+
+def _category_index(snapshot, pk):
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise SimulationError(f'Invalid category id "{pk}"')
+    index = int(np.searchsorted(snapshot.category_pks, pk))
+    if index >= len(snapshot.category_pks) or snapshot.category_pks[index] != pk:
+        raise SimulationError(f'Unknown category {pk}')
+    return index
+
+
+def _compile_moves(snapshot, moves):
+    compiled = []
+    for move in moves or ():
+        ids = move.get('ids')
+        compiled.append({
+            'ids': np.unique(np.asarray(ids, dtype=np.int64)) if ids else None,
+            'category': (_category_index(snapshot, move['category'])
+                         if move.get('category') is not None else None),
+            'sensitivity_level': move.get('sensitivity_level'),
+            'set_category': (_category_index(snapshot, move['set_category'])
+                             if move.get('set_category') is not None else None),
+            'set_sensitivity_level': move.get('set_sensitivity_level'),
+        })
+    return compiled
+
+
+def _apply_moves(moves, resource_pks, sensitivity, categories):
+    """Proposed sensitivity and category of a chunk; matching uses current values"""
+    if not moves:
+        return sensitivity, categories
+    new_sensitivity, new_categories = sensitivity.copy(), categories.copy()
+    for move in moves:
+        matched = np.ones(len(resource_pks), dtype=bool)
+        if move['ids'] is not None:
+            matched &= np.isin(resource_pks, move['ids'], assume_unique=False)
+        if move['category'] is not None:
+            matched &= categories == move['category']
+        if move['sensitivity_level'] is not None:
+            matched &= sensitivity == move['sensitivity_level']
+        if move['set_category'] is not None:
+            new_categories[matched] = move['set_category']
+        if move['set_sensitivity_level'] is not None:
+            new_sensitivity[matched] = move['set_sensitivity_level']
+    return new_sensitivity, new_categories
+
+
+class _RoleUsers:
+    """Tracks which users of a role gain (or lose) at least one resource"""
+
+    def __init__(self):
+        # Resources whose change applies to every non-owner of the role
+        self.shared = 0
+        # Some of them belong to users of other roles
+        self.foreign = False
+        # Up to two distinct owners of them within the role
+        self.owners = set()
+
+    def add(self, shared, mine, owners):
+        if not shared.any():
+            return
+        self.shared += int(np.count_nonzero(shared))
+        self.foreign = self.foreign or bool((shared & ~mine).any())
+        if len(self.owners) < 2:
+            self.owners.update(int(owner) for owner in np.unique(owners[shared & mine])[:2])
+
+    def count(self, role_users, owner_flags):
+        """``owner_flags`` marks the users of the role changed through their own resources"""
+        if not self.shared:
+            return int(np.count_nonzero(owner_flags))
+        if self.foreign or len(self.owners) > 1:
+            return int(role_users)
+        # Every changed resource belongs to one user: all others are affected
+        (owner,) = self.owners
+        return int(role_users) - 1 + int(owner_flags[owner])
+
+
+def simulate(snapshot, proposal, chunk_size=None, progress=None):
+    """
+    Access deltas of ``proposal`` against the current rules. ``progress`` is
+    called with the number of resources evaluated after each chunk.
+    """
+    started = time.perf_counter()
+    chunk_size = chunk_size or settings.SIMULATION_CHUNK_SIZE
+    current_table, any_before, own_before = _rule_table()
+    proposed_table, any_after, own_after = _rule_table(proposal.get('rules'))
+
+    ranks_before = snapshot.category_ranks
+    ranks_after = ranks_before.copy()
+    proposed_levels = {}
+    for pk, level in (proposal.get('category_access_levels') or {}).items():
+        if level not in ACCESS_LEVEL_RANKS:
+            raise SimulationError(f'Unknown access level "{level}"')
+        index = _category_index(snapshot, pk)
+        ranks_after[index] = ACCESS_LEVEL_RANKS[level]
+        proposed_levels[index] = level
+    moves = _compile_moves(snapshot, proposal.get('moves'))
+
+    roles, categories = len(ROLES), len(snapshot.category_pks)
+    pairs_gained = np.zeros(roles, dtype=np.int64)
+    pairs_lost = np.zeros(roles, dtype=np.int64)
+    resources_gained = np.zeros(roles, dtype=np.int64)
+    resources_lost = np.zeros(roles, dtype=np.int64)
+    # bincount weights are float64, exact far beyond 10^11 pairs
+    gained_by_category = np.zeros((roles, categories))
+    lost_by_category = np.zeros((roles, categories))
+    gained_by_level = np.zeros((roles, len(LEVELS) + 1))
+    lost_by_level = np.zeros((roles, len(LEVELS) + 1))
+    owners_gaining = np.zeros(len(snapshot.user_pks), dtype=bool)
+    owners_losing = np.zeros(len(snapshot.user_pks), dtype=bool)
+    users_gaining = [_RoleUsers() for _ in ROLES]
+    users_losing = [_RoleUsers() for _ in ROLES]
+    changed = 0
+
+    total = len(snapshot.resource_pks)
+    for start in range(0, total, chunk_size):
+        window = slice(start, start + chunk_size)
+        sensitivity = snapshot.sensitivity[window]
+        category = snapshot.categories[window]
+        owners = snapshot.owners[window]
+        new_sensitivity, new_category = _apply_moves(
+            moves, snapshot.resource_pks[window], sensitivity, category,
+        )
+        level_before = np.maximum(sensitivity, ranks_before[category])
+        level_after = np.maximum(new_sensitivity, ranks_after[new_category])
+        changed += int(np.count_nonzero((level_before != level_after) | (category != new_category)))
+
+        owned = owners >= 0
+        owner_roles = np.where(owned, snapshot.user_roles[np.where(owned, owners, 0)], -1)
+
+        for code in range(roles):
+            mine = owner_roles == code
+            others = snapshot.role_counts[code] - mine
+            # Non-owners see up to the "any" ceiling, owners up to "own"
+            seen_before = level_before <= any_before[code]
+            seen_after = level_after <= any_after[code]
+            owned_before = mine & (level_before <= own_before[code])
+            owned_after = mine & (level_after <= own_after[code])
+
+            shared_gain = seen_after & ~seen_before & (others > 0)
+            shared_loss = seen_before & ~seen_after & (others > 0)
+            owner_gain = owned_after & ~owned_before
+            owner_loss = owned_before & ~owned_after
+            gained = others * shared_gain + owner_gain
+            lost = others * shared_loss + owner_loss
+
+            pairs_gained[code] += int(gained.sum())
+            pairs_lost[code] += int(lost.sum())
+            resources_gained[code] += int(np.count_nonzero(gained))
+            resources_lost[code] += int(np.count_nonzero(lost))
+            gained_by_category[code] += np.bincount(new_category, weights=gained, minlength=categories)
+            lost_by_category[code] += np.bincount(category, weights=lost, minlength=categories)
+            gained_by_level[code] += np.bincount(level_after, weights=gained, minlength=len(LEVELS) + 1)
+            lost_by_level[code] += np.bincount(level_before, weights=lost, minlength=len(LEVELS) + 1)
+            owners_gaining[owners[owner_gain]] = True
+            owners_losing[owners[owner_loss]] = True
+            users_gaining[code].add(shared_gain, mine, owners)
+            users_losing[code].add(shared_loss, mine, owners)
+
+        if progress is not None:
+            progress(min(start + chunk_size, total))
+
+    report_roles = {}
+    for code, role in enumerate(ROLES):
+        in_role = snapshot.user_roles == code
+        report_roles[role] = {
+            'users': int(snapshot.role_counts[code]),
+            'users_gaining': users_gaining[code].count(snapshot.role_counts[code],
+                                                       owners_gaining & in_role),
+            'users_losing': users_losing[code].count(snapshot.role_counts[code],
+                                                     owners_losing & in_role),
+            'pairs_gained': int(pairs_gained[code]),
+            'pairs_lost': int(pairs_lost[code]),
+            'resources_gained': int(resources_gained[code]),
+            'resources_lost': int(resources_lost[code]),
+        }
+
+    report_categories = []
+    for index, pk in enumerate(snapshot.category_pks):
+        deltas = {
+            role: {'gained': int(gained_by_category[code, index]),
+                   'lost': int(lost_by_category[code, index])}
+            for code, role in enumerate(ROLES)
+        }
+        if index not in proposed_levels and not any(
+                delta['gained'] or delta['lost'] for delta in deltas.values()):
+            continue
+        name, level = snapshot.category_info[index]
+        report_categories.append({
+            'id': int(pk), 'name': name, 'access_level': level,
+            'proposed_access_level': proposed_levels.get(index, level), 'roles': deltas,
+        })
+
+    report_levels = [
+        {'level': level, 'roles': {
+            role: {'gained': int(gained_by_level[code, level]), 'lost': int(lost_by_level[code, level])}
+            for code, role in enumerate(ROLES)
+        }}
+        for level in LEVELS
+    ]
+
+    return {
+        'users': len(snapshot.user_pks),
+        'resources': total,
+        'changed_resources': changed,
+        'rules': {'current': current_table, 'proposed': proposed_table},
+        'roles': report_roles,
+        'categories': report_categories,
+        'levels': report_levels,
+        'evaluate_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
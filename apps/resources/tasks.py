@@ -0,0 +1,113 @@
+"""
+Background jobs of the resources app, run by "manage.py run_workers"
+"""
+import csv
+import os
+
+from django.db.models import Q
+
+from apps.jobs.queue import PermanentError
+from apps.jobs.registry import task
+from . import deletion
+from .filters import MockResourceFilter
+from .models import reconcile_effective_levels, visible_resources
+from .serializers import (
+    AccessIndexRefreshSerializer, AccessSimulationSerializer, EffectiveLevelJobSerializer,
+    ResourceExportJobSerializer,
+)
+
+EXPORT_COLUMNS = ('id', 'name', 'description', 'category', 'sensitivity_level',
+                  'effective_level', 'owner', 'created_at', 'updated_at')
+# Rows fetched per round trip, and between two progress reports
+EXPORT_CHUNK = 2000
+
+
+@task('resources.export', roles=('user', 'moderator', 'admin'),
+      serializer=ResourceExportJobSerializer)
+def export(run, search='', **filters):
+    """Write the resources visible to the requester, filtered like the list, as CSV"""
+    user = run.user
+    if user is None or not user.is_active:
+        raise PermanentError('Exports run with the visibility of an active user')
+
+    filterset = MockResourceFilter(data=filters, queryset=visible_resources(user))
+    if not filterset.is_valid():
+        raise PermanentError(f'Invalid filters: {dict(filterset.errors)}')
+    queryset = filterset.qs
+    # Same matching as the list's SearchFilter: every term in name or description
+    for term in search.split():
+        queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+    queryset = queryset.select_related('category', 'owner').order_by('pk')
+
+    run.progress(0, queryset.count())
+    path = run.artifact_path('resources.csv')
+    partial = path.with_name(path.name + '.part')
+    written = 0
+    try:
+        with open(partial, 'w', newline='', encoding='utf-8') as stream:
+            writer = csv.writer(stream)
+            writer.writerow(EXPORT_COLUMNS)
+            for resource in queryset.iterator(chunk_size=EXPORT_CHUNK):
+                writer.writerow([
+                    resource.pk, resource.name, resource.description, resource.category.name,
+                    resource.sensitivity_level, resource.effective_level, resource.owner.email,
+                    resource.created_at.isoformat(), resource.updated_at.isoformat(),
+                ])
+                written += 1
+                if written % EXPORT_CHUNK == 0:
+                    run.progress(written)
+        # Only complete files are ever served
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+    run.progress(written)
+    return {'rows': written, 'artifact': path.name}
+
+
+@task('resources.reconcile_effective_levels', roles=('admin',),
+      serializer=EffectiveLevelJobSerializer)
+def reconcile(run, batch_size=10000, fix=False):
+    """Check effective_level of every resource, recomputing stale rows with fix"""
+    mismatched, samples = reconcile_effective_levels(
+        batch_size, fix=fix, progress=lambda done, total: run.progress(done, total),
+    )
+    return {'stale': mismatched, 'fixed': mismatched if fix else 0, 'samples': samples}
+
+
+@task('resources.simulate_access', roles=('admin',), serializer=AccessSimulationSerializer)
+def simulate_access(run, **proposal):
+    """Report the access deltas of proposed rules, category levels and moves"""
+    from .simulation import SimulationError, load_snapshot, simulate
+
+    snapshot = load_snapshot()
+    total = len(snapshot.resource_pks)
+    run.progress(0, total)
+    try:
+        return simulate(snapshot, proposal, progress=lambda done: run.progress(done, total))
+    except SimulationError as exc:
+        raise PermanentError(str(exc))
+
+
+@task('resources.refresh_access_index', roles=('admin',), serializer=AccessIndexRefreshSerializer)
+def refresh_access_index(run, full=False):
+    """Apply pending changes to the tenant's reverse access index, or rebuild it"""
+    from .access_index import update_index
+
+    return update_index(full=full).stats()
+
+
+# Internal: queued by request_category_deletion only, which hides the
+# category and keeps one deletion per category
+@task(deletion.CATEGORY_TASK, roles=())
+def delete_category(run, category, reassign_to=None):
+    """Delete the resources of a category (or move them) in primary key ranges, then the category"""
+    # A retried job continues the count of its earlier attempts
+    before = run.job.progress_done
+    try:
+        return deletion.delete_category(
+            category, reassign_to,
+            progress=lambda done, total: run.progress(before + done, before + total),
+        )
+    except deletion.DeletionError as exc:
+        raise PermanentError(str(exc))
@@ -10,8 +10,17 @@ urlpatterns = [
 
     # Mock resources
     path('resources/', views.MockResourceListView.as_view(), name='resource-list'),
+    path('resources/facets/', views.MockResourceFacetsView.as_view(), name='resource-facets'),
     path('resources/<int:pk>/', views.MockResourceDetailView.as_view(), name='resource-detail'),
     path('my-resources/', views.MyResourcesView.as_view(), name='my-resources'),
+    path('changes/', views.change_feed, name='change-feed'),
+    path('access-simulation/', views.access_simulation_view, name='access-simulation'),
+    path('access-index/', views.access_index_view, name='access-index'),
+    path('access-index/refresh/', views.access_index_refresh_view, name='access-index-refresh'),
+    path('access-index/resources/<int:pk>/users/', views.access_index_readers_view,
+         name='access-index-readers'),
+    path('access-index/users/<int:pk>/resources/', views.access_index_resources_view,
+         name='access-index-resources'),
 
     # Test endpoints
     path('access-test/', views.access_test_view, name='access-test'),
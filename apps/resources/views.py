@@ -1,18 +1,32 @@
-from rest_framework import generics, filters
+import time
+
+from rest_framework import generics, filters, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
 from django.db.models import Q
+from django.shortcuts import get_object_or_404
 
-from .models import ResourceCategory, MockResource
+from . import changefeed, deletion
+from .facets import cached_facet_counts
+from .filters import MockResourceFilter
+from .models import ResourceCategory, MockResource, visible_resources
 from .serializers import (
     ResourceCategorySerializer, MockResourceSerializer,
-    MockResourceCreateSerializer
+    MockResourceCreateSerializer, ResourceFacetsSerializer, AccessSimulationSerializer,
+    AccessIndexRefreshSerializer, DeletionRequestSerializer,
 )
 from .permissions import (
     ResourceAccessPermission, CanCreateResourcePermission,
 )
-from apps.users.permissions import IsAuthenticated, IsModeratorOrAdmin
+from apps.jobs.queue import enqueue
+from apps.jobs.serializers import JobSerializer
+from apps.users.models import User
+from apps.users.permissions import IsAuthenticated, IsAdministrator, IsModeratorOrAdmin
+from config.counting import count_queryset
+from config.db_routing import pin_to_primary
+from config.throttling import throttle_metrics
 
 
 class ResourceCategoryListView(generics.ListAPIView):
@@ -27,6 +41,8 @@ class ResourceCategoryListView(generics.ListAPIView):
     search_fields = ['name', 'description']
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation
+            return ResourceCategory.objects.none()
         user = self.request.user
 
         # Filter categories based on user role and access level
@@ -45,44 +61,69 @@ class ResourceCategoryListView(generics.ListAPIView):
             )
 
 
-class ResourceCategoryDetailView(generics.RetrieveAPIView):
+class ResourceCategoryDetailView(generics.RetrieveDestroyAPIView):
     """
-    Retrieve specific resource category
+    Retrieve specific resource category, or delete it in the background
+    (admins only)
     """
-    queryset = ResourceCategory.objects.all()
     serializer_class = ResourceCategorySerializer
     permission_classes = [IsAuthenticated, ResourceAccessPermission]
 
+    def get_queryset(self):
+        return ResourceCategory.objects.all()
+
+    # Schema details: config.openapi.describe_views
+    def delete(self, request, *args, **kwargs):
+        """
+        Hide the category at once and queue a job deleting its resources in
+        small batches (or moving them to ?reassign_to=<category id>), then
+        the category. Repeating the request resumes an interrupted deletion.
+        """
+        return super().delete(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        if not request.user.is_administrator:
+            return Response({'error': 'Only administrators can delete categories.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        # Categories pending deletion are hidden, but the request may resume them
+        category = get_object_or_404(ResourceCategory.all_objects, pk=kwargs['pk'])
+        serializer = DeletionRequestSerializer(data=request.data or request.query_params)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job, created = deletion.request_category_deletion(
+                category, serializer.validated_data['reassign_to'], user=request.user,
+            )
+        except deletion.DeletionInProgress as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+        except deletion.DeletionError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(JobSerializer(job).data,
+                        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
 
-class MockResourceListView(generics.ListCreateAPIView):
+class VisibleResourcesMixin:
     """
-    List and create mock resources with access control
+    Resources visible to the caller, with the list filters and search
     """
-    serializer_class = MockResourceSerializer
-    permission_classes = [IsAuthenticated, CanCreateResourcePermission]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'sensitivity_level']
+    filterset_class = MockResourceFilter
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'sensitivity_level', 'name']
     ordering = ['-created_at']
 
     def get_queryset(self):
-        user = self.request.user
+        if getattr(self, 'swagger_fake_view', False):  # schema generation
+            return MockResource.objects.none()
+        # Filter based on user role
+        return visible_resources(self.request.user).select_related('category', 'owner')
 
-        # Base queryset
-        queryset = MockResource.objects.select_related('category', 'owner')
 
-        # Filter based on user role
-        if user.is_administrator:
-            return queryset
-        elif user.is_moderator:
-            return queryset.filter(sensitivity_level__lte=3)
-        else:  # Regular user
-            # Users can see their own resources up to level 2, and public resources
-            return queryset.filter(
-                Q(owner=user, sensitivity_level__lte=2) |
-                Q(sensitivity_level=1)  # Public resources
-            )
+class MockResourceListView(VisibleResourcesMixin, generics.ListCreateAPIView):
+    """
+    List and create mock resources with access control
+    """
+    serializer_class = MockResourceSerializer
+    permission_classes = [IsAuthenticated, CanCreateResourcePermission]
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -94,14 +135,44 @@ class MockResourceListView(generics.ListCreateAPIView):
         serializer.save(owner=self.request.user)
 
 
+class MockResourceFacetsView(VisibleResourcesMixin, generics.GenericAPIView):
+    """
+    Counts per category, sensitivity level and owner of the resources the
+    resource list returns for the same filters and search
+
+    Query parameters: those of the resource list, and owner_limit (number of
+    owners, default 20, max 100)
+    """
+    serializer_class = ResourceFacetsSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    pagination_class = None
+    # One GROUP BY per facet, as costly as a list
+    throttle_tier = 'list'
+
+    def get(self, request, *args, **kwargs):
+        try:
+            owner_limit = min(int(request.query_params.get('owner_limit', 20)), 100)
+        except ValueError:
+            return Response({'error': 'owner_limit must be an integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        facets, cached = cached_facet_counts(
+            self.filter_queryset(self.get_queryset()), request.user,
+            request.tenant_id, request.query_params, owner_limit,
+        )
+        return Response(self.get_serializer({**facets, 'cached': cached}).data)
+
+
 class MockResourceDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete mock resource
     """
-    queryset = MockResource.objects.select_related('category', 'owner')
     serializer_class = MockResourceSerializer
     permission_classes = [IsAuthenticated, ResourceAccessPermission]
 
+    def get_queryset(self):
+        return MockResource.objects.select_related('category', 'owner')
+
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return MockResourceCreateSerializer
@@ -115,10 +186,12 @@ class MyResourcesView(generics.ListAPIView):
     serializer_class = MockResourceSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['category', 'sensitivity_level']
+    filterset_class = MockResourceFilter
     search_fields = ['name', 'description']
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation
+            return MockResource.objects.none()
         return MockResource.objects.filter(owner=self.request.user)
 
 
@@ -158,19 +231,260 @@ def admin_dashboard(request):
     """
     Admin dashboard - only accessible by moderators and admins
     """
-    stats = {
-        'total_users': MockResource.objects.count(),
-        'total_categories': ResourceCategory.objects.count(),
-        'total_resources': MockResource.objects.count(),
-        'high_sensitivity_resources': MockResource.objects.filter(sensitivity_level__gte=3).count(),
-        'recent_resources': MockResource.objects.order_by('-created_at')[:5].count()
+    counts = {
+        'total_users': count_queryset(User.objects.all()),
+        'total_categories': count_queryset(ResourceCategory.objects.all()),
+        'total_resources': count_queryset(MockResource.objects.all()),
+        'high_sensitivity_resources': count_queryset(
+            MockResource.objects.filter(sensitivity_level__gte=3)
+        ),
     }
+    stats = {key: count for key, (count, _) in counts.items()}
+    stats['recent_resources'] = MockResource.objects.order_by('-created_at')[:5].count()
 
     return Response({
         'message': 'Welcome to Admin Dashboard',
         'stats': stats,
+        'stats_exact': {key: exact for key, (_, exact) in counts.items()},
+        # Requests allowed and throttled by this worker, per role and tier
+        'throttling': throttle_metrics(),
         'user': {
             'email': request.user.email,
             'role': request.user.role
         }
     })
+
+
+@api_view(['POST'])
+@permission_classes([IsAdministrator])
+def access_simulation_view(request):
+    """
+    Simulate changes to the access rules, category access levels or resource
+    levels (admins only): users and resource-user pairs gaining or losing
+    access per role, category and effective level. Nothing is changed.
+    """
+    serializer = AccessSimulationSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    # NumPy is only imported once someone simulates
+    from .simulation import SimulationError, get_snapshot, simulate
+
+    started = time.perf_counter()
+    snapshot, cached = get_snapshot()
+    load_ms = round((time.perf_counter() - started) * 1000, 1)
+    try:
+        report = simulate(snapshot, serializer.validated_data)
+    except SimulationError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({**report, 'load_ms': load_ms, 'snapshot_cached': cached})
+
+
+def _index_page(request):
+    """``(limit, offset)`` of an access index listing"""
+    limit = min(int(request.query_params.get('limit', 100)), 1000)
+    offset = int(request.query_params.get('offset', 0))
+    return max(limit, 0), max(offset, 0)
+
+
+def _index_state(index, started):
+    return {
+        'age_seconds': round(index.age, 1),
+        'change_cursor': index.meta['resource_cursor'],
+        'query_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def _index_unavailable(exc):
+    """Response while the first build of the tenant's index runs"""
+    return Response({'error': str(exc), 'job': exc.job.pk},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdministrator])
+def access_index_view(request):
+    """
+    State of the reverse access index of the tenant (admins only): active
+    users per role, resources per effective level, owner exceptions, size
+    """
+    from .access_index import IndexUnavailable, get_index
+
+    try:
+        return Response(get_index().stats())
+    except IndexUnavailable as exc:
+        return _index_unavailable(exc)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdministrator])
+def access_index_refresh_view(request):
+    """
+    Queue a job applying pending user and resource changes to the access
+    index, or rebuilding it with {"full": true} (admins only)
+    """
+    serializer = AccessIndexRefreshSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    from .access_index import REFRESH_TASK
+
+    job, _ = enqueue(REFRESH_TASK, serializer.validated_data, user=request.user)
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdministrator])
+def access_index_readers_view(request, pk):
+    """
+    Active users that can read a resource, from the access index (admins only)
+
+    Query parameters:
+    - user: only check whether this user can read the resource
+    - limit, offset: page of user ids (default 100, max 1000)
+    """
+    try:
+        user_id = request.query_params.get('user')
+        user_id = int(user_id) if user_id is not None else None
+        limit, offset = _index_page(request)
+    except ValueError:
+        return Response({'error': 'user, limit and offset must be integers.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    from .access_index import IndexUnavailable, get_index
+
+    started = time.perf_counter()
+    try:
+        index = get_index()
+    except IndexUnavailable as exc:
+        return _index_unavailable(exc)
+    counts = index.reader_counts(pk)
+    if counts is None:
+        return Response({'error': 'Resource not found.'}, status=status.HTTP_404_NOT_FOUND)
+    level, readers, owner = counts
+    if user_id is not None:
+        return Response({'resource': pk, 'user': user_id, 'has_access': index.can_read(user_id, pk),
+                         'index': _index_state(index, started)})
+
+    users = index.readers(pk)[offset:offset + limit]
+    return Response({
+        'resource': pk,
+        'effective_level': level,
+        'count': sum(readers.values()),
+        'roles': readers,
+        'owner_exception': owner,
+        'users': users.tolist(),
+        'index': _index_state(index, started),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdministrator])
+def access_index_resources_view(request, pk):
+    """
+    Resources an active user can read, from the access index (admins only)
+
+    Query parameters:
+    - resource: only check whether the user can read this resource
+    - limit, offset: page of resource ids (default 100, max 1000)
+    """
+    try:
+        resource_id = request.query_params.get('resource')
+        resource_id = int(resource_id) if resource_id is not None else None
+        limit, offset = _index_page(request)
+    except ValueError:
+        return Response({'error': 'resource, limit and offset must be integers.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    from .access_index import IndexUnavailable, get_index
+
+    started = time.perf_counter()
+    try:
+        index = get_index()
+    except IndexUnavailable as exc:
+        return _index_unavailable(exc)
+    counts = index.resource_counts(pk)
+    if counts is None:
+        return Response({'error': 'Active user not found.'}, status=status.HTTP_404_NOT_FOUND)
+    role, levels = counts
+    if resource_id is not None:
+        return Response({'user': pk, 'resource': resource_id,
+                         'has_access': index.can_read(pk, resource_id),
+                         'index': _index_state(index, started)})
+
+    resources = index.resources(pk)[offset:offset + limit]
+    return Response({
+        'user': pk,
+        'role': role,
+        'count': sum(levels.values()),
+        'levels': {str(level): count for level, count in levels.items()},
+        'resources': resources.tolist(),
+        'index': _index_state(index, started),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def change_feed(request):
+    """
+    Incremental changes of the resources and categories visible to the caller
+
+    Query parameters:
+    - cursor: last cursor received; omit to get the current head cursor
+    - limit: maximum number of changes (default 500, max 1000)
+    - wait: long-poll up to this many seconds when there is nothing new
+    """
+    try:
+        limit = min(int(request.query_params.get('limit', 500)), 1000)
+        wait = min(float(request.query_params.get('wait', 0)), settings.CHANGE_FEED_MAX_WAIT)
+        cursor = request.query_params.get('cursor')
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return Response(
+            {'error': 'cursor and limit must be integers, wait a number of seconds.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # The log is read on the primary (see changefeed), and so are the rows
+    # sent with it: a replica may not have them yet
+    pin_to_primary()
+    user = request.user
+    if cursor is None:
+        return Response({'cursor': changefeed.head_cursor(), 'has_more': False, 'changes': []})
+
+    if wait > 0:
+        changefeed.wait_for_changes(user, cursor, wait)
+    entries, next_cursor, has_more = changefeed.changes_since(user, cursor, max(limit, 1))
+
+    actions = {entry.id: changefeed.change_action(user, entry) for entry in entries}
+    live = {'resource': [], 'category': []}
+    for entry in entries:
+        if actions[entry.id] != 'deleted':
+            live[entry.object_type].append(entry.object_id)
+    resources = MockResource.objects.select_related('category', 'owner').in_bulk(live['resource'])
+    categories = ResourceCategory.objects.in_bulk(live['category'])
+
+    changes = []
+    for entry in entries:
+        action = actions[entry.id]
+        data = None
+        if action != 'deleted':
+            # The current row is sent, which may have left the caller's
+            # visible set after this entry was written; a later entry follows
+            resource = resources.get(entry.object_id) if entry.object_type == 'resource' else None
+            category = categories.get(entry.object_id) if entry.object_type == 'category' else None
+            if resource is not None and changefeed.resource_visible(
+                    user, resource.effective_level, resource.owner_id):
+                data = MockResourceSerializer(resource).data
+            elif category is not None and changefeed.category_visible(user, category.access_level):
+                data = ResourceCategorySerializer(category).data
+            else:
+                # Deleted or hidden after this entry was written
+                action = 'deleted'
+        changes.append({
+            'cursor': entry.id,
+            'type': entry.object_type,
+            'id': entry.object_id,
+            'action': action,
+            'data': data,
+        })
+
+    return Response({'cursor': next_cursor, 'has_more': has_more, 'changes': changes})
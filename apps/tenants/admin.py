@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Tenant
+
+
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    list_display = ('slug', 'name', 'domain', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('slug', 'name', 'domain')
+    ordering = ('slug',)
@@ -0,0 +1,8 @@
+from django.contrib.auth.backends import ModelBackend
+
+
+class TenantModelBackend(ModelBackend):
+    """
+    Email is unique per tenant only. The user manager is tenant-scoped, so
+    natural key and primary key lookups only see the current tenant's users.
+    """
@@ -0,0 +1,34 @@
+"""
+Current tenant of the running request.
+
+``TenantMiddleware`` sets it for every request. Outside a request (management
+commands, shells) no tenant is set and tenant-scoped managers return rows of
+all tenants.
+"""
+import contextvars
+from contextlib import contextmanager
+
+_current_tenant_id = contextvars.ContextVar('current_tenant_id', default=None)
+
+
+def get_current_tenant_id():
+    return _current_tenant_id.get()
+
+
+def set_current_tenant_id(tenant_id):
+    """Set the current tenant, returns a token for ``reset_current_tenant_id``"""
+    return _current_tenant_id.set(tenant_id)
+
+
+def reset_current_tenant_id(token):
+    _current_tenant_id.reset(token)
+
+
+@contextmanager
+def tenant_context(tenant_id):
+    """Scope every tenant-aware query in the block to ``tenant_id``"""
+    token = set_current_tenant_id(tenant_id)
+    try:
+        yield
+    finally:
+        reset_current_tenant_id(token)
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from .context import reset_current_tenant_id, set_current_tenant_id
+from .models import Tenant
+
+# LRU caches {('slug' | 'domain', value): (tenant_id, expires_at)}. Lookups
+# that found no tenant are kept apart, so clients sending arbitrary headers
+# only churn the small one and never evict the tenants in use.
+_resolved = OrderedDict()
+_missing = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(key, tenant_id, expires_at):
+    if tenant_id is None:
+        cache, other, size = _missing, _resolved, settings.TENANT_CACHE_MISSES
+    else:
+        cache, other, size = _resolved, _missing, settings.TENANT_CACHE_SIZE
+    with _lock:
+        other.pop(key, None)
+        cache[key] = (tenant_id, expires_at)
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+
+def _lookup(kind, value):
+    key = (kind, value)
+    now = time.monotonic()
+    with _lock:
+        cached = _resolved.get(key) or _missing.get(key)
+        if cached is not None and cached[1] > now:
+            (_resolved if cached[0] is not None else _missing).move_to_end(key)
+            return cached[0]
+
+    tenant_id = (Tenant.objects.filter(is_active=True, **{kind: value})
+                 .values_list('pk', flat=True).first())
+    _remember(key, tenant_id, now + settings.TENANT_CACHE_TTL)
+    return tenant_id
+
+
+def resolve_tenant_id(request):
+    """
+    Tenant of a request: the ``X-Tenant`` header (slug) first, then the host
+    name, then the default tenant. ``None`` for an unknown slug.
+    """
+    slug = request.headers.get(settings.TENANT_HEADER)
+    if slug:
+        return _lookup('slug', slug)
+
+    tenant_id = _lookup('domain', request.get_host().split(':')[0])
+    if tenant_id is not None:
+        return tenant_id
+    return Tenant.objects.get_default_id()
+
+
+class TenantMiddleware:
+    """
+    Resolves the tenant once per request and scopes all tenant-aware
+    querysets to it for the duration of the request
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tenant_id = resolve_tenant_id(request)
+        if tenant_id is None:
+            return JsonResponse({'detail': 'Unknown tenant.'}, status=404)
+
+        request.tenant_id = tenant_id
+        token = set_current_tenant_id(tenant_id)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_tenant_id(token)
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_tenant(apps, schema_editor):
+    """Existing single-customer data belongs to the default tenant"""
+    Tenant = apps.get_model('tenants', 'Tenant')
+    Tenant.objects.using(schema_editor.connection.alias).get_or_create(
+        slug=settings.DEFAULT_TENANT_SLUG,
+        defaults={'name': settings.DEFAULT_TENANT_SLUG.title()},
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tenant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('domain', models.CharField(blank=True, help_text='Host name resolving to this tenant', max_length=255, null=True, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'tenants',
+            },
+        ),
+        migrations.RunPython(create_default_tenant, migrations.RunPython.noop),
+    ]
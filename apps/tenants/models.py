@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db import models
+
+from .context import get_current_tenant_id
+
+
+class TenantRegistryManager(models.Manager):
+    """Manager for the Tenant model itself"""
+
+    _default_id = None
+
+    def get_default_id(self):
+        """Id of the tenant used when no tenant is resolved, cached per process"""
+        if TenantRegistryManager._default_id is None:
+            tenant, _ = self.get_or_create(
+                slug=settings.DEFAULT_TENANT_SLUG,
+                defaults={'name': settings.DEFAULT_TENANT_SLUG.title()},
+            )
+            TenantRegistryManager._default_id = tenant.pk
+        return TenantRegistryManager._default_id
+
+
+class Tenant(models.Model):
+    """
+    Customer owning users, categories and resources
+    """
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=50, unique=True)
+    domain = models.CharField(max_length=255, unique=True, null=True, blank=True,
+                              help_text='Host name resolving to this tenant')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TenantRegistryManager()
+
+    class Meta:
+        db_table = 'tenants'
+
+    def __str__(self):
+        return self.slug
+
+
+class TenantManager(models.Manager):
+    """
+    Manager scoping every queryset to the current tenant, when one is set
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        tenant_id = get_current_tenant_id()
+        if tenant_id is not None:
+            queryset = queryset.filter(tenant_id=tenant_id)
+        return queryset
+
+
+class TenantScopedModel(models.Model):
+    """
+    Abstract base for tenant-owned rows. New rows get the current tenant, or
+    the default tenant outside a request.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.PROTECT, related_name='+')
+
+    objects = TenantManager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.tenant_id is None:
+            self.tenant_id = get_current_tenant_id() or Tenant.objects.get_default_id()
+        super().save(*args, **kwargs)
@@ -1,10 +1,22 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from django.db.models import Count
+
+from apps.resources import deletion
+from apps.resources.models import MockResource
+from config.admin_scaling import BackgroundDeleteMixin, ScalableAdminMixin
+from .models import User, ArchivedUser
+from .sessions import change_role, deactivate_users
+
+
+class UserActionForm(ActionForm):
+    role = forms.ChoiceField(choices=[('', '---------'), *User.ROLE_CHOICES], required=False)
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(BackgroundDeleteMixin, ScalableAdminMixin, UserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'role', 'is_active', 'created_at')
     list_filter = ('role', 'is_active', 'created_at')
     search_fields = ('email', 'first_name', 'last_name')
@@ -25,3 +37,56 @@ class CustomUserAdmin(UserAdmin):
     )
 
     readonly_fields = ('created_at', 'updated_at', 'last_login')
+
+    action_form = UserActionForm
+    actions = ['change_role', 'soft_delete_users']
+
+    # Both actions are a single UPDATE that also revokes the sessions of the
+    # affected users, and skip the signed-in admin, who could otherwise lock
+    # themselves out
+
+    @admin.action(description='Change role of selected users', permissions=['change'])
+    def change_role(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or not form.cleaned_data['role']:
+            self.message_user(request, 'Choose a role.', messages.ERROR)
+            return
+
+        updated, revoked = change_role(queryset.exclude(pk=request.user.pk), form.cleaned_data['role'])
+        self.message_user(request, f'Changed the role of {updated} users, '
+                                   f'revoked {revoked} sessions.', messages.SUCCESS)
+
+    @admin.action(description='Soft delete selected users', permissions=['change'])
+    def soft_delete_users(self, request, queryset):
+        updated, revoked = deactivate_users(queryset.exclude(pk=request.user.pk))
+        self.message_user(request, f'Soft deleted {updated} users, '
+                                   f'revoked {revoked} sessions.', messages.SUCCESS)
+
+    def deletion_summary(self, objs):
+        counts = dict(MockResource._base_manager.filter(owner__in=objs)
+                      .values_list('owner').annotate(Count('pk')).order_by())
+        return [f'{obj} and their {counts.get(obj.pk, 0)} resources, deleted in the background'
+                for obj in objs]
+
+    def request_deletion(self, request, obj):
+        try:
+            job, _ = deletion.request_user_deletion(obj, user=request.user)
+        except deletion.DeletionError as exc:
+            self.message_user(request, f'{obj}: {exc}', messages.ERROR)
+            return
+        self.message_user(request, f'{obj}: deletion queued as job #{job.pk}.', messages.INFO)
+
+
+@admin.register(ArchivedUser)
+class ArchivedUserAdmin(admin.ModelAdmin):
+    list_display = ('email', 'role', 'deleted_at', 'archived_at')
+    list_filter = ('role',)
+    search_fields = ('email',)
+    ordering = ('-archived_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -5,3 +5,7 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.users'
     verbose_name = 'Users Management'
+
+    def ready(self):
+        from .sessions import connect_signals
+        connect_signals()
@@ -0,0 +1,179 @@
+"""
+Archival pipeline for soft-deleted users.
+
+Accounts that stay soft-deleted past the retention window are moved, with
+their resources, from the hot tables into ``users_archive`` and
+``mock_resources_archive``. Work is split into bounded batches of users,
+each in its own transaction: the users are locked and re-checked first, and
+only the resources of those still archivable are moved, so a concurrent
+restore either waits for the batch or keeps the account and its resources.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.resources.changefeed import record_created, record_resources_deleted
+from apps.resources.models import (
+    ResourceCategory, MockResource, ArchivedResource, effective_level_expression
+)
+from .models import User, ArchivedUser
+from .sessions import revoke_sessions
+
+
+def _copy_rows(source_model, target_model, fields, pks, overrides=None):
+    """
+    Copy rows by primary key with one ``INSERT ... SELECT``.
+
+    Rows never travel through Python, and timestamps are kept as stored
+    (``bulk_create`` would reset ``auto_now`` fields). ``overrides`` maps
+    target fields to constant values.
+    """
+    overrides = overrides or {}
+    quote = connection.ops.quote_name
+    target_columns = [target_model._meta.get_field(field).column for field in fields]
+    source_columns = [quote(source_model._meta.get_field(field).column) for field in fields]
+    target_columns += [target_model._meta.get_field(field).column for field in overrides]
+
+    sql = (
+        'INSERT INTO {target} ({target_columns}) '
+        'SELECT {source_columns} FROM {source} WHERE {pk} IN ({pks})'
+    ).format(
+        target=quote(target_model._meta.db_table),
+        target_columns=', '.join(quote(column) for column in target_columns),
+        source_columns=', '.join(source_columns + ['%s'] * len(overrides)),
+        source=quote(source_model._meta.db_table),
+        pk=quote(source_model._meta.pk.column),
+        pks=', '.join(['%s'] * len(pks)),
+    )
+    params = [
+        target_model._meta.get_field(field).get_db_prep_value(value, connection)
+        for field, value in overrides.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, *pks])
+
+
+def archivable_users(retention_days=None):
+    """Soft-deleted users whose retention window has expired"""
+    if retention_days is None:
+        retention_days = settings.USER_ARCHIVE_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    return User.objects.filter(is_active=False, deleted_at__lt=cutoff)
+
+
+def _delete_rows(model, pks):
+    """``DELETE`` by primary key, without collecting the rows or sending signals"""
+    quote = connection.ops.quote_name
+    sql = 'DELETE FROM {table} WHERE {pk} IN ({pks})'.format(
+        table=quote(model._meta.db_table),
+        pk=quote(model._meta.pk.column),
+        pks=', '.join(['%s'] * len(pks)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, pks)
+
+
+def _archive_resources(owner_ids, batch_size):
+    """Move resources of ``owner_ids`` in primary key batches, inside the caller's transaction"""
+    moved = 0
+    while True:
+        pks = list(
+            MockResource.objects.filter(owner_id__in=owner_ids)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return moved
+        _copy_rows(MockResource, ArchivedResource, ArchivedResource.COPIED_FIELDS, pks,
+                   {'archived_at': timezone.now()})
+        # The raw delete sends no signals, the change feed entries are written set-based before
+        record_resources_deleted(MockResource._base_manager.filter(pk__in=pks))
+        _delete_rows(MockResource, pks)
+        moved += len(pks)
+
+
+def archive_users(retention_days=None, batch_size=500, pause=0.0, limit=None, progress=None):
+    """
+    Archive soft-deleted users past the retention window.
+
+    ``pause`` seconds are slept between batches to leave room for regular
+    traffic; ``progress`` is called with the running totals after each
+    batch. Returns ``(users, resources)`` moved.
+    """
+    archived_users = archived_resources = 0
+    last_pk = 0
+    while limit is None or archived_users < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived_users)
+        user_ids = list(
+            archivable_users(retention_days).filter(pk__gt=last_pk)
+            .order_by('pk').values_list('pk', flat=True)[:size]
+        )
+        if not user_ids:
+            break
+        last_pk = user_ids[-1]
+
+        with transaction.atomic():
+            # Re-check under lock before anything moves: a user restored
+            # meanwhile, or locked by a restore in progress, keeps everything
+            pks = list(
+                archivable_users(retention_days).filter(pk__in=user_ids)
+                .select_for_update(skip_locked=True).values_list('pk', flat=True)
+            )
+            if pks:
+                archived_resources += _archive_resources(pks, batch_size)
+                _copy_rows(User, ArchivedUser, ArchivedUser.COPIED_FIELDS, pks,
+                           {'archived_at': timezone.now()})
+                # Through the session index, before the cascade drops it
+                revoke_sessions(pks)
+                User.objects.filter(pk__in=pks).delete()
+
+        archived_users += len(pks)
+        if progress is not None:
+            progress(archived_users, archived_resources)
+
+        if pause:
+            time.sleep(pause)
+
+    return archived_users, archived_resources
+
+
+class ArchiveConflict(Exception):
+    """The archived account can not be restored as is"""
+
+
+def restore_archived_user(pk, batch_size=500):
+    """
+    Move an archived user, and the resources whose category still exists,
+    back into the hot tables. The user is returned active.
+    """
+    with transaction.atomic():
+        archived = ArchivedUser.objects.select_for_update().get(pk=pk)
+        if User.objects.filter(tenant_id=archived.tenant_id, email__iexact=archived.email).exists():
+            raise ArchiveConflict(f'Email {archived.email} is already used by another account.')
+
+        # updated_at moves so incremental readers (the access index) see the reactivation
+        fields = [field for field in ArchivedUser.COPIED_FIELDS if field not in ('deleted_at', 'updated_at')]
+        _copy_rows(ArchivedUser, User, fields, [pk],
+                   {'is_active': True, 'deleted_at': None, 'updated_at': timezone.now()})
+        archived.delete()
+
+    while True:
+        with transaction.atomic():
+            pks = list(
+                ArchivedResource.objects.filter(
+                    owner_id=pk,
+                    category_id__in=ResourceCategory.objects.values('pk'),
+                ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            _copy_rows(ArchivedResource, MockResource, ArchivedResource.COPIED_FIELDS, pks,
+                       {'effective_level': 1})
+            restored = MockResource.objects.filter(pk__in=pks)
+            restored.update(effective_level=effective_level_expression())
+            ArchivedResource.objects.filter(pk__in=pks).delete()
+            record_created('resource', restored)
+
+    return User.objects.get(pk=pk)
@@ -0,0 +1,86 @@
+"""
+Password hashing on a process pool.
+
+Each process keeps one pool, created on first use and shared by every
+request, job and chunk, so concurrent imports queue their chunks instead of
+starting processes of their own.
+
+Kept free of model imports: spawned workers import this module before
+Django is set up.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+def _hash_chunk(passwords):
+    from django.contrib.auth.hashers import make_password
+    return [make_password(password) for password in passwords]
+
+
+def available_cpus():
+    # Honours CPU affinity (containers, taskset) where the platform exposes it
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _get_pool(workers):
+    """The pool of this process; ``workers`` sizes it when it is created"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: a forked worker would inherit the parent's
+            # database connections and close them on exit
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_setup_worker)
+            # Before interpreter shutdown tears down the modules the pool needs
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def _drop_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def _after_fork():
+    # A forked child can not use its parent's pool
+    global _pool, _pool_lock
+    _pool, _pool_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def hash_passwords(passwords, workers=None, chunk_size=100):
+    """
+    Hash ``passwords`` with the default hasher, results in input order.
+    Small inputs, or ``workers=1``, are hashed in this process.
+    """
+    workers = workers or available_cpus()
+    if workers == 1 or len(passwords) <= chunk_size:
+        return _hash_chunk(passwords)
+
+    chunks = [passwords[start:start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+    pool = _get_pool(workers)
+    try:
+        return [hashed for chunk in pool.map(_hash_chunk, chunks) for hashed in chunk]
+    except BrokenProcessPool:
+        # A worker died; the next call starts a new pool
+        _drop_pool(pool)
+        raise
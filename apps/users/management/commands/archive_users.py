@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.users.archive import archive_users, archivable_users
+
+
+class Command(BaseCommand):
+    help = 'Move soft-deleted users past the retention window, with their resources, to the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int,
+                            default=settings.USER_ARCHIVE_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches')
+        parser.add_argument('--limit', type=int, help='Archive at most this many users')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many users would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_users(options['retention_days']).count()
+            self.stdout.write(f'{count} users would be archived')
+            return
+
+        users, resources = archive_users(
+            retention_days=options['retention_days'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {users} users and {resources} resources'
+        ))
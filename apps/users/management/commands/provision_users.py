@@ -0,0 +1,83 @@
+import csv
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tenants.context import tenant_context
+from apps.tenants.models import Tenant
+from apps.users.provisioning import (
+    CREATED, password_setup_link, provision_users, send_password_setup_emails
+)
+
+
+def read_records(path):
+    """Records of a .csv (header row) or .jsonl file"""
+    with open(path, newline='', encoding='utf-8') as stream:
+        if path.endswith('.csv'):
+            return [{key: value for key, value in row.items() if value != ''}
+                    for row in csv.DictReader(stream)]
+        return [json.loads(line) for line in stream if line.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Create users in bulk from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.csv with a header row, or .jsonl')
+        parser.add_argument('--tenant', default=settings.DEFAULT_TENANT_SLUG,
+                            help='Tenant slug')
+        parser.add_argument('--invite', action='store_true',
+                            help='Ignore passwords and send password setup links')
+        parser.add_argument('--links-output',
+                            help='Write email,link rows to this CSV instead of sending emails')
+        parser.add_argument('--report',
+                            help='Write the per-row results to this JSON Lines file')
+        parser.add_argument('--workers', type=int, default=settings.PROVISIONING_HASH_WORKERS,
+                            help='Password hashing processes, 0 for one per CPU')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(slug=options['tenant'])
+        except Tenant.DoesNotExist:
+            raise CommandError(f'Unknown tenant "{options["tenant"]}"')
+        try:
+            records = read_records(options['path'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Can not read {options["path"]}: {exc}')
+
+        with tenant_context(tenant.pk):
+            results, users = provision_users(
+                records,
+                invite=options['invite'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+            )
+
+            if options['invite'] and users:
+                if options['links_output']:
+                    with open(options['links_output'], 'w', newline='', encoding='utf-8') as stream:
+                        writer = csv.writer(stream)
+                        writer.writerow(['email', 'link'])
+                        for user in users:
+                            writer.writerow([user.email, password_setup_link(user)])
+                else:
+                    send_password_setup_emails(users)
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as stream:
+                for result in results:
+                    stream.write(json.dumps(result) + '\n')
+        else:
+            for result in results:
+                if result['status'] != CREATED:
+                    self.stderr.write(f'row {result["row"]} {result["status"]}: '
+                                      f'{json.dumps(result["errors"])}')
+
+        counts = Counter(result['status'] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {counts["created"]} users, {counts["conflict"]} conflicts, '
+            f'{counts["invalid"]} invalid'
+        ))
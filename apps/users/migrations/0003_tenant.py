@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_default_tenant(apps, schema_editor):
+    Tenant = apps.get_model('tenants', 'Tenant')
+    db_alias = schema_editor.connection.alias
+    tenant = Tenant.objects.using(db_alias).get(slug=settings.DEFAULT_TENANT_SLUG)
+    for model_name, field in (('User', 'tenant'), ('ArchivedUser', 'tenant_id')):
+        model = apps.get_model('users', model_name)
+        model.objects.using(db_alias).filter(**{field: None}).update(**{field: tenant.pk})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0001_initial'),
+        ('users', '0002_archiveduser_active_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='users_active_email_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='users_active_created_idx',
+        ),
+        migrations.AddField(
+            model_name='archiveduser',
+            name='tenant_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='tenant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254, verbose_name='Email Address'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['tenant', 'email'], name='users_active_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['tenant', '-created_at'], name='users_active_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(fields=('tenant', 'email'), name='users_tenant_email_uniq'),
+        ),
+        migrations.RunPython(assign_default_tenant, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='tenants.tenant'),
+        ),
+        migrations.AlterField(
+            model_name='archiveduser',
+            name='tenant_id',
+            field=models.BigIntegerField(),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def index_live_sessions(apps, schema_editor):
+    """One last decoding scan of django_session to seed the index"""
+    if settings.SESSION_ENGINE != 'django.contrib.sessions.backends.db':
+        return
+    from django.contrib.sessions.backends.db import SessionStore
+
+    Session = apps.get_model('sessions', 'Session')
+    User = apps.get_model('users', 'User')
+    UserSession = apps.get_model('users', 'UserSession')
+    db_alias = schema_editor.connection.alias
+    store = SessionStore()
+
+    last_key = ''
+    while True:
+        batch = list(
+            Session.objects.using(db_alias)
+            .filter(session_key__gt=last_key, expire_date__gt=timezone.now())
+            .order_by('session_key')[:1000]
+        )
+        if not batch:
+            return
+        last_key = batch[-1].session_key
+        owners = {}
+        for session in batch:
+            user_id = store.decode(session.session_data).get('_auth_user_id')
+            if user_id is not None:
+                owners[session.session_key] = (int(user_id), session.expire_date)
+        existing = set(
+            User.objects.using(db_alias)
+            .filter(pk__in={user_id for user_id, _ in owners.values()})
+            .values_list('pk', flat=True)
+        )
+        UserSession.objects.using(db_alias).bulk_create([
+            UserSession(session_key=key, user_id=user_id, expire_date=expire_date,
+                        created_at=timezone.now())
+            for key, (user_id, expire_date) in owners.items() if user_id in existing
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+        ('users', '0003_tenant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('expire_date', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User session',
+                'verbose_name_plural': 'User sessions',
+                'db_table': 'users_sessions',
+            },
+        ),
+        migrations.RunPython(index_live_sessions, migrations.RunPython.noop),
+    ]
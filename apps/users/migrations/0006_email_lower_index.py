@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:58
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_deletion_requested_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(models.F('tenant'), django.db.models.functions.text.Lower('email'), name='users_tenant_email_lower_idx'),
+        ),
+    ]
@@ -1,10 +1,27 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
+from apps.tenants.models import TenantManager, TenantScopedModel
 
-class UserManager(BaseUserManager):
-    """Custom manager for User model with email as username"""
+
+class UserManager(TenantManager, BaseUserManager):
+    """
+    Custom manager for User model with email as username. Users pending
+    deletion (see ``apps.resources.deletion``) are hidden unless
+    ``include_pending``.
+    """
+
+    def __init__(self, include_pending=False):
+        super().__init__()
+        self.include_pending = include_pending
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.include_pending:
+            queryset = queryset.filter(deletion_requested_at__isnull=True)
+        return queryset
 
     def create_user(self, email, password=None, **extra_fields):
         """Create and return a regular user with email"""
@@ -31,7 +48,7 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class User(AbstractUser):
+class User(TenantScopedModel, AbstractUser):
     """
     Custom User model with role-based access control and soft delete
     """
@@ -43,7 +60,8 @@ class User(AbstractUser):
 
     # Remove username, use email as primary identifier
     username = None
-    email = models.EmailField(unique=True, verbose_name='Email Address')
+    # Unique per tenant, see Meta.constraints
+    email = models.EmailField(verbose_name='Email Address')
 
     # Custom fields
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='user')
@@ -53,6 +71,8 @@ class User(AbstractUser):
     # Soft delete fields
     is_active = models.BooleanField(default=True, verbose_name='Active')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Deleted At')
+    # Set when a chunked hard delete starts; the user is hidden from then on
+    deletion_requested_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -62,11 +82,27 @@ class User(AbstractUser):
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
     objects = UserManager()
+    all_objects = UserManager(include_pending=True)
 
     class Meta:
         db_table = 'users'
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'email'], name='users_tenant_email_uniq'),
+        ]
+        indexes = [
+            # Partial indexes: login and listing only touch live accounts
+            models.Index(fields=['tenant', 'email'], name='users_active_email_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['tenant', '-created_at'], name='users_active_created_idx',
+                         condition=models.Q(is_active=True)),
+            # Case-insensitive duplicate checks of bulk provisioning
+            models.Index('tenant', Lower('email'), name='users_tenant_email_lower_idx'),
+            # Archival sweep scans soft-deleted accounts by deletion date
+            models.Index(fields=['deleted_at'], name='users_deleted_at_idx',
+                         condition=models.Q(is_active=False)),
+        ]
 
     def __str__(self):
         return f"{self.email} ({self.get_role_display()})"
@@ -87,10 +123,73 @@ class User(AbstractUser):
         """Soft delete user account"""
         self.is_active = False
         self.deleted_at = timezone.now()
-        self.save(update_fields=['is_active', 'deleted_at'])
+        self.save(update_fields=['is_active', 'deleted_at', 'updated_at'])
+
+        from .sessions import revoke_sessions
+        revoke_sessions([self.pk])
 
     def restore(self):
         """Restore soft deleted user account"""
         self.is_active = True
         self.deleted_at = None
-        self.save(update_fields=['is_active', 'deleted_at'])
+        self.save(update_fields=['is_active', 'deleted_at', 'updated_at'])
+
+
+class UserSession(models.Model):
+    """
+    Live session of a user, recorded on login and removed on logout, so the
+    sessions of a user are found without decoding ``django_session``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions')
+    session_key = models.CharField(max_length=40, unique=True)
+    expire_date = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'users_sessions'
+        verbose_name = 'User session'
+        verbose_name_plural = 'User sessions'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.session_key}"
+
+
+class ArchivedUser(models.Model):
+    """
+    Soft-deleted user moved out of the hot ``users`` table.
+
+    The original primary key is kept so the account can be restored with the
+    same id, and archived resources can still point at it.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    tenant_id = models.BigIntegerField()
+    email = models.EmailField(db_index=True)
+    password = models.CharField(max_length=128)
+    first_name = models.CharField(max_length=150, blank=True)
+    last_name = models.CharField(max_length=150, blank=True)
+    role = models.CharField(max_length=20, choices=User.ROLE_CHOICES, default='user')
+    phone = models.CharField(max_length=20, blank=True)
+    address = models.TextField(blank=True)
+    is_staff = models.BooleanField(default=False)
+    is_superuser = models.BooleanField(default=False)
+    last_login = models.DateTimeField(null=True, blank=True)
+    date_joined = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Fields copied verbatim between ``User`` and ``ArchivedUser``
+    COPIED_FIELDS = (
+        'id', 'tenant_id', 'email', 'password', 'first_name', 'last_name', 'role', 'phone',
+        'address', 'is_staff', 'is_superuser', 'last_login', 'date_joined',
+        'deleted_at', 'created_at', 'updated_at',
+    )
+
+    class Meta:
+        db_table = 'users_archive'
+        verbose_name = 'Archived user'
+        verbose_name_plural = 'Archived users'
+
+    def __str__(self):
+        return f"{self.email} (archived)"
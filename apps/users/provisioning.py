@@ -0,0 +1,145 @@
+"""
+Bulk user provisioning.
+
+``provision_users`` validates every record, rejects emails already used in
+the tenant or repeated in the input, hashes the passwords on a process pool
+and inserts the accounts with ``bulk_create``. It reports the outcome of
+every input row instead of failing the whole import on one bad record.
+
+With ``invite`` the records carry no password: accounts get an unusable
+password and a "set your password" link built from Django's password reset
+token, which ``password_set_view`` accepts.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import send_mass_mail
+from django.db.models.functions import Lower
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from apps.tenants.context import get_current_tenant_id
+from apps.tenants.models import Tenant
+from .hashing import hash_passwords
+from .models import User
+from .serializers import ProvisionUserSerializer
+
+PROVISION_TASK = 'users.provision'
+
+CREATED = 'created'
+CONFLICT = 'conflict'
+INVALID = 'invalid'
+
+EMAIL_TAKEN = 'User with this Email Address already exists.'
+
+
+def _taken_emails(tenant_id, emails):
+    """Lowercased emails of ``emails`` that already exist in the tenant, in any case"""
+    taken = set()
+    emails = [email.lower() for email in emails]
+    for start in range(0, len(emails), 1000):
+        # Served by the (tenant, lower(email)) index
+        taken.update(
+            User._base_manager.filter(tenant_id=tenant_id)
+            .annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=emails[start:start + 1000])
+            .values_list('email_lower', flat=True)
+        )
+    return taken
+
+
+def _insert(tenant_id, pending, results, batch_size):
+    """
+    ``bulk_create`` in batches; rows whose email was taken concurrently are
+    skipped and reported as conflicts
+    """
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        User.objects.bulk_create([user for _, user in batch], ignore_conflicts=True)
+        # Skipped rows get no error and inserted rows no id: read back which
+        # rows are ours, every row carries a password hash with its own salt
+        inserted = dict(
+            User._base_manager.filter(tenant_id=tenant_id, email__in=[user.email for _, user in batch])
+            .values_list('password', 'pk')
+        )
+        for row, user in batch:
+            user.pk = inserted.get(user.password)
+            if user.pk is None:
+                results[row] = {'row': row, 'email': user.email, 'status': CONFLICT,
+                                'errors': {'email': [EMAIL_TAKEN]}}
+            else:
+                results[row] = {'row': row, 'email': user.email, 'status': CREATED, 'id': user.pk}
+
+
+def password_setup_link(user):
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    return settings.PASSWORD_SETUP_URL.format(uid=uid, token=token)
+
+
+def provision_users(records, invite=False, workers=None, batch_size=1000):
+    """
+    Create users from ``records`` (dicts) in the current tenant.
+
+    Returns ``(results, users)``: one result per record, in input order,
+    with ``status`` created, conflict or invalid, and the created users.
+    """
+    tenant_id = get_current_tenant_id() or Tenant.objects.get_default_id()
+    results = [None] * len(records)
+    accepted = []
+    first_row = {}
+
+    for row, record in enumerate(records):
+        serializer = ProvisionUserSerializer(data=record, context={'invite': invite})
+        if not serializer.is_valid():
+            email = record.get('email') if isinstance(record, dict) else None
+            results[row] = {'row': row, 'email': email, 'status': INVALID,
+                            'errors': serializer.errors}
+            continue
+        data = serializer.validated_data
+        data['email'] = User.objects.normalize_email(data['email'])
+        key = data['email'].lower()
+        if key in first_row:
+            results[row] = {'row': row, 'email': data['email'], 'status': CONFLICT,
+                            'errors': {'email': [f'Repeats row {first_row[key]}.']}}
+            continue
+        first_row[key] = row
+        accepted.append((row, data))
+
+    taken = _taken_emails(tenant_id, [data['email'] for _, data in accepted])
+    pending = []
+    for row, data in accepted:
+        if data['email'].lower() in taken:
+            results[row] = {'row': row, 'email': data['email'], 'status': CONFLICT,
+                            'errors': {'email': [EMAIL_TAKEN]}}
+        else:
+            pending.append((row, data))
+
+    if invite:
+        passwords = [make_password(None) for _ in pending]
+    else:
+        passwords = hash_passwords([data['password'] for _, data in pending], workers)
+
+    users = []
+    for (row, data), password in zip(pending, passwords):
+        data.pop('password', None)
+        users.append((row, User(tenant_id=tenant_id, password=password, **data)))
+    _insert(tenant_id, users, results, batch_size)
+
+    created = [user for row, user in users if results[row]['status'] == CREATED]
+    return results, created
+
+
+def send_password_setup_emails(users):
+    """Email every user a link to choose their password, returns the number sent"""
+    messages = [
+        (
+            'Set your password',
+            f'An account was created for you. Choose your password here:\n\n'
+            f'{password_setup_link(user)}\n',
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+        )
+        for user in users
+    ]
+    return send_mass_mail(messages, fail_silently=False)
@@ -1,5 +1,9 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
 
 User = get_user_model()
 
@@ -16,6 +20,13 @@ class RegisterSerializer(serializers.ModelSerializer):
             'role': {'read_only': True}
         }
 
+    def validate_email(self, value):
+        # Email is unique per tenant, User.all_objects is scoped to the current
+        # one and includes accounts pending deletion, which keep their email
+        if User.all_objects.filter(email__iexact=value).exists():
+            raise serializers.ValidationError('User with this Email Address already exists.')
+        return value
+
     def validate(self, attrs):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError({"password": "Password fields don't match."})
@@ -36,12 +47,11 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         if email and password:
-            # Кастомная аутентификация по email
+            # Кастомная аутентификация по email; только активные учетные записи,
+            # поиск идет по частичному индексу users_active_email_idx
             try:
-                user = User.objects.get(email=email)
+                user = User.objects.get(email=email, is_active=True)
                 if user.check_password(password):
-                    if not user.is_active:
-                        raise serializers.ValidationError('User account is disabled.')
                     attrs['user'] = user
                     return attrs
                 else:
@@ -73,3 +83,115 @@ class UserAdminSerializer(serializers.ModelSerializer):
                  'address', 'role', 'is_active', 'deleted_at',
                  'created_at', 'updated_at')
         read_only_fields = ('id', 'email', 'created_at', 'updated_at', 'deleted_at')
+
+
+class ProvisionUserSerializer(serializers.Serializer):
+    """One record of a bulk provisioning request"""
+    email = serializers.EmailField()
+    first_name = serializers.CharField(max_length=150, required=False, default='')
+    last_name = serializers.CharField(max_length=150, required=False, default='')
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False, default='user')
+    phone = serializers.CharField(max_length=20, required=False, allow_blank=True, default='')
+    address = serializers.CharField(required=False, allow_blank=True, default='')
+    password = serializers.CharField(write_only=True, min_length=8, required=False)
+
+    def validate(self, attrs):
+        if not self.context.get('invite') and not attrs.get('password'):
+            raise serializers.ValidationError({'password': 'Required unless users are invited.'})
+        return attrs
+
+
+class BulkProvisionSerializer(serializers.Serializer):
+    # Records are validated one by one by provision_users, so that a bad
+    # record is reported instead of rejecting the whole request
+    users = serializers.ListField(allow_empty=False)
+    invite = serializers.BooleanField(default=False)
+    send_email = serializers.BooleanField(default=True)
+
+    def validate_users(self, value):
+        limit = settings.PROVISIONING_MAX_ROWS
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'At most {limit} users per request, use "manage.py provision_users" for more.'
+            )
+        return value
+
+    def validate(self, attrs):
+        # Larger requests are queued, and job payloads never carry passwords
+        limit = settings.PROVISIONING_SYNC_ROWS
+        if not attrs['invite'] and len(attrs['users']) > limit:
+            raise serializers.ValidationError({'users': [
+                f'At most {limit} users with passwords per request: invite them, '
+                'or use "manage.py provision_users".'
+            ]})
+        return attrs
+
+
+class ProvisionJobSerializer(BulkProvisionSerializer):
+    """
+    Payload of the users.provision job. Queued imports always invite:
+    passwords are never stored in a job payload.
+    """
+    invite = None
+
+    def validate(self, attrs):
+        return attrs
+
+    def validate_users(self, value):
+        limit = settings.PROVISIONING_JOB_MAX_ROWS
+        if len(value) > limit:
+            raise serializers.ValidationError(f'At most {limit} users per job.')
+        if any(isinstance(record, dict) and 'password' in record for record in value):
+            raise serializers.ValidationError(
+                'Queued imports invite users, remove the passwords.'
+            )
+        return value
+
+
+class ArchiveJobSerializer(serializers.Serializer):
+    """Payload of the users.archive job"""
+    retention_days = serializers.IntegerField(min_value=0, required=False)
+    batch_size = serializers.IntegerField(min_value=1, max_value=10000, default=500)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+
+class BulkUserUpdateSerializer(serializers.Serializer):
+    ACTION_CHOICES = (
+        ('change_role', 'Change role'),
+        ('deactivate', 'Deactivate'),
+    )
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    action = serializers.ChoiceField(choices=ACTION_CHOICES)
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False)
+
+    def validate_ids(self, value):
+        limit = settings.PROVISIONING_MAX_ROWS
+        if len(value) > limit:
+            raise serializers.ValidationError(f'At most {limit} users per request.')
+        return value
+
+    def validate(self, attrs):
+        if attrs['action'] == 'change_role' and 'role' not in attrs:
+            raise serializers.ValidationError({'role': 'Required to change the role.'})
+        return attrs
+
+
+class PasswordSetSerializer(serializers.Serializer):
+    uid = serializers.CharField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True, min_length=8)
+    password2 = serializers.CharField(write_only=True, min_length=8)
+
+    def validate(self, attrs):
+        if attrs['password'] != attrs['password2']:
+            raise serializers.ValidationError({"password": "Password fields don't match."})
+        try:
+            pk = force_str(urlsafe_base64_decode(attrs['uid']))
+            user = User.objects.get(pk=pk, is_active=True)
+        except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+            user = None
+        if user is None or not default_token_generator.check_token(user, attrs['token']):
+            raise serializers.ValidationError('Invalid or expired link.')
+        attrs['user'] = user
+        return attrs
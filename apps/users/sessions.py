@@ -0,0 +1,85 @@
+"""
+User to session index.
+
+``user_logged_in`` and ``user_logged_out`` keep ``UserSession`` in step with
+the session store. Revoking the sessions of one user, or of a whole
+queryset of users, is then an indexed delete (or one cache eviction per
+session with a cache backed engine) instead of a scan that decodes every
+row of ``django_session``.
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserSession
+
+DB_SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+
+def _record_login(sender, request, user, **kwargs):
+    session = getattr(request, 'session', None)
+    if session is None or session.session_key is None:
+        return
+    # Expired sessions of this user are dropped from the index as we go
+    UserSession.objects.filter(user=user, expire_date__lte=timezone.now()).delete()
+    UserSession.objects.update_or_create(
+        session_key=session.session_key,
+        defaults={'user': user, 'expire_date': session.get_expiry_date()},
+    )
+
+
+def _record_logout(sender, request, user, **kwargs):
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        UserSession.objects.filter(session_key=session.session_key).delete()
+
+
+def revoke_sessions(users, keep=None):
+    """
+    End every session of ``users``: user ids, or a queryset of users that
+    stays a subquery. ``keep`` is a session key to leave alone, e.g. the
+    caller's own. Returns the number of sessions revoked.
+    """
+    index = UserSession.objects.filter(user__in=users)
+    if keep:
+        index = index.exclude(session_key=keep)
+
+    with transaction.atomic():
+        if settings.SESSION_ENGINE == DB_SESSION_ENGINE:
+            Session.objects.filter(session_key__in=index.values('session_key')).delete()
+        else:
+            store = import_module(settings.SESSION_ENGINE).SessionStore()
+            for session_key in index.values_list('session_key', flat=True).iterator():
+                store.delete(session_key)
+        return index.delete()[0]
+
+
+# Both bulk operations are one index delete plus one UPDATE. Sessions are
+# revoked first, while ``queryset`` (which may filter on the changed field)
+# still selects the same users.
+
+def change_role(queryset, role):
+    """Set ``role`` on ``queryset`` and revoke their sessions, returns ``(updated, revoked)``"""
+    with transaction.atomic():
+        revoked = revoke_sessions(queryset)
+        return queryset.update(role=role, updated_at=timezone.now()), revoked
+
+
+def deactivate_users(queryset):
+    """Soft delete the active users of ``queryset`` and revoke their sessions"""
+    now = timezone.now()
+    with transaction.atomic():
+        revoked = revoke_sessions(queryset)
+        updated = queryset.filter(is_active=True).update(
+            is_active=False, deleted_at=now, updated_at=now
+        )
+        return updated, revoked
+
+
+def connect_signals():
+    user_logged_in.connect(_record_login, dispatch_uid='users-session-index-login')
+    user_logged_out.connect(_record_logout, dispatch_uid='users-session-index-logout')
@@ -0,0 +1,78 @@
+"""
+Background jobs of the users app, run by "manage.py run_workers"
+"""
+from django.conf import settings
+
+from apps.jobs.queue import PermanentError
+from apps.jobs.registry import task
+from apps.resources import deletion
+from .archive import archivable_users, archive_users
+from .provisioning import (
+    CONFLICT, CREATED, INVALID, PROVISION_TASK, provision_users, send_password_setup_emails
+)
+from .serializers import ArchiveJobSerializer, ProvisionJobSerializer
+
+# Records provisioned per call, between two progress reports
+PROVISION_CHUNK = 1000
+
+
+@task('users.archive', roles=('admin',), serializer=ArchiveJobSerializer)
+def archive(run, retention_days=None, batch_size=500, limit=None):
+    """Move soft-deleted users past the retention window to the archive"""
+    total = archivable_users(retention_days).count()
+    run.progress(0, total if limit is None else min(total, limit))
+    users, resources = archive_users(
+        retention_days=retention_days,
+        batch_size=batch_size,
+        limit=limit,
+        progress=lambda users, resources: run.progress(users, message=f'{resources} resources moved'),
+    )
+    return {'users': users, 'resources': resources}
+
+
+@task(PROVISION_TASK, roles=('admin',), serializer=ProvisionJobSerializer)
+def provision(run, users, send_email=True):
+    """Create invited users, like POST /api/auth/users/bulk/ without the row cap"""
+    run.progress(0, len(users))
+    counts = {CREATED: 0, CONFLICT: 0, INVALID: 0}
+    issues = []
+    emails_sent = 0
+    for start in range(0, len(users), PROVISION_CHUNK):
+        results, created = provision_users(
+            users[start:start + PROVISION_CHUNK],
+            invite=True,
+            workers=settings.PROVISIONING_HASH_WORKERS,
+        )
+        for result in results:
+            result['row'] += start
+            counts[result['status']] += 1
+            if result['status'] != CREATED:
+                issues.append(result)
+        if send_email and created:
+            emails_sent += send_password_setup_emails(created)
+        run.progress(start + len(results))
+
+    return {
+        'created': counts[CREATED],
+        'conflicts': counts[CONFLICT],
+        'invalid': counts[INVALID],
+        'emails_sent': emails_sent,
+        # Created rows are left out to keep the result small
+        'issues': issues,
+    }
+
+
+# Internal: queued by request_user_deletion only, which refuses self-deletion
+# and keeps one deletion per user
+@task(deletion.USER_TASK, roles=())
+def delete_user(run, user, reassign_to=None):
+    """Delete the resources of a user (or transfer them) in primary key ranges, then the account"""
+    # A retried job continues the count of its earlier attempts
+    before = run.job.progress_done
+    try:
+        return deletion.delete_user(
+            user, reassign_to,
+            progress=lambda done, total: run.progress(before + done, before + total),
+        )
+    except deletion.DeletionError as exc:
+        raise PermanentError(str(exc))
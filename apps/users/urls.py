@@ -8,6 +8,7 @@ urlpatterns = [
     path('register/', views.RegisterView.as_view(), name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('password/set/', views.password_set_view, name='password-set'),
 
     # User profile endpoints
     path('profile/', views.UserProfileView.as_view(), name='profile'),
@@ -16,6 +17,9 @@ urlpatterns = [
 
     # User management (moderators and admins only)
     path('users/', views.UserListView.as_view(), name='user-list'),
+    path('users/bulk/', views.bulk_provision_view, name='user-bulk-provision'),
+    path('users/bulk-update/', views.bulk_update_view, name='user-bulk-update'),
     path('users/<int:pk>/', views.UserDetailView.as_view(), name='user-detail'),
     path('users/<int:pk>/restore/', views.UserRestoreView.as_view(), name='user-restore'),
+    path('users/<int:pk>/hard-delete/', views.user_hard_delete_view, name='user-hard-delete'),
 ]
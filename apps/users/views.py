@@ -1,12 +1,26 @@
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth import login, logout
 from django.db import transaction
-from .models import User
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from apps.jobs.queue import enqueue
+from apps.jobs.serializers import JobSerializer
+from apps.resources import deletion
+from apps.resources.serializers import DeletionRequestSerializer
+from .archive import ArchiveConflict, restore_archived_user
+from .models import User, ArchivedUser
+from .provisioning import (
+    CONFLICT, CREATED, INVALID, PROVISION_TASK, provision_users, send_password_setup_emails
+)
+from .sessions import change_role, deactivate_users, revoke_sessions
 from .serializers import (
     RegisterSerializer, LoginSerializer, UserProfileSerializer,
-    UserUpdateSerializer, UserAdminSerializer
+    UserUpdateSerializer, UserAdminSerializer, BulkProvisionSerializer,
+    PasswordSetSerializer, BulkUserUpdateSerializer, ProvisionJobSerializer
 )
 from .permissions import (
     IsAuthenticated, IsOwnerOrModeratorOrAdmin, IsModeratorOrAdmin,
@@ -19,7 +33,6 @@ class RegisterView(generics.CreateAPIView):
     User registration endpoint
     No authentication required
     """
-    queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
 
@@ -71,6 +84,27 @@ def logout_view(request):
     return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def password_set_view(request):
+    """
+    Choose a password with the uid and token of a password setup link
+    """
+    serializer = PasswordSetSerializer(data=request.data)
+
+    if serializer.is_valid():
+        user = serializer.validated_data['user']
+        # Changing the password invalidates the token
+        user.set_password(serializer.validated_data['password'])
+        user.save(update_fields=['password', 'updated_at'])
+        return Response({'message': 'Password set successfully'}, status=status.HTTP_200_OK)
+
+    return Response(
+        {'error': serializer.errors},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
 class UserProfileView(generics.RetrieveAPIView):
     """
     Get current user profile
@@ -133,19 +167,89 @@ class UserListView(generics.ListAPIView):
     """
     List all users (moderators and admins only)
     """
-    queryset = User.objects.filter(is_active=True)
     serializer_class = UserAdminSerializer
     permission_classes = [IsModeratorOrAdmin]
 
+    def get_queryset(self):
+        # Matches the partial index users_active_created_idx
+        return User.objects.filter(is_active=True).order_by('-created_at')
+
+
+@api_view(['POST'])
+@permission_classes([IsAdministrator])
+def bulk_provision_view(request):
+    """
+    Create many users at once (admins only)
+    Every record is reported as created, conflict or invalid; invites of more
+    than PROVISIONING_SYNC_ROWS users are queued and answered with the job
+    """
+    serializer = BulkProvisionSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    invite = serializer.validated_data['invite']
+
+    if len(serializer.validated_data['users']) > settings.PROVISIONING_SYNC_ROWS:
+        payload = ProvisionJobSerializer(data={
+            'users': serializer.validated_data['users'],
+            'send_email': serializer.validated_data['send_email'],
+        })
+        payload.is_valid(raise_exception=True)
+        job, _ = enqueue(PROVISION_TASK, payload.validated_data, user=request.user)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    results, users = provision_users(
+        serializer.validated_data['users'],
+        invite=invite,
+        workers=settings.PROVISIONING_HASH_WORKERS,
+    )
+    if invite and serializer.validated_data['send_email']:
+        send_password_setup_emails(users)
+
+    statuses = [result['status'] for result in results]
+    return Response({
+        'created': statuses.count(CREATED),
+        'conflicts': statuses.count(CONFLICT),
+        'invalid': statuses.count(INVALID),
+        'results': results,
+    }, status=status.HTTP_201_CREATED if users else status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdministrator])
+def bulk_update_view(request):
+    """
+    Change the role of, or deactivate, many users at once (admins only)
+    Their sessions are revoked; the caller is never included
+    """
+    serializer = BulkUserUpdateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    users = User.objects.filter(pk__in=serializer.validated_data['ids']).exclude(pk=request.user.pk)
+
+    if serializer.validated_data['action'] == 'deactivate':
+        updated, revoked = deactivate_users(users)
+    else:
+        updated, revoked = change_role(users, serializer.validated_data['role'])
+
+    return Response({'updated': updated, 'sessions_revoked': revoked}, status=status.HTTP_200_OK)
+
 
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete user (moderators and admins only)
     """
-    queryset = User.objects.all()
     serializer_class = UserAdminSerializer
     permission_classes = [IsOwnerOrModeratorOrAdmin]
 
+    def get_queryset(self):
+        return User.objects.all()
+
+    def perform_update(self, serializer):
+        previous = (serializer.instance.role, serializer.instance.is_active)
+        user = serializer.save()
+        if (user.role, user.is_active) != previous:
+            # Other sessions must not keep running with the old role
+            keep = self.request.session.session_key if user.pk == self.request.user.pk else None
+            revoke_sessions([user.pk], keep=keep)
+
     def perform_destroy(self, instance):
         """Soft delete instead of actual deletion"""
         instance.soft_delete()
@@ -159,17 +263,61 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
         )
 
 
+# Schema details: config.openapi.describe_views
+@api_view(['POST'])
+@permission_classes([IsAdministrator])
+def user_hard_delete_view(request, pk):
+    """
+    Delete a user for good (admins only)
+    The account is deactivated and hidden at once; a job deletes their
+    resources in small batches (or transfers them to reassign_to), then the
+    account. Repeating the request resumes an interrupted deletion.
+    """
+    # Users pending deletion are hidden, but the request may resume them
+    target = get_object_or_404(User.all_objects, pk=pk)
+    serializer = DeletionRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        job, created = deletion.request_user_deletion(
+            target, serializer.validated_data['reassign_to'], user=request.user,
+        )
+    except deletion.DeletionInProgress as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+    except deletion.DeletionError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(JobSerializer(job).data,
+                    status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+
 class UserRestoreView(generics.UpdateAPIView):
     """
     Restore soft-deleted user (admins only)
+    Falls back to the archive for users already moved out of the hot table
     """
-    queryset = User.objects.filter(is_active=False)
     serializer_class = UserAdminSerializer
     permission_classes = [IsAdministrator]
 
+    def get_queryset(self):
+        return User.objects.filter(is_active=False)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if not ArchivedUser.objects.filter(pk=self.kwargs['pk'],
+                                               tenant_id=self.request.tenant_id).exists():
+                raise
+            try:
+                return restore_archived_user(self.kwargs['pk'])
+            except ArchivedUser.DoesNotExist:
+                raise Http404
+            except ArchiveConflict as exc:
+                raise ValidationError({'email': str(exc)})
+
     def update(self, request, *args, **kwargs):
         user = self.get_object()
-        user.restore()
+        if not user.is_active:
+            user.restore()
 
         return Response({
             'message': 'User account restored successfully',
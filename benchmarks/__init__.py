@@ -0,0 +1,5 @@
+"""
+Load benchmarks for the Access Control API.
+
+Run ``python -m benchmarks --help`` for the available sub-commands.
+"""
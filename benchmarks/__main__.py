@@ -0,0 +1,105 @@
+"""
+Command line entry point::
+
+    python -m benchmarks generate --users 10000 --resources 1000000
+    python -m benchmarks run --output benchmarks/results/latest.json
+    python -m benchmarks run --baseline benchmarks/baselines/postgres.json
+    python -m benchmarks clear
+"""
+import argparse
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Create a synthetic dataset')
+    generate.add_argument('--users', type=int, default=1000)
+    generate.add_argument('--categories', type=int, default=50)
+    generate.add_argument('--resources', type=int, default=100000)
+    generate.add_argument('--seed', type=int, default=0)
+
+    commands.add_parser('clear', help='Delete the synthetic dataset')
+
+    run = commands.add_parser('run', help='Benchmark every endpoint')
+    run.add_argument('--iterations', type=int, default=50)
+    run.add_argument('--warmup', type=int, default=5)
+    run.add_argument('--role', dest='roles', action='append',
+                     choices=['user', 'moderator', 'admin'])
+    run.add_argument('--transport', dest='transports', action='append',
+                     choices=['wsgi', 'asgi'])
+    run.add_argument('--only', action='append', metavar='URL_NAME',
+                     help='Restrict to a route, e.g. resources:resource-list')
+    run.add_argument('--output', help='Write results to this JSON file')
+    run.add_argument('--baseline', help='Fail when results regress against this JSON file')
+    run.add_argument('--threshold', type=float, default=0.25,
+                     help='Allowed regression as a fraction (default: 0.25)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    if args.command == 'run':
+        # Before setup: the scenarios exceed every rate limit
+        os.environ.setdefault('THROTTLE_ENABLED', 'False')
+    import django
+    django.setup()
+
+    from . import datagen, driver, stats
+
+    if args.command == 'generate':
+        datagen.generate_dataset(users=args.users, categories=args.categories,
+                                 resources=args.resources, seed=args.seed,
+                                 stdout=sys.stdout)
+        return 0
+
+    if args.command == 'clear':
+        datagen.clear_dataset()
+        return 0
+
+    results = driver.run(
+        iterations=args.iterations,
+        warmup=args.warmup,
+        roles=args.roles or driver.ROLES,
+        transports=args.transports or driver.TRANSPORTS,
+        only=args.only,
+        stdout=sys.stdout,
+    )
+
+    dataset = datagen.dataset_size()
+    if args.output:
+        from django.db import connection
+        stats.save_results(args.output, {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'iterations': args.iterations,
+            'dataset': dataset,
+        }, results)
+
+    failed = driver.failed_scenarios(results)
+    for key in failed:
+        sys.stderr.write(f'FAILED {key} got no 2xx response\n')
+
+    if args.baseline:
+        baseline = stats.load_results(args.baseline)
+        if baseline.get('meta', {}).get('dataset', dataset) != dataset:
+            sys.stderr.write(f'WARNING baseline was recorded on dataset {baseline["meta"]["dataset"]}, '
+                             f'this run used {dataset}\n')
+        regressions = stats.compare(baseline, results, args.threshold)
+        for regression in regressions:
+            sys.stderr.write(f'REGRESSION {regression}\n')
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Synthetic data generator for load benchmarks.
+
+Rows are produced in fixed-size batches and written with ``bulk_create`` so
+memory stays flat while generating millions of resources. Every generated
+row is tagged (``@bench.local`` emails, ``bench-`` category names) so a
+dataset can be wiped without touching real data.
+"""
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from apps.resources.models import ACCESS_LEVEL_RANKS, ResourceCategory, MockResource
+from apps.tenants.models import Tenant
+from apps.users.models import User
+
+BENCH_EMAIL_DOMAIN = 'bench.local'
+BENCH_CATEGORY_PREFIX = 'bench-'
+BENCH_PASSWORD = 'bench-password-123'
+
+# Share of users per role
+ROLE_WEIGHTS = (('user', 0.90), ('moderator', 0.08), ('admin', 0.02))
+
+# Share of categories per access level
+ACCESS_LEVEL_WEIGHTS = (
+    ('public', 0.35),
+    ('internal', 0.35),
+    ('confidential', 0.20),
+    ('restricted', 0.10),
+)
+
+# Most resources are low sensitivity, few are restricted
+SENSITIVITY_WEIGHTS = ((1, 0.50), (2, 0.30), (3, 0.15), (4, 0.05))
+
+# Pareto shape for resource ownership: a small set of users owns most rows
+OWNER_SKEW = 1.2
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _weighted_sample(rng, weights, count):
+    values, probabilities = zip(*weights)
+    return rng.choices(values, weights=probabilities, k=count)
+
+
+def bench_email(index):
+    return f'user{index}@{BENCH_EMAIL_DOMAIN}'
+
+
+def _raw_delete(queryset, batch_size):
+    """
+    Delete ``queryset`` in primary key batches with plain ``DELETE``
+    statements, one short transaction each: no cascade collection, no signals
+    """
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            queryset.model._base_manager.filter(pk__in=pks)._raw_delete(queryset.db)
+
+
+def clear_dataset(batch_size=10000):
+    """Remove every row created by :func:`generate_dataset`"""
+    categories = ResourceCategory._base_manager.filter(name__startswith=BENCH_CATEGORY_PREFIX)
+    # Like generate_resources, which writes no change feed entries either
+    _raw_delete(
+        MockResource._base_manager.filter(category_id__in=list(categories.values_list('pk', flat=True))),
+        batch_size,
+    )
+    # Their resources are gone, so the cascades left are small
+    with transaction.atomic():
+        categories.delete()
+        User._base_manager.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
+
+
+def dataset_size():
+    """``{'users', 'categories', 'resources'}`` of the generated dataset"""
+    categories = ResourceCategory._base_manager.filter(name__startswith=BENCH_CATEGORY_PREFIX)
+    return {
+        'users': User._base_manager.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').count(),
+        'categories': categories.count(),
+        'resources': MockResource._base_manager.filter(category__in=categories).count(),
+    }
+
+
+def generate_users(count, rng, tenant_id, batch_size=5000):
+    """Create ``count`` users spread over all roles, return their ids"""
+    # Hashing is by far the slowest part of user creation, so every
+    # synthetic account shares one precomputed hash.
+    password = make_password(BENCH_PASSWORD)
+    roles = _weighted_sample(rng, ROLE_WEIGHTS, count)
+
+    # Guarantee at least one account per role so every role can be driven
+    for index, (role, _) in enumerate(ROLE_WEIGHTS[:count]):
+        roles[index] = role
+
+    rows = (
+        User(
+            tenant_id=tenant_id,
+            email=bench_email(index),
+            password=password,
+            first_name=f'Bench{index}',
+            last_name='User',
+            role=role,
+            is_staff=role == 'admin',
+        )
+        for index, role in enumerate(roles)
+    )
+    for batch in _batched(rows, batch_size):
+        User.objects.bulk_create(batch, batch_size=batch_size)
+
+    return list(
+        User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+def generate_categories(count, rng, tenant_id):
+    """Create ``count`` categories over all access levels, return ``{id: access_level}``"""
+    levels = _weighted_sample(rng, ACCESS_LEVEL_WEIGHTS, count)
+    for index, (level, _) in enumerate(ACCESS_LEVEL_WEIGHTS[:count]):
+        levels[index] = level
+
+    ResourceCategory.objects.bulk_create([
+        ResourceCategory(
+            tenant_id=tenant_id,
+            name=f'{BENCH_CATEGORY_PREFIX}{index}',
+            description=f'Synthetic {level} category',
+            access_level=level,
+        )
+        for index, level in enumerate(levels)
+    ])
+    return dict(
+        ResourceCategory.objects.filter(name__startswith=BENCH_CATEGORY_PREFIX)
+        .order_by('id')
+        .values_list('id', 'access_level')
+    )
+
+
+def generate_resources(count, user_ids, categories, rng, tenant_id, batch_size=10000):
+    """Create ``count`` resources with skewed ownership and sensitivity"""
+    # bulk_create skips MockResource.save, so effective_level is set here
+    category_ids = list(categories)
+    category_ranks = {pk: ACCESS_LEVEL_RANKS[level] for pk, level in categories.items()}
+    owner_weights = [1.0 / (rank + 1) ** OWNER_SKEW for rank in range(len(user_ids))]
+    owner_cum_weights = list(itertools.accumulate(owner_weights))
+    levels, level_weights = zip(*SENSITIVITY_WEIGHTS)
+    level_cum_weights = list(itertools.accumulate(level_weights))
+
+    # Shuffle so the heavy owners are not always the lowest ids
+    owners = list(user_ids)
+    rng.shuffle(owners)
+
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        batch_owners = rng.choices(owners, cum_weights=owner_cum_weights, k=size)
+        batch_levels = rng.choices(levels, cum_weights=level_cum_weights, k=size)
+        batch_categories = rng.choices(category_ids, k=size)
+        MockResource.objects.bulk_create([
+            MockResource(
+                tenant_id=tenant_id,
+                name=f'Resource {created + offset}',
+                description='Synthetic benchmark resource',
+                category_id=category_id,
+                sensitivity_level=level,
+                effective_level=max(level, category_ranks[category_id]),
+                owner_id=owner_id,
+            )
+            for offset, (owner_id, level, category_id) in enumerate(
+                zip(batch_owners, batch_levels, batch_categories)
+            )
+        ], batch_size=batch_size)
+        created += size
+
+    return created
+
+
+def generate_dataset(users=1000, categories=50, resources=100000, seed=0, stdout=None):
+    """
+    Generate a full synthetic dataset.
+
+    The same ``seed`` and sizes always produce the same dataset.
+    """
+    rng = random.Random(seed)
+
+    def report(message):
+        if stdout is not None:
+            stdout.write(message + '\n')
+
+    # Requests in the benchmark driver resolve to the default tenant
+    tenant_id = Tenant.objects.get_default_id()
+
+    clear_dataset()
+    user_ids = generate_users(users, rng, tenant_id)
+    report(f'Created {len(user_ids)} users')
+    category_levels = generate_categories(categories, rng, tenant_id)
+    report(f'Created {len(category_levels)} categories')
+    created = generate_resources(resources, user_ids, category_levels, rng, tenant_id)
+    report(f'Created {created} resources')
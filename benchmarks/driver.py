@@ -0,0 +1,465 @@
+"""
+In-process benchmark driver.
+
+Every named route of ``apps.users.urls``, ``apps.resources.urls``,
+``apps.core.urls`` and ``apps.jobs.urls`` is described by an :class:`Endpoint` scenario and executed
+as each role through Django's WSGI handler (``Client``) and ASGI handler
+(``AsyncClient``). Only the
+request itself is timed; per-request setup such as creating throwaway
+accounts runs outside the measured window. Scenarios exercise the real code
+path for administrators, who may call every route: the access index is
+built, profiling is on and a profile recorded, and exports are run so their
+artifacts exist. ``failed_scenarios`` lists administrator scenarios that
+still got no 2xx response.
+"""
+import json
+import logging
+import shutil
+import tempfile
+import time
+import uuid
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_encode
+
+from apps.core import urls as core_urls
+from apps.core.models import SlowQuery
+from apps.jobs import urls as job_urls
+from apps.jobs.models import Job
+from apps.jobs.queue import artifact_file
+from apps.jobs.worker import Worker
+from apps.resources import urls as resource_urls
+from apps.resources.access_index import update_index
+from apps.resources.models import ResourceCategory, MockResource
+from apps.tenants.context import tenant_context
+from apps.tenants.models import Tenant
+from apps.users import urls as user_urls
+from apps.users.models import User
+from config import profiling
+
+from .datagen import BENCH_CATEGORY_PREFIX, BENCH_EMAIL_DOMAIN, BENCH_PASSWORD
+from .stats import summarize
+
+ROLES = ('user', 'moderator', 'admin')
+TRANSPORTS = ('wsgi', 'asgi')
+
+
+class Endpoint:
+    """
+    Benchmark scenario for one named route.
+
+    ``kwargs``, ``query`` and ``data`` are callables ``(context, role) -> dict``.
+    ``setup`` runs before every timed request and may return a user to log
+    the client in as; ``anonymous`` endpoints are called without a session.
+    """
+
+    def __init__(self, url_name, method='get', kwargs=None, query=None, data=None,
+                 setup=None, teardown=None, anonymous=False):
+        self.url_name = url_name
+        self.method = method
+        self.kwargs = kwargs or (lambda context, role: {})
+        self.query = query
+        self.data = data
+        self.setup = setup
+        self.teardown = teardown
+        self.anonymous = anonymous
+
+    @property
+    def key(self):
+        return f'{self.method.upper()} {self.url_name}'
+
+
+def _throwaway_user(context, role, **extra):
+    return User.objects.create(
+        email=f'tmp-{uuid.uuid4().hex}@{BENCH_EMAIL_DOMAIN}',
+        password=context.password_hash,
+        role=role,
+        **extra
+    )
+
+
+def _soft_deleted_user(context, role):
+    user = _throwaway_user(context, 'user')
+    user.soft_delete()
+    context.pending_pk = user.pk
+
+
+def _deletable_user(context, role):
+    context.pending_pk = _throwaway_user(context, 'user').pk
+
+
+def _deletable_category(context, role):
+    context.pending_pk = ResourceCategory.objects.create(
+        name=f'tmp-{uuid.uuid4().hex}', access_level='public',
+    ).pk
+
+
+def _invited_user(context, role):
+    user = _throwaway_user(context, 'user')
+    context.password_setup = {
+        'uid': urlsafe_base64_encode(str(user.pk).encode()),
+        'token': default_token_generator.make_token(user),
+        'password': BENCH_PASSWORD,
+        'password2': BENCH_PASSWORD,
+    }
+
+
+def _provision_records(context, role):
+    return {'users': [
+        {'email': f'tmp-{uuid.uuid4().hex}@{BENCH_EMAIL_DOMAIN}', 'password': BENCH_PASSWORD}
+        for _ in range(20)
+    ]}
+
+
+def _bulk_update_targets(context, role):
+    context.bulk_ids = [_throwaway_user(context, 'user').pk for _ in range(20)]
+
+
+def _sample_slow_query(context, role):
+    context.slow_query_pk = SlowQuery.objects.create(
+        fingerprint='0' * 16, sql='SELECT 1', duration_ms=1.0, database='default',
+        tenant_id=Tenant.objects.get_default_id(),
+    ).pk
+
+
+def _delete_slow_queries(context, role):
+    SlowQuery.objects.filter(fingerprint='0' * 16).delete()
+
+
+def _queued_job(context, role):
+    # Queued for the role's user; no worker runs during the benchmark
+    context.job_pk = Job.objects.create(
+        task='resources.export', payload={'days': 1}, created_by=context.users[role],
+    ).pk
+
+
+def _finished_export(context, role):
+    # Run on a worker of this process, outside the timed window, so the
+    # artifact exists; once per role until the teardown deletes it
+    if Job.objects.filter(pk=context.export_jobs.get(role)).exists():
+        context.job_pk = context.export_jobs[role]
+        return
+    job = Job.objects.create(
+        task='resources.export', payload={'category': context.sample_category_pk},
+        created_by=context.users[role], status=Job.RUNNING, worker='benchmark', attempts=1,
+        started_at=timezone.now(),
+    )
+    Worker('benchmark').execute(job)
+    job.refresh_from_db()
+    if artifact_file(job) is None:
+        raise RuntimeError(f'Benchmark export job #{job.pk} produced no artifact: {job.error}')
+    context.job_pk = context.export_jobs[role] = job.pk
+
+
+def _delete_jobs(context, role):
+    Job.objects.filter(created_by__email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
+
+
+def _delete_exports(context, role):
+    for job in Job.objects.filter(pk__in=context.export_jobs.values()):
+        path = artifact_file(job)
+        if path is not None:
+            path.unlink(missing_ok=True)
+    context.export_jobs.clear()
+    _delete_jobs(context, role)
+
+
+def _delete_throwaways(context, role):
+    # Including those whose deletion was requested but never carried out
+    User.all_objects.filter(email__startswith='tmp-', email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
+
+
+def _delete_deletion_requests(context, role):
+    ResourceCategory.all_objects.filter(name__startswith='tmp-').delete()
+    _delete_throwaways(context, role)
+    _delete_jobs(context, role)
+
+
+def _delete_created_resources(context, role):
+    MockResource.objects.filter(name__startswith='bench-created-').delete()
+
+
+ENDPOINTS = [
+    # apps.users.urls
+    Endpoint('users:register', 'post', anonymous=True, data=lambda context, role: {
+        'email': f'tmp-{uuid.uuid4().hex}@{BENCH_EMAIL_DOMAIN}',
+        'password': BENCH_PASSWORD,
+        'password2': BENCH_PASSWORD,
+        'first_name': 'Bench',
+        'last_name': 'Register',
+    }, teardown=_delete_throwaways),
+    Endpoint('users:login', 'post', anonymous=True, data=lambda context, role: {
+        'email': context.users[role].email,
+        'password': BENCH_PASSWORD,
+    }),
+    Endpoint('users:logout', 'post', setup=lambda context, role: context.users[role]),
+    Endpoint('users:password-set', 'post', anonymous=True, setup=_invited_user,
+             data=lambda context, role: context.password_setup, teardown=_delete_throwaways),
+    Endpoint('users:profile'),
+    Endpoint('users:profile-update', 'patch', data=lambda context, role: {'first_name': 'Bench'}),
+    Endpoint('users:profile-delete', 'delete', setup=_throwaway_user,
+             teardown=_delete_throwaways),
+    Endpoint('users:user-list'),
+    Endpoint('users:user-bulk-provision', 'post', data=_provision_records,
+             teardown=_delete_throwaways),
+    Endpoint('users:user-bulk-update', 'post', setup=_bulk_update_targets,
+             data=lambda context, role: {'ids': context.bulk_ids, 'action': 'change_role',
+                                         'role': 'moderator'},
+             teardown=_delete_throwaways),
+    Endpoint('users:user-detail', kwargs=lambda context, role: {'pk': context.sample_user_pk}),
+    Endpoint('users:user-restore', 'patch', setup=_soft_deleted_user,
+             kwargs=lambda context, role: {'pk': context.pending_pk},
+             teardown=_delete_throwaways),
+    # No worker runs during the benchmark, measures the request: hide the
+    # user and queue the job
+    Endpoint('users:user-hard-delete', 'post', setup=_deletable_user,
+             kwargs=lambda context, role: {'pk': context.pending_pk},
+             teardown=_delete_deletion_requests),
+
+    # apps.resources.urls
+    Endpoint('resources:category-list'),
+    Endpoint('resources:category-detail',
+             kwargs=lambda context, role: {'pk': context.sample_category_pk}),
+    Endpoint('resources:category-detail', 'delete', setup=_deletable_category,
+             kwargs=lambda context, role: {'pk': context.pending_pk},
+             teardown=_delete_deletion_requests),
+    Endpoint('resources:resource-list'),
+    Endpoint('resources:resource-list', 'post', data=lambda context, role: {
+        'name': f'bench-created-{uuid.uuid4().hex}',
+        'category': context.sample_category_pk,
+        'sensitivity_level': 1,
+    }, teardown=_delete_created_resources),
+    Endpoint('resources:resource-detail',
+             kwargs=lambda context, role: {'pk': context.sample_resource_pk}),
+    Endpoint('resources:resource-facets', query=lambda context, role: {'search': 'a'}),
+    Endpoint('resources:my-resources'),
+    Endpoint('resources:change-feed', query=lambda context, role: {'cursor': 0, 'limit': 500}),
+    Endpoint('resources:access-test'),
+    Endpoint('resources:admin-dashboard'),
+    Endpoint('resources:access-simulation', 'post', data=lambda context, role: {
+        'rules': {'user': {'any': 2}},
+    }),
+    Endpoint('resources:access-index'),
+    Endpoint('resources:access-index-refresh', 'post'),
+    Endpoint('resources:access-index-readers',
+             kwargs=lambda context, role: {'pk': context.sample_resource_pk}),
+    Endpoint('resources:access-index-resources',
+             kwargs=lambda context, role: {'pk': context.sample_user_pk}),
+
+    # apps.core.urls
+    Endpoint('core:profile-list'),
+    Endpoint('core:profile-token', 'post'),
+    Endpoint('core:profile-detail',
+             kwargs=lambda context, role: {'profile_id': context.profile_id}),
+    Endpoint('core:slow-query-list'),
+    Endpoint('core:slow-query-detail', setup=_sample_slow_query,
+             kwargs=lambda context, role: {'pk': context.slow_query_pk},
+             teardown=_delete_slow_queries),
+
+    # apps.jobs.urls
+    Endpoint('jobs:job-list'),
+    Endpoint('jobs:job-list', 'post', data=lambda context, role: {
+        'task': 'resources.export', 'payload': {'days': 1},
+    }, teardown=_delete_jobs),
+    Endpoint('jobs:job-task-list'),
+    Endpoint('jobs:job-detail', setup=_queued_job,
+             kwargs=lambda context, role: {'pk': context.job_pk}, teardown=_delete_jobs),
+    Endpoint('jobs:job-cancel', 'post', setup=_queued_job,
+             kwargs=lambda context, role: {'pk': context.job_pk}, teardown=_delete_jobs),
+    Endpoint('jobs:job-artifact', setup=_finished_export,
+             kwargs=lambda context, role: {'pk': context.job_pk}, teardown=_delete_exports),
+]
+
+
+def route_names():
+    """All named routes the benchmark is expected to cover"""
+    names = set()
+    for module in (user_urls, resource_urls, core_urls, job_urls):
+        for pattern in module.urlpatterns:
+            if pattern.name:
+                names.add(f'{module.app_name}:{pattern.name}')
+    return names
+
+
+def check_coverage(endpoints=None):
+    """Return the named routes that have no benchmark scenario"""
+    covered = {endpoint.url_name for endpoint in (endpoints or ENDPOINTS)}
+    return sorted(route_names() - covered)
+
+
+class Context:
+    """Shared fixtures resolved once from the generated dataset"""
+
+    def __init__(self):
+        self.users = {}
+        for role in ROLES:
+            user = (User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}',
+                                        email__startswith='user', role=role, is_active=True)
+                    .order_by('id').first())
+            if user is None:
+                raise RuntimeError(
+                    f'No benchmark user with role "{role}". '
+                    f'Run "python -m benchmarks generate" first.'
+                )
+            self.users[role] = user
+
+        category = (ResourceCategory.objects.filter(name__startswith=BENCH_CATEGORY_PREFIX,
+                                                    access_level='public')
+                    .order_by('id').first())
+        resource = (MockResource.objects.filter(effective_level=1)
+                    .order_by('id').only('id').first())
+        if category is None or resource is None:
+            raise RuntimeError('Benchmark dataset is incomplete, regenerate it.')
+
+        self.sample_category_pk = category.pk
+        self.sample_resource_pk = resource.pk
+        self.sample_user_pk = self.users['user'].pk
+        self.password_hash = self.users['user'].password
+        self.pending_pk = None
+        self.export_jobs = {}
+
+        # The index the access-index routes read; built by a job otherwise
+        with tenant_context(Tenant.objects.get_default_id()):
+            update_index(full=True)
+        self.profile_id = self._record_profile()
+
+    def _record_profile(self):
+        """Profile one request of the administrator, needs ``PROFILING_ENABLED``"""
+        client = Client()
+        client.force_login(self.users['admin'])
+        response = client.get(reverse('users:profile'),
+                              HTTP_X_PROFILE_TOKEN=profiling.make_token(self.users['admin']))
+        if 'X-Profile-Id' not in response:
+            raise RuntimeError('No request profile was recorded, is PROFILING_ENABLED on?')
+        return response['X-Profile-Id']
+
+
+def _request_args(endpoint, context, role):
+    path = reverse(endpoint.url_name, kwargs=endpoint.kwargs(context, role))
+    if endpoint.query is not None:
+        path = f'{path}?{urlencode(endpoint.query(context, role))}'
+    if endpoint.data is None:
+        return path, {}
+    return path, {
+        'data': json.dumps(endpoint.data(context, role)),
+        'content_type': 'application/json',
+    }
+
+
+def _prepare_client(client, endpoint, context, role):
+    """Run untimed setup and make sure the client carries the right session"""
+    login_as = endpoint.setup(context, role) if endpoint.setup else None
+    client.logout()
+    if endpoint.anonymous:
+        return
+    client.force_login(login_as if isinstance(login_as, User) else context.users[role])
+
+
+def run_wsgi(endpoint, context, role, iterations, warmup):
+    client = Client(raise_request_exception=False)
+    durations, codes = [], []
+    for iteration in range(warmup + iterations):
+        _prepare_client(client, endpoint, context, role)
+        path, extra = _request_args(endpoint, context, role)
+        started = time.perf_counter()
+        response = client.generic(endpoint.method.upper(), path, **extra)
+        elapsed = time.perf_counter() - started
+        if iteration >= warmup:
+            durations.append(elapsed)
+            codes.append(response.status_code)
+    if endpoint.teardown:
+        endpoint.teardown(context, role)
+    return durations, codes
+
+
+@async_to_sync
+async def run_asgi(endpoint, context, role, iterations, warmup):
+    client = AsyncClient(raise_request_exception=False)
+    prepare = sync_to_async(_prepare_client)
+    request_args = sync_to_async(_request_args)
+    durations, codes = [], []
+    for iteration in range(warmup + iterations):
+        await prepare(client, endpoint, context, role)
+        path, extra = await request_args(endpoint, context, role)
+        started = time.perf_counter()
+        response = await client.generic(endpoint.method.upper(), path, **extra)
+        elapsed = time.perf_counter() - started
+        if iteration >= warmup:
+            durations.append(elapsed)
+            codes.append(response.status_code)
+    if endpoint.teardown:
+        await sync_to_async(endpoint.teardown)(context, role)
+    return durations, codes
+
+
+RUNNERS = {'wsgi': run_wsgi, 'asgi': run_asgi}
+
+
+def run(iterations=50, warmup=5, roles=ROLES, transports=TRANSPORTS, only=None, stdout=None):
+    """
+    Execute every scenario and return ``{key: summary}``.
+
+    Keys have the form ``"<transport> <role> <METHOD> <url name>"``.
+    Throttling is switched off here for the requests; code that reads
+    ``THROTTLE_ENABLED`` at startup only sees it off when the environment
+    sets it, as ``python -m benchmarks`` does.
+    """
+    missing = check_coverage()
+    if missing:
+        raise RuntimeError(f'Routes without benchmark scenarios: {", ".join(missing)}')
+
+    # Failures are recorded as status codes, keep the console readable
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+    # The test clients talk to "testserver"
+    if 'testserver' not in settings.ALLOWED_HOSTS:
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+    # Scenarios repeat one user's requests far beyond any rate limit
+    settings.THROTTLE_ENABLED = False
+    # Handlers are built per client, so the profiling middleware is loaded;
+    # nothing is sampled, requests without a token only pay the header lookup
+    settings.PROFILING_ENABLED = True
+    settings.PROFILING_SAMPLE_RATE = 0
+    settings.PROFILING_DIR = tempfile.mkdtemp(prefix='benchmark-profiles-')
+
+    try:
+        context = Context()
+        results = {}
+        for transport in transports:
+            runner = RUNNERS[transport]
+            for role in roles:
+                for endpoint in ENDPOINTS:
+                    if only and endpoint.url_name not in only:
+                        continue
+                    durations, codes = runner(endpoint, context, role, iterations, warmup)
+                    key = f'{transport} {role} {endpoint.key}'
+                    results[key] = summarize(durations, codes)
+                    if stdout is not None:
+                        summary = results[key]
+                        stdout.write(
+                            f"{key:<60} {summary['throughput_rps']:>9} rps  "
+                            f"p50 {summary['p50_ms']:>8}ms  p95 {summary['p95_ms']:>8}ms  "
+                            f"p99 {summary['p99_ms']:>8}ms\n"
+                        )
+    finally:
+        shutil.rmtree(settings.PROFILING_DIR, ignore_errors=True)
+    return results
+
+
+def failed_scenarios(results):
+    """
+    Administrator scenarios without a single 2xx response: they time an
+    error path, so a regression of the endpoint would go unnoticed
+    """
+    return sorted(
+        key for key, summary in results.items()
+        if key.split(' ')[1] == 'admin'
+        and not any(code.startswith('2') for code in summary['status_codes'])
+    )
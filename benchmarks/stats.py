@@ -0,0 +1,79 @@
+"""
+Latency statistics and JSON baselines for benchmark runs.
+"""
+import json
+import math
+from pathlib import Path
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(durations, status_codes):
+    """Build the result record for one endpoint from raw timings (seconds)"""
+    timings = sorted(durations)
+    total = sum(timings)
+    codes = {}
+    for code in status_codes:
+        codes[str(code)] = codes.get(str(code), 0) + 1
+
+    return {
+        'requests': len(timings),
+        'errors': sum(1 for code in status_codes if code >= 500),
+        'status_codes': codes,
+        'throughput_rps': round(len(timings) / total, 2) if total else 0.0,
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+    }
+
+
+def save_results(path, meta, results):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'meta': meta, 'results': results}, indent=2, sort_keys=True))
+
+
+def load_results(path):
+    return json.loads(Path(path).read_text())
+
+
+def compare(baseline, results, threshold):
+    """
+    Compare a run against a baseline.
+
+    Returns a list of human readable regressions. An endpoint regresses when
+    its p95 latency grows, or its throughput drops, by more than
+    ``threshold`` (a fraction, e.g. ``0.25`` for 25%).
+    """
+    regressions = []
+    for key, expected in sorted(baseline.get('results', {}).items()):
+        actual = results.get(key)
+        if actual is None:
+            continue
+
+        p95_limit = expected['p95_ms'] * (1 + threshold)
+        if actual['p95_ms'] > p95_limit:
+            regressions.append(
+                f"{key}: p95 {actual['p95_ms']}ms > {p95_limit:.3f}ms "
+                f"(baseline {expected['p95_ms']}ms)"
+            )
+
+        rps_limit = expected['throughput_rps'] * (1 - threshold)
+        if actual['throughput_rps'] < rps_limit:
+            regressions.append(
+                f"{key}: throughput {actual['throughput_rps']} rps < {rps_limit:.2f} rps "
+                f"(baseline {expected['throughput_rps']} rps)"
+            )
+
+        if actual['errors'] > expected['errors']:
+            regressions.append(
+                f"{key}: {actual['errors']} server errors "
+                f"(baseline {expected['errors']})"
+            )
+    return regressions
@@ -0,0 +1,183 @@
+"""
+Admin changelists for very large tables.
+
+``ScalableAdminMixin`` combines:
+
+* ``EstimatedCountPaginator`` totals without the extra unfiltered count
+* ``AutocompleteFilter`` for foreign keys: the sidebar renders one
+  autocomplete select instead of loading every related row
+* keyset pagination: with the default ordering, the changelist pages with
+  an ``after`` cursor (``<keyset field>,<pk>`` of the last row) instead of
+  ``OFFSET``, so every page costs the same as the first one. Sorting by a
+  column falls back to page numbers.
+
+``BackgroundDeleteMixin`` hands deletions to a background job instead of
+the cascading ORM delete, and confirms them without collecting every
+related row first.
+"""
+from datetime import datetime
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core import checks
+from django.db.models import Q
+
+from config.counting import EstimatedCountPaginator
+
+KEYSET_VAR = 'after'
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Foreign key filter using the admin autocomplete view. The related model
+    admin must define ``search_fields``.
+    """
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+        form_field = field.formfield(
+            widget=AutocompleteSelect(field, model_admin.admin_site), required=False
+        )
+        self.widget = form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val,
+            attrs={'id': f'autocomplete_filter_{field_path}', 'class': 'autocomplete-filter'},
+        )
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg, KEYSET_VAR]),
+            'display': 'All',
+        }
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList paging by ``(keyset_field, pk)`` descending"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.keyset_after = self._parse_cursor(request.GET.get(KEYSET_VAR))
+        self.keyset_next = None
+        super().__init__(request, *args, **kwargs)
+        # Sorting, filter and search links start from the first page
+        self.params.pop(KEYSET_VAR, None)
+
+    @property
+    def keyset_enabled(self):
+        return ORDER_VAR not in self.params and not self.list_editable
+
+    def _parse_cursor(self, value):
+        if not value:
+            return None
+        try:
+            key, pk = value.rsplit(',', 1)
+            return datetime.fromisoformat(key), int(pk)
+        except ValueError:
+            raise IncorrectLookupParameters
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(KEYSET_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        if not self.keyset_enabled:
+            return super().get_results(request)
+
+        field = self.model_admin.keyset_field
+        queryset = self.queryset
+        if self.keyset_after:
+            key, pk = self.keyset_after
+            queryset = queryset.filter(Q(**{f'{field}__lt': key}) | Q(**{field: key, 'pk__lt': pk}))
+        rows = list(queryset[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            last = rows[self.list_per_page - 1]
+            self.keyset_next = f'{getattr(last, field).isoformat()},{last.pk}'
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = bool(self.keyset_next or self.keyset_after)
+        self.paginator = paginator
+
+    def next_page_url(self):
+        return self.get_query_string({KEYSET_VAR: self.keyset_next})
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[KEYSET_VAR])
+
+
+class ScalableAdminMixin:
+    """
+    Estimated totals, keyset pagination and autocomplete filter assets.
+    Requires ``ordering = ('-<keyset_field>',)``.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    keyset_field = 'created_at'
+    change_list_template = 'admin/scalable_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    @property
+    def media(self):
+        media = super().media
+        if any(isinstance(spec, tuple) and spec[1] is AutocompleteFilter
+               for spec in self.list_filter):
+            media += AutocompleteSelect(None, self.admin_site).media
+        return media
+
+
+class BackgroundDeleteMixin:
+    """
+    Deletes through ``request_deletion(request, obj)``, which queues the
+    work, for the delete view and the "delete selected" action alike.
+    ``deletion_summary(objs)`` lists what the confirmation page shows.
+    An admin that does not define ``request_deletion`` fails the system
+    checks (``admin_scaling.E001``).
+    """
+
+    def request_deletion(self, request, obj):
+        """Queue the deletion of ``obj``; defined by every admin using the mixin"""
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        if type(self).request_deletion is BackgroundDeleteMixin.request_deletion:
+            errors.append(checks.Error(
+                f'{type(self).__name__} uses BackgroundDeleteMixin without defining request_deletion().',
+                obj=type(self),
+                id='admin_scaling.E001',
+            ))
+        return errors
+
+    def deletion_summary(self, objs):
+        return [str(obj) for obj in objs]
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        perms_needed = set()
+        if not all(self.has_delete_permission(request, obj) for obj in objs):
+            perms_needed.add(self.opts.verbose_name)
+        return self.deletion_summary(objs), {self.opts.verbose_name_plural: len(objs)}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.request_deletion(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.request_deletion(request, obj)
@@ -0,0 +1,10 @@
+"""
+Admin URLs, included lazily from config.urls: the ModelAdmin modules are
+only imported on the first /admin/ request (or reverse() of an admin URL).
+"""
+from django.contrib import admin
+
+# A no-op when django.contrib.admin (not SimpleAdminConfig) already did it
+admin.autodiscover()
+
+urlpatterns, app_name, _ = admin.site.urls
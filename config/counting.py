@@ -0,0 +1,122 @@
+"""
+Counting strategies for large querysets.
+
+``count_queryset`` returns ``(count, exact)``:
+
+* a cached value when the same query was counted within ``COUNT_CACHE_TTL``
+  (the cache key is the compiled SQL, so it covers role and filters)
+* on PostgreSQL, the planner's ``EXPLAIN`` row estimate when it exceeds
+  ``COUNT_EXACT_THRESHOLD``. Tenant-scoped querysets always carry a WHERE
+  clause, and partitioned parents have no ``reltuples`` of their own, so
+  the plan estimate is used for every queryset.
+* an exact ``COUNT(*)`` for small results and on other databases
+
+``CountingPageNumberPagination`` and ``EstimatedCountPaginator`` plug the
+strategy into DRF list views and Django admin changelists.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def _cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.sha1(repr((queryset.db, sql, params)).encode()).hexdigest()
+    return f'count:{queryset.model._meta.label_lower}:{digest}'
+
+
+def estimate_count(queryset):
+    """Planner row estimate, or ``None`` when the database can not provide one"""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_queryset(queryset):
+    """Return ``(count, exact)`` for ``queryset`` using the cheapest strategy"""
+    key = _cache_key(queryset)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    estimate = estimate_count(queryset)
+    if estimate is not None and estimate >= settings.COUNT_EXACT_THRESHOLD:
+        result = (estimate, False)
+    else:
+        result = (queryset.count(), True)
+
+    cache.set(key, result, settings.COUNT_CACHE_TTL)
+    return result
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using ``count_queryset``. With an estimated count the last
+    page is not clamped to the estimate, it is simply the next slice.
+    """
+
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        count, self.count_exact = count_queryset(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        if self.count and self.count_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page])
+        if not object_list and number > 1:
+            raise EmptyPage('That page contains no results')
+        return self._get_page(object_list, number, self)
+
+
+class CountingPageNumberPagination(PageNumberPagination):
+    """
+    Opt-in pagination: responses stay plain lists unless the client sends
+    ``page`` or ``page_size``. Paginated responses carry ``count_exact``.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_page_size(self, request):
+        if (self.page_query_param not in request.query_params and
+                self.page_size_query_param not in request.query_params):
+            return None
+        return super().get_page_size(request)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_exact': self.page.paginator.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,185 @@
+"""
+Read replica routing.
+
+``ReplicaRoutingMiddleware`` marks safe-method requests as replica eligible
+and ``ReplicaRouter`` then sends their ORM reads to a healthy replica.
+Everything else stays on ``default``:
+
+* writes, and reads issued after a write in the same request
+* reads inside a transaction on ``default``
+* every request of a client that wrote within ``REPLICA_STICKY_SECONDS``
+  (tracked with a short lived cookie, so a user always reads their own writes)
+* management commands, shells and anything outside a request
+
+Replicas are probed every ``REPLICA_HEALTH_CHECK_INTERVAL`` seconds by a
+background thread of each process, on connections of its own; requests only
+read the outcome. A replica that fails the probe, lags by more than
+``REPLICA_MAX_LAG_SECONDS``, or has not been probed recently (e.g. before
+the first probe) is skipped.
+"""
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# True while the current request may read from a replica
+_replica_allowed = contextvars.ContextVar('replica_allowed', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPool:
+    """Tracks health and lag of the configured replicas"""
+
+    # Probes older than this many intervals are not trusted
+    max_staleness = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}
+        self._counter = itertools.count()
+        # The probe thread does not survive a fork, so it is started per process
+        self._probe_pid = None
+
+    @property
+    def aliases(self):
+        return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+    def _measure_lag(self, alias):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # NULL when the server is not replaying WAL (e.g. a primary)
+                cursor.execute(
+                    'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+                )
+            else:
+                cursor.execute('SELECT 0')
+            return float(cursor.fetchone()[0])
+
+    def probe(self, alias):
+        """Check one replica now and remember the outcome"""
+        try:
+            lag = self._measure_lag(alias)
+            healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+            if not healthy:
+                logger.warning('Replica %s lags %.1fs, using primary', alias, lag)
+        except Exception:
+            logger.exception('Replica %s is unavailable, using primary', alias)
+            lag, healthy = None, False
+            # Reconnect on the next probe
+            connections[alias].close()
+        with self._lock:
+            self._status[alias] = (healthy, lag, time.monotonic())
+        return healthy
+
+    def _start_probing(self):
+        with self._lock:
+            if self._probe_pid == os.getpid():
+                return
+            self._probe_pid = os.getpid()
+        threading.Thread(target=self._probe_loop, name='replica-probe', daemon=True).start()
+
+    def _probe_loop(self):
+        while True:
+            for alias in self.aliases:
+                self.probe(alias)
+            time.sleep(settings.REPLICA_HEALTH_CHECK_INTERVAL)
+
+    def is_healthy(self, alias):
+        """Outcome of the last probe; never probes on the caller's thread"""
+        if self._probe_pid != os.getpid():
+            self._start_probing()
+        with self._lock:
+            status = self._status.get(alias)
+        max_age = settings.REPLICA_HEALTH_CHECK_INTERVAL * self.max_staleness
+        return status is not None and time.monotonic() - status[2] <= max_age and status[0]
+
+    def status(self):
+        """``{alias: {'healthy': bool, 'lag': seconds}}`` from the last probes"""
+        with self._lock:
+            return {
+                alias: {'healthy': healthy, 'lag': lag}
+                for alias, (healthy, lag, _) in self._status.items()
+            }
+
+    def choose(self):
+        """Round-robin over healthy replicas, ``None`` when there is none"""
+        aliases = self.aliases
+        if not aliases:
+            return None
+        start = next(self._counter)
+        for offset in range(len(aliases)):
+            alias = aliases[(start + offset) % len(aliases)]
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+
+replica_pool = ReplicaPool()
+
+
+def pin_to_primary():
+    """Send every remaining read of the current request to the primary"""
+    _replica_allowed.set(False)
+
+
+class ReplicaRouter:
+    """
+    Database router sending replica-eligible reads to ``DATABASE_REPLICAS``
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_allowed.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica_pool.choose() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes inside the request
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Enables replica reads for safe requests and keeps clients that just
+    wrote on the primary for ``REPLICA_STICKY_SECONDS``
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sticky = settings.REPLICA_STICKY_COOKIE in request.COOKIES
+        allowed = request.method in SAFE_METHODS and not sticky
+        token = _replica_allowed.set(allowed)
+        try:
+            response = self.get_response(request)
+            wrote = allowed and not _replica_allowed.get()
+        finally:
+            _replica_allowed.reset(token)
+
+        if request.method not in SAFE_METHODS or wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
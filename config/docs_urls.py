@@ -0,0 +1,12 @@
+"""Documentation URLs, included lazily from config.urls (drf_yasg is heavy to import)"""
+from django.urls import path, re_path
+
+from config.openapi import SchemaView, hashed_schema_view
+
+# Served from the prebuilt schema (see config/openapi.py)
+urlpatterns = [
+    path('swagger/', SchemaView.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('redoc/', SchemaView.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(r'^openapi/schema\.(?P<digest>[0-9a-f]+)\.(?P<fmt>json)$', hashed_schema_view,
+            name='schema-prebuilt'),
+]
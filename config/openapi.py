@@ -0,0 +1,178 @@
+"""
+Prebuilt OpenAPI schema.
+
+``build_openapi_schema`` writes the schema once, at build or deploy time, to
+``OPENAPI_SCHEMA_DIR`` as content-hashed files plus ``manifest.json``. The
+docs views then serve those bytes with an ``ETag`` instead of walking every
+view and serializer per request:
+
+* ``/swagger/?format=openapi`` (the URL the UIs load) is cached for
+  ``OPENAPI_CACHE_SECONDS`` and revalidated with ``If-None-Match``
+* ``/openapi/schema.<hash>.json`` never changes and is cached as immutable
+
+With ``DEBUG`` the schema is generated live so changes show up immediately.
+"""
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.test import RequestFactory
+from django.utils.cache import patch_cache_control
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.renderers import _SpecRenderer
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+from rest_framework.request import Request
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+SCHEMA_INFO = openapi.Info(
+    title="Access Control API",
+    default_version='v1',
+    description="API for testing role-based access control systems",
+    contact=openapi.Contact(email="admin@accesscontrol.com"),
+)
+
+def describe_views():
+    """
+    Schema details of views whose modules must not import drf_yasg, which
+    the api profile leaves out (see INSTALLED_APPS)
+    """
+    from apps.jobs.serializers import JobSerializer
+    from apps.resources.serializers import DeletionRequestSerializer
+    from apps.resources.views import ResourceCategoryDetailView
+    from apps.users.views import user_hard_delete_view
+
+    swagger_auto_schema(query_serializer=DeletionRequestSerializer, responses={202: JobSerializer})(
+        ResourceCategoryDetailView.delete)
+    swagger_auto_schema(method='post', request_body=DeletionRequestSerializer,
+                        responses={202: JobSerializer})(user_hard_delete_view)
+
+
+describe_views()
+
+_live_schema_view = get_schema_view(
+    SCHEMA_INFO,
+    public=True,
+    permission_classes=[permissions.AllowAny],
+)
+
+
+def generate_schema():
+    """``{'json': bytes}`` for the current code, independent of the requesting host"""
+    # Views expect a request; an anonymous one is enough with public=True.
+    # url='' keeps host and scheme out, so the UIs call the host they run on.
+    request = Request(RequestFactory().get('/swagger/'))
+    generator = _live_schema_view.generator_class(SCHEMA_INFO, url='')
+    schema = generator.get_schema(request=request, public=True)
+    return {'json': OpenAPICodecJson([], pretty=True).encode(schema)}
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def write_schema(documents, directory):
+    """Write content-hashed files and the manifest, remove stale files. Returns the manifest"""
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for fmt, content in documents.items():
+        digest = content_hash(content)
+        name = f'schema.{digest}.{fmt}'
+        (directory / name).write_bytes(content)
+        manifest[fmt] = {'file': name, 'etag': digest}
+
+    keep = {entry['file'] for entry in manifest.values()} | {MANIFEST}
+    for path in directory.glob('schema.*'):
+        if path.name not in keep:
+            path.unlink()
+    (directory / MANIFEST).write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+    return manifest
+
+
+def read_manifest(directory):
+    path = directory / MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+class _PrebuiltSchema:
+    """Schema documents loaded once per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = None
+
+    def get(self):
+        with self._lock:
+            if self._documents is None:
+                self._documents = self._load()
+            return self._documents
+
+    def _load(self):
+        directory = settings.OPENAPI_SCHEMA_DIR
+        manifest = read_manifest(directory)
+        if manifest is None:
+            logger.warning('No prebuilt OpenAPI schema in %s, run build_openapi_schema; '
+                           'generating it once for this process', directory)
+            return {
+                fmt: (content, content_hash(content))
+                for fmt, content in generate_schema().items()
+            }
+        return {
+            fmt: ((directory / entry['file']).read_bytes(), entry['etag'])
+            for fmt, entry in manifest.items()
+        }
+
+    def clear(self):
+        with self._lock:
+            self._documents = None
+
+
+prebuilt_schema = _PrebuiltSchema()
+
+
+def _schema_response(request, fmt, max_age, immutable=False,
+                     content_type='application/openapi+json'):
+    content, digest = prebuilt_schema.get()[fmt]
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=f'{content_type}; charset=utf-8')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=max_age)
+    if immutable:
+        patch_cache_control(response, immutable=True)
+    return response
+
+
+class SchemaView(_live_schema_view):
+    """drf_yasg schema view serving the prebuilt schema unless ``DEBUG``"""
+
+    def get(self, request, version='', format=None):
+        renderer = request.accepted_renderer
+        # The UI pages themselves are cheap: they carry no paths. YAML is
+        # rarely requested and stays generated.
+        if (settings.DEBUG or not isinstance(renderer, _SpecRenderer) or
+                renderer.codec_class is not OpenAPICodecJson):
+            return super().get(request, version, format)
+        return _schema_response(request, 'json', settings.OPENAPI_CACHE_SECONDS,
+                                content_type=renderer.media_type)
+
+
+def hashed_schema_view(request, digest, fmt):
+    """``/openapi/schema.<hash>.json``, cached forever"""
+    document = prebuilt_schema.get().get(fmt)
+    if document is None or document[1] != digest:
+        raise Http404('Unknown schema version')
+    return _schema_response(request, fmt, IMMUTABLE_MAX_AGE, immutable=True)
@@ -0,0 +1,286 @@
+"""
+Online conversion of a plain PostgreSQL table into a declaratively
+partitioned one.
+
+``convert_to_partitioned`` builds ``<table>_partitioned`` next to the live
+table, copies rows in primary key batches (each batch its own short
+transaction) and builds the indexes and foreign keys of the original table
+on the copy. Only then are the tables swapped, under a brief exclusive lock
+that covers re-copying the rows changed meanwhile and renames. The original
+is kept as ``<table>_unpartitioned`` until it is dropped by hand.
+
+PostgreSQL requires every unique constraint of a partitioned table, the
+primary key included, to contain the partition key, so the new primary key
+is ``(id, <partition key>)``. ``id`` stays unique through its sequence.
+"""
+import re
+
+from django.db import OperationalError, connection, transaction
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind = 'p' FROM pg_class c "
+            "WHERE c.oid = to_regclass(%s)",
+            [table],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def _fetchall(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params or [])
+        return cursor.fetchall()
+
+
+def _execute(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params or [])
+
+
+def partition_strategy(table):
+    """``'range'``, ``'list'``, ``'hash'``, or ``None`` for a plain table"""
+    rows = _fetchall(
+        'SELECT partstrat FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+        [table],
+    )
+    return {'r': 'range', 'l': 'list', 'h': 'hash'}.get(rows[0][0]) if rows else None
+
+
+def attached_partitions(table):
+    """Names of the partitions currently attached to ``table``"""
+    rows = _fetchall(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname',
+        [table],
+    )
+    return [name for (name,) in rows]
+
+
+def standalone_tables(prefix):
+    """Plain tables of the current schema named ``<prefix>...`` that are not partitions"""
+    rows = _fetchall(
+        "SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = current_schema() AND c.relkind = 'r' AND NOT c.relispartition "
+        "AND starts_with(c.relname, %s) ORDER BY c.relname",
+        [prefix],
+    )
+    return [name for (name,) in rows]
+
+
+def has_default_partition(table):
+    rows = _fetchall(
+        'SELECT partdefid <> 0 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+        [table],
+    )
+    return bool(rows and rows[0][0])
+
+
+def detach_partition(parent, name, lock_timeout=None):
+    """
+    Detach ``name`` from ``parent``, committing right away. On PostgreSQL 14+
+    outside a transaction, and without a default partition (which rules out
+    ``CONCURRENTLY``), queries on ``parent`` are not blocked. Otherwise the
+    ACCESS EXCLUSIVE lock on ``parent`` covers only this catalog change, and
+    with ``lock_timeout`` the attempt gives up instead of queueing every
+    query behind it.
+    """
+    q_parent, q_name = _quote(parent), _quote(name)
+    if connection.pg_version >= 140000:
+        pending = _fetchall(
+            'SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(%s)', [name],
+        )
+        if pending and pending[0][0]:
+            # An interrupted DETACH ... CONCURRENTLY
+            _execute(f'ALTER TABLE {q_parent} DETACH PARTITION {q_name} FINALIZE')
+            return
+        if not connection.in_atomic_block and not has_default_partition(parent):
+            _execute(f'ALTER TABLE {q_parent} DETACH PARTITION {q_name} CONCURRENTLY')
+            return
+    try:
+        with transaction.atomic():
+            if lock_timeout:
+                _execute("SELECT set_config('lock_timeout', %s, true)", [lock_timeout])
+            _execute(f'ALTER TABLE {q_parent} DETACH PARTITION {q_name}')
+    except OperationalError as exc:
+        raise PartitioningError(f'Could not detach {name} from {parent}, try again later: {exc}')
+
+
+def create_partition(parent, name, bounds):
+    """``bounds`` is the SQL after ``FOR VALUES``, or ``'DEFAULT'``"""
+    clause = 'DEFAULT' if bounds == 'DEFAULT' else f'FOR VALUES {bounds}'
+    _execute(f'CREATE TABLE IF NOT EXISTS {_quote(name)} PARTITION OF {_quote(parent)} {clause}')
+
+
+def split_default_partition(parent, default, name, bounds, condition, params=None):
+    """
+    Create partition ``name`` of ``parent`` although ``default`` already
+    holds rows of its range: PostgreSQL refuses while they are there. Rows
+    matching ``condition`` (SQL, ``params``) move out of ``default`` and
+    back in through the new partition, in one transaction.
+    """
+    q_parent, q_moving = _quote(parent), _quote(f'{name}_moving')
+    with transaction.atomic():
+        _execute(f'CREATE TEMPORARY TABLE {q_moving} (LIKE {q_parent}) ON COMMIT DROP')
+        _execute(
+            f'WITH moved AS (DELETE FROM {_quote(default)} WHERE {condition} RETURNING *) '
+            f'INSERT INTO {q_moving} SELECT * FROM moved',
+            params,
+        )
+        create_partition(parent, name, bounds)
+        _execute(f'INSERT INTO {q_parent} SELECT * FROM {q_moving}')
+
+
+def _index_on(definition, table, name):
+    """``CREATE INDEX`` statement of ``pg_indexes.indexdef`` for another table and name"""
+    return re.sub(r'^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+ ',
+                  lambda match: f'CREATE {match.group(1) or ""}INDEX {_quote(name)} ON {_quote(table)} ',
+                  definition)
+
+
+def convert_to_partitioned(table, partition_by, partition_key, partitions,
+                           changed_ids=None, batch_size=50000, stdout=None):
+    """
+    Convert ``table`` into a table ``PARTITION BY <partition_by>``.
+
+    ``partitions`` is a list of ``(name, bounds)`` passed to
+    :func:`create_partition`. ``changed_ids(since)`` may return the ids of
+    rows inserted, updated or deleted after the marker it returned when
+    called with ``None``; those rows are re-copied during the swap.
+    """
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Declarative partitioning requires PostgreSQL.')
+    if is_partitioned(table):
+        raise PartitioningError(f'{table} is already partitioned.')
+
+    def report(message):
+        if stdout is not None:
+            stdout.write(message + '\n')
+
+    referencing = _fetchall(
+        "SELECT conrelid::regclass::text FROM pg_constraint "
+        "WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+        [table],
+    )
+    if referencing:
+        raise PartitioningError(
+            f'{table} is referenced by foreign keys from '
+            f'{", ".join(name for (name,) in referencing)}.'
+        )
+
+    new_table = f'{table}_partitioned'
+    old_table = f'{table}_unpartitioned'
+    q_table, q_new, q_old = _quote(table), _quote(new_table), _quote(old_table)
+
+    indexes = _fetchall(
+        'SELECT indexname, indexdef FROM pg_indexes '
+        'WHERE schemaname = current_schema() AND tablename = %s',
+        [table],
+    )
+    foreign_keys = _fetchall(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [table],
+    )
+    primary_key = _fetchall(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+        [table],
+    )
+    primary_key_names = {name for (name,) in primary_key}
+
+    with transaction.atomic():
+        _execute(f'DROP TABLE IF EXISTS {q_new}')
+        _execute(
+            f'CREATE TABLE {q_new} (LIKE {q_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+            f'INCLUDING IDENTITY) PARTITION BY {partition_by}'
+        )
+        _execute(f'ALTER TABLE {q_new} ADD PRIMARY KEY ("id", {_quote(partition_key)})')
+        for name, bounds in partitions:
+            create_partition(new_table, name, bounds)
+    report(f'Created {new_table} with {len(partitions)} partitions')
+
+    marker = changed_ids(None) if changed_ids else None
+    last_id = 0
+    copied = 0
+    while True:
+        with transaction.atomic():
+            rows = _fetchall(
+                f'SELECT max("id"), count(*) FROM (SELECT "id" FROM {q_table} '
+                f'WHERE "id" > %s ORDER BY "id" LIMIT %s) batch',
+                [last_id, batch_size],
+            )
+            upper, count = rows[0]
+            if not count:
+                break
+            _execute(
+                f'INSERT INTO {q_new} SELECT * FROM {q_table} WHERE "id" > %s AND "id" <= %s',
+                [last_id, upper],
+            )
+        last_id = upper
+        copied += count
+        report(f'Copied {copied} rows')
+
+    # Indexes and foreign keys are built before the swap, locking only the
+    # new table; the swap renames them
+    new_indexes = []
+    for name, definition in indexes:
+        if name in primary_key_names:
+            continue
+        new_name = f'{name[:59]}_new'
+        _execute(_index_on(definition, new_table, new_name))
+        new_indexes.append((name, new_name))
+    report(f'Built {len(new_indexes)} indexes')
+
+    for name, definition in foreign_keys:
+        # NOT VALID is refused on a partitioned table: the constraint is
+        # validated partition by partition without blocking writes to the
+        # referenced table, then attached to the parent without a new scan
+        for partition in attached_partitions(new_table):
+            _execute(f'ALTER TABLE {_quote(partition)} ADD CONSTRAINT {_quote(name)} {definition} NOT VALID')
+            _execute(f'ALTER TABLE {_quote(partition)} VALIDATE CONSTRAINT {_quote(name)}')
+        _execute(f'ALTER TABLE {q_new} ADD CONSTRAINT {_quote(name)} {definition}')
+    report(f'Validated {len(foreign_keys)} foreign keys')
+
+    with transaction.atomic():
+        _execute(f'LOCK TABLE {q_table} IN EXCLUSIVE MODE')
+
+        # Rows written while copying: new ids, and changes reported by the caller
+        _execute(f'INSERT INTO {q_new} SELECT * FROM {q_table} WHERE "id" > %s', [last_id])
+        if changed_ids:
+            ids = list(changed_ids(marker))
+            if ids:
+                _execute(f'DELETE FROM {q_new} WHERE "id" = ANY(%s)', [ids])
+                _execute(
+                    f'INSERT INTO {q_new} SELECT * FROM {q_table} WHERE "id" = ANY(%s) '
+                    f'AND "id" <= %s',
+                    [ids, last_id],
+                )
+
+        _execute(f'ALTER TABLE {q_table} RENAME TO {q_old}')
+        _execute(f'ALTER TABLE {q_new} RENAME TO {q_table}')
+
+        # Identity sequences are per table: continue after the copied ids
+        _execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f'(SELECT COALESCE(max("id"), 0) + 1 FROM {q_table}), false)',
+            [table],
+        )
+
+        for name, new_name in new_indexes:
+            _execute(f'ALTER INDEX {_quote(name)} RENAME TO {_quote(name[:59] + "_old")}')
+            _execute(f'ALTER INDEX {_quote(new_name)} RENAME TO {_quote(name)}')
+
+        for name, _ in foreign_keys:
+            _execute(f'ALTER TABLE {q_old} RENAME CONSTRAINT {_quote(name)} TO {_quote(name + "_old")}')
+
+    report(f'{table} is now partitioned, the original table is kept as {old_table}')
@@ -0,0 +1,215 @@
+"""
+On-demand request profiling.
+
+``ProfilingMiddleware`` runs a request under ``cProfile`` when
+
+* it carries a token minted by an administrator (``POST /api/profiles/token/``)
+  in the ``X-Profile-Token`` header or the ``_profile`` query parameter, or
+* it is picked by sampling, ``PROFILING_SAMPLE_RATE`` of all requests.
+
+A profiled request records wall time, CPU time of the serving thread and
+time spent in SQL, and leaves two artifacts in ``PROFILING_DIR``: the
+``pstats`` dump (``<id>.prof``, for snakeviz or ``python -m pstats``) and a
+JSON summary (``<id>.json``) with the top functions and slowest queries.
+The response carries the artifact id in ``X-Profile-Id``.
+
+With ``PROFILING_ENABLED`` off the middleware removes itself at startup;
+when on, a request that is not profiled costs a header and a query
+parameter lookup.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+TOKEN_SALT = 'config.profiling'
+HEADER = 'HTTP_X_PROFILE_TOKEN'
+QUERY_PARAM = '_profile'
+PROFILE_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{32}$')
+
+
+def make_token(user):
+    """Signed token that triggers profiling for ``PROFILING_TOKEN_MAX_AGE`` seconds"""
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def _token_valid(token):
+    try:
+        signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def profile_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+class _SqlTimer:
+    """``execute_wrapper`` summing the time of every query"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            self.slowest.append((elapsed, context['connection'].alias, sql))
+            if len(self.slowest) > 40:
+                self.slowest.sort(reverse=True)
+                del self.slowest[10:]
+
+
+def _top_functions(profiler, limit=30):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def _url_name(request):
+    try:
+        return resolve(request.path_info).view_name
+    except Resolver404:
+        return None
+
+
+def _save(profiler, summary):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(directory / f'{summary["id"]}.prof')
+    with open(directory / f'{summary["id"]}.json', 'w', encoding='utf-8') as stream:
+        json.dump(summary, stream, indent=2)
+    _prune(directory)
+
+
+def _prune(directory):
+    summaries = sorted(directory.glob('*.json'), key=os.path.getmtime)
+    for path in summaries[:max(len(summaries) - settings.PROFILING_MAX_ARTIFACTS, 0)]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def read_summary(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def list_profiles(tenant_id=None, limit=100):
+    """Summaries without the report text, newest first"""
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in sorted(directory.glob('*.json'), key=os.path.getmtime, reverse=True):
+        try:
+            summary = read_summary(path)
+        except (OSError, ValueError):
+            # Pruned or still being written by another worker
+            continue
+        if tenant_id is not None and summary.get('tenant_id') != tenant_id:
+            continue
+        summary.pop('functions', None)
+        summary.pop('slowest_queries', None)
+        profiles.append(summary)
+        if len(profiles) >= limit:
+            break
+    return profiles
+
+
+def profile_path(profile_id, suffix):
+    """Path of an artifact, ``None`` for unknown or malformed ids"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = profile_dir() / f'{profile_id}{suffix}'
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """Profiles requests with a valid token, or a sample of all requests"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        token = request.META.get(HEADER) or request.GET.get(QUERY_PARAM)
+        if token:
+            if not _token_valid(token):
+                return self.get_response(request)
+            trigger = 'token'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sample'
+        else:
+            return self.get_response(request)
+        return self._profile(request, trigger)
+
+    def _profile(self, request, trigger):
+        sql = _SqlTimer()
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql))
+            wall_started = time.perf_counter()
+            cpu_started = time.thread_time()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            cpu = time.thread_time() - cpu_started
+            wall = time.perf_counter() - wall_started
+
+        user = getattr(request, 'user', None)
+        authenticated = user is not None and user.is_authenticated
+        profile_id = f'{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex}'
+        sql.slowest.sort(reverse=True)
+        summary = {
+            'id': profile_id,
+            'trigger': trigger,
+            'created_at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'url_name': _url_name(request),
+            'status': response.status_code,
+            'tenant_id': getattr(request, 'tenant_id', None),
+            'user_id': user.pk if authenticated else None,
+            'role': user.role if authenticated else None,
+            'wall_ms': round(wall * 1000, 2),
+            'cpu_ms': round(cpu * 1000, 2),
+            'sql_ms': round(sql.seconds * 1000, 2),
+            'sql_queries': sql.count,
+            # Mostly waiting: I/O other than SQL, locks, the GIL
+            'other_ms': round(max(wall - cpu - sql.seconds, 0) * 1000, 2),
+            'slowest_queries': [
+                {'ms': round(elapsed * 1000, 2), 'database': alias, 'sql': statement}
+                for elapsed, alias, statement in sql.slowest[:10]
+            ],
+            'functions': _top_functions(profiler),
+        }
+        _save(profiler, summary)
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -1,18 +1,23 @@
 """
 Django settings for access_control_api project.
 """
+import importlib.util
 import os
-import sys
 from pathlib import Path
-from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Add apps directory to Python path
-sys.path.insert(0, os.path.join(BASE_DIR, 'apps'))
+# 'api' is the lean profile for API-serving pods: configuration comes from
+# the real environment, admin modules and docs load on first use, static
+# files and the browsable API are left out. See config/startup.py.
+APP_PROFILE = os.getenv('APP_PROFILE', 'full')
+API_PROFILE = APP_PROFILE == 'api'
 
-load_dotenv()
+if not API_PROFILE:
+    from dotenv import load_dotenv
+    load_dotenv()
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 DEBUG = os.getenv('DEBUG', 'True') == 'True'
@@ -21,33 +26,48 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
 
 # Applications
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # SimpleAdminConfig skips admin autodiscovery, config.admin_urls runs it
+    'django.contrib.admin.apps.SimpleAdminConfig' if API_PROFILE else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    *([] if API_PROFILE else ['django.contrib.staticfiles']),
 
     # Third party
     'rest_framework',
     'corsheaders',
-    'drf_yasg',
+    # The api profile only needs its templates, see TEMPLATES. This keeps
+    # drf_yasg's own import of pkg_resources out, but not pkg_resources
+    # itself: coreapi, a drf-yasg dependency, is imported by DRF and
+    # django-filter whenever installed and imports it too (~130 ms,
+    # "manage.py startup_report" shows the chain)
+    *([] if API_PROFILE else ['drf_yasg']),
     'django_filters',
 
     # Local apps
+    'apps.core',
+    'apps.tenants',
     'apps.users',
     'apps.resources',
+    'apps.jobs',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.slow_queries.SlowQueryMiddleware',
+    'config.db_routing.ReplicaRoutingMiddleware',
+    'apps.tenants.middleware.TenantMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'config.throttling.ThrottleHeadersMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last, so the profile covers the view only; removed unless PROFILING_ENABLED
+    'config.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -55,7 +75,12 @@ ROOT_URLCONF = 'config.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [
+            BASE_DIR / 'templates',
+            # find_spec locates the package without importing it
+            *([Path(importlib.util.find_spec('drf_yasg').submodule_search_locations[0]) / 'templates']
+              if API_PROFILE else []),
+        ],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -82,6 +107,45 @@ DATABASES = {
     }
 }
 
+# Read replicas: DB_REPLICAS=host[:port][,host[:port]...]
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    host, _, port = replica.strip().partition(':')
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['config.db_routing.ReplicaRouter']
+
+# Clients that wrote keep reading from the primary for this many seconds
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+REPLICA_STICKY_COOKIE = 'db_primary_pin'
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '2'))
+REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv('REPLICA_HEALTH_CHECK_INTERVAL', '5'))
+
+# Cache for throttle bucket sync, facet and count caches. The default keeps
+# them per process; share them with CACHE_URL=redis://host:port/db or
+# memcached://host:port
+CACHE_URL = os.getenv('CACHE_URL', 'locmem://')
+CACHE_BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+_cache_scheme, _, _cache_location = CACHE_URL.partition('://')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[_cache_scheme],
+        'LOCATION': CACHE_URL if _cache_scheme.startswith('redis') else _cache_location,
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -114,6 +178,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 
+# Email is unique per tenant, not globally
+AUTHENTICATION_BACKENDS = ['apps.tenants.backends.TenantModelBackend']
+SILENCED_SYSTEM_CHECKS = ['auth.W004']
+
+# Tenants: resolved per request from the X-Tenant header (slug) or the host name
+DEFAULT_TENANT_SLUG = os.getenv('DEFAULT_TENANT_SLUG', 'default')
+TENANT_HEADER = 'X-Tenant'
+# Seconds a slug/host to tenant resolution is cached per process, and how
+# many known and unknown slugs/hosts are kept (least recently used go first)
+TENANT_CACHE_TTL = 60
+TENANT_CACHE_SIZE = 1000
+TENANT_CACHE_MISSES = 100
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -127,7 +204,53 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Only paginates when the client sends ?page= or ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'config.counting.CountingPageNumberPagination',
+    'DEFAULT_THROTTLE_CLASSES': ['config.throttling.RoleTokenBucketThrottle'],
+    # Proxies in front of the app; anonymous clients are throttled by the address
+    # the outermost of them saw, 0 uses REMOTE_ADDR and ignores X-Forwarded-For
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
+if API_PROFILE:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['rest_framework.renderers.JSONRenderer']
+
+# Throttling (config/throttling.py): "<burst>,<requests>/<period>" per role and tier
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_RATES = {
+    'anon': {'read': '20,60/min', 'list': '10,30/min', 'write': '10,20/min'},
+    'user': {'read': '60,600/min', 'list': '20,120/min', 'write': '20,60/min'},
+    'moderator': {'read': '120,1200/min', 'list': '40,300/min', 'write': '40,120/min'},
+    'admin': {'read': '240,3000/min', 'list': '80,600/min', 'write': '80,300/min'},
+}
+# e.g. "user.list=10,60/min;anon.write=5,10/min"
+THROTTLE_RATE_OVERRIDES = os.getenv('THROTTLE_RATE_OVERRIDES', '')
+# config.throttling.LocalBucketStore or config.throttling.CacheBucketStore
+THROTTLE_STORE = os.getenv('THROTTLE_STORE', 'config.throttling.LocalBucketStore')
+# Seconds between cross-worker syncs of the local store
+THROTTLE_SYNC_INTERVAL = float(os.getenv('THROTTLE_SYNC_INTERVAL', '1.0'))
+
+# Request profiling (config/profiling.py), artifacts served by /api/profiles/
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+# Fraction of all requests profiled without a token, 0 disables sampling
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', '3600'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'var' / 'profiles'))
+PROFILING_MAX_ARTIFACTS = int(os.getenv('PROFILING_MAX_ARTIFACTS', '200'))
+
+# Slow query recorder (config/slow_queries.py): /api/slow-queries/, "manage.py slow_queries"
+SLOW_QUERY_ENABLED = os.getenv('SLOW_QUERY_ENABLED', 'True') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+# EXPLAIN ANALYZE runs the slow query a second time (PostgreSQL only)
+SLOW_QUERY_EXPLAIN_ANALYZE = os.getenv('SLOW_QUERY_EXPLAIN_ANALYZE', 'False') == 'True'
+# Seconds between two plans of the same statement, per worker
+SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))
+SLOW_QUERY_FLUSH_INTERVAL = int(os.getenv('SLOW_QUERY_FLUSH_INTERVAL', '60'))
+SLOW_QUERY_RETENTION_DAYS = int(os.getenv('SLOW_QUERY_RETENTION_DAYS', '7'))
+
+# Counts above this planner estimate are reported as estimates
+COUNT_EXACT_THRESHOLD = int(os.getenv('COUNT_EXACT_THRESHOLD', '10000'))
+# Seconds a count is cached per query (role and filters included)
+COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', '30'))
 
 # CORS
 CORS_ALLOWED_ORIGINS = [
@@ -136,8 +259,80 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, TENANT_HEADER.lower())
 
 # Session settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = False  # True in production with HTTPS
+
+# Soft-deleted users are moved to the archive tables after this many days
+USER_ARCHIVE_RETENTION_DAYS = int(os.getenv('USER_ARCHIVE_RETENTION_DAYS', '90'))
+
+# Bulk provisioning (POST /api/auth/users/bulk/, "manage.py provision_users")
+# 0 hashes passwords on one process per CPU
+PROVISIONING_HASH_WORKERS = int(os.getenv('PROVISIONING_HASH_WORKERS', '0'))
+PROVISIONING_MAX_ROWS = int(os.getenv('PROVISIONING_MAX_ROWS', '5000'))
+# Larger bulk requests are queued as a users.provision job (invites only)
+PROVISIONING_SYNC_ROWS = int(os.getenv('PROVISIONING_SYNC_ROWS', '200'))
+# Link mailed to invited users, {uid} and {token} go to POST /api/auth/password/set/
+PASSWORD_SETUP_URL = os.getenv('PASSWORD_SETUP_URL', 'http://localhost:3000/set-password/{uid}/{token}/')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Background jobs (apps/jobs): "manage.py run_workers", /api/jobs/
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '2'))
+# "thread" workers share this process, "process" spawns one process per worker
+JOBS_WORKER_MODE = os.getenv('JOBS_WORKER_MODE', 'thread')
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1.0'))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '3'))
+# Seconds before the first retry, doubled per attempt up to JOBS_RETRY_BACKOFF_MAX
+JOBS_RETRY_BACKOFF = float(os.getenv('JOBS_RETRY_BACKOFF', '10'))
+JOBS_RETRY_BACKOFF_MAX = float(os.getenv('JOBS_RETRY_BACKOFF_MAX', '600'))
+# A running job whose worker stopped renewing its lease this long is retried
+JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', '60'))
+JOBS_RETENTION_DAYS = int(os.getenv('JOBS_RETENTION_DAYS', '14'))
+JOBS_ARTIFACT_DIR = os.getenv('JOBS_ARTIFACT_DIR', str(BASE_DIR / 'var' / 'jobs'))
+# Rows of a queued import (users.provision job)
+PROVISIONING_JOB_MAX_ROWS = int(os.getenv('PROVISIONING_JOB_MAX_ROWS', '100000'))
+
+# Prebuilt OpenAPI schema (build_openapi_schema), generated live only with DEBUG
+OPENAPI_SCHEMA_DIR = BASE_DIR / 'openapi'
+OPENAPI_CACHE_SECONDS = int(os.getenv('OPENAPI_CACHE_SECONDS', '3600'))
+
+# Startup (config/startup.py): warm caches before the first request, and
+# the import time budget checked by "manage.py startup_report"
+STARTUP_WARM_UP = os.getenv('STARTUP_WARM_UP', 'True') == 'True'
+STARTUP_IMPORT_BUDGET_MS = int(os.getenv('STARTUP_IMPORT_BUDGET_MS', '1000'))
+
+# Monthly created_at partitions of mock_resources (manage_resource_partitions)
+RESOURCE_PARTITION_MONTHS_AHEAD = int(os.getenv('RESOURCE_PARTITION_MONTHS_AHEAD', '3'))
+# 0 keeps every partition attached
+RESOURCE_PARTITION_RETENTION_MONTHS = int(os.getenv('RESOURCE_PARTITION_RETENTION_MONTHS', '0'))
+
+# Seconds facet counts (/api/resources/facets/) are cached; writes invalidate them sooner
+FACETS_CACHE_TTL = int(os.getenv('FACETS_CACHE_TTL', '300'))
+
+# Access simulation (/api/access-simulation/, "manage.py simulate_access")
+# Resources evaluated per vectorized step, bounds the temporary arrays
+SIMULATION_CHUNK_SIZE = int(os.getenv('SIMULATION_CHUNK_SIZE', '262144'))
+# Seconds a loaded snapshot is reused per process; resource writes reload it sooner
+SIMULATION_SNAPSHOT_TTL = int(os.getenv('SIMULATION_SNAPSHOT_TTL', '60'))
+
+# Reverse access index (/api/access-index/, "manage.py refresh_access_index")
+# One memory-mapped file per tenant, shared by all processes
+ACCESS_INDEX_DIR = os.getenv('ACCESS_INDEX_DIR', str(BASE_DIR / 'var' / 'access_index'))
+# Seconds an index is served before a query refreshes it incrementally
+ACCESS_INDEX_MAX_AGE = float(os.getenv('ACCESS_INDEX_MAX_AGE', '5'))
+# Users saved this many seconds before the last refresh are re-read, covering
+# transactions that committed late
+ACCESS_INDEX_REFRESH_OVERLAP = int(os.getenv('ACCESS_INDEX_REFRESH_OVERLAP', '60'))
+
+# Chunked deletion of categories and users (apps.resources.deletion)
+# Resources deleted or reassigned per transaction
+DELETION_BATCH_SIZE = int(os.getenv('DELETION_BATCH_SIZE', '1000'))
+# Seconds slept between two batches, leaves room for regular traffic
+DELETION_PAUSE = float(os.getenv('DELETION_PAUSE', '0'))
+
+# Change feed (/api/changes/)
+CHANGE_FEED_MAX_WAIT = 25
+CHANGE_FEED_POLL_INTERVAL = 1.0
@@ -0,0 +1,271 @@
+"""
+Slow query recorder.
+
+``install`` adds ``QueryRecorder`` to the execute wrappers of every new
+database connection, so every ORM and raw cursor query is timed, in
+requests and in management commands alike.
+
+Queries are grouped by fingerprint, a hash of the SQL with literals and
+``IN`` lists normalized, and by the current tenant. Each worker sums calls,
+total and maximum time per fingerprint in memory.
+
+A SELECT slower than ``SLOW_QUERY_THRESHOLD_MS`` is kept with its
+parameters, the URL name and role of the request that issued it, at most
+once per ``SLOW_QUERY_EXPLAIN_INTERVAL`` seconds per fingerprint and worker.
+
+The wrapper itself only buffers. A background thread explains the kept
+queries (``EXPLAIN ANALYZE`` on PostgreSQL with
+``SLOW_QUERY_EXPLAIN_ANALYZE``, which runs the query again), adds the
+statistics to ``QueryFingerprint`` and stores ``SlowQuery`` rows every
+``SLOW_QUERY_FLUSH_INTERVAL`` seconds. Threads have connections of their
+own, so the recorder never runs a query inside the caller's transaction;
+its own queries bypass it.
+"""
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.tenants.context import get_current_tenant_id
+
+logger = logging.getLogger(__name__)
+
+# Request being served, for the URL name and role of slow queries
+_current_request = contextvars.ContextVar('slow_query_request', default=None)
+# True while the recorder runs its own queries
+_suspended = contextvars.ContextVar('slow_query_suspended', default=False)
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """SQL with literals and placeholders as ``?`` and value lists collapsed"""
+    sql = _NUMBERS.sub('?', _STRINGS.sub('?', sql)).replace('%s', '?')
+    return _SPACES.sub(' ', _IN_LISTS.sub('(...)', sql)).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def _request_context():
+    request = _current_request.get()
+    if request is None:
+        return '', '', None
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    role = user.role if user is not None and user.is_authenticated else 'anon'
+    return (match.view_name if match else ''), role, getattr(request, 'tenant_id', None)
+
+
+def explain(connection, sql, params):
+    """Plan of ``sql`` as text, ``''`` when the database can not explain it"""
+    options = {}
+    if connection.vendor == 'postgresql' and settings.SLOW_QUERY_EXPLAIN_ANALYZE:
+        options = {'analyze': True, 'buffers': True}
+    try:
+        prefix = connection.ops.explain_query_prefix(**options)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except (DatabaseError, NotImplementedError, ValueError):
+        logger.warning('Could not explain slow query', exc_info=True)
+        return ''
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` timing queries and capturing slow ones"""
+
+    max_cached_statements = 2000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # SQL as executed -> (fingerprint, normalized SQL); ORM SQL repeats
+        self._statements = OrderedDict()
+        # (tenant id, fingerprint) -> [normalized SQL, calls, slow calls, total ms, max ms]
+        self._pending = {}
+        # Slow SELECTs with their parameters, explained when flushed
+        self._captures = []
+        self._explained_at = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if _suspended.get():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = execute(sql, params, many, context)
+            failed = False
+            return result
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            # Resolving request.user for a capture may query
+            token = _suspended.set(True)
+            try:
+                self._record(context['connection'], sql, params, many, elapsed, failed)
+            finally:
+                _suspended.reset(token)
+
+    def _fingerprint(self, sql):
+        with self._lock:
+            known = self._statements.get(sql)
+            if known is not None:
+                self._statements.move_to_end(sql)
+                return known
+        normalized = normalize(sql)
+        known = (fingerprint(normalized), normalized)
+        with self._lock:
+            self._statements[sql] = known
+            if len(self._statements) > self.max_cached_statements:
+                self._statements.popitem(last=False)
+        return known
+
+    def _record(self, connection, sql, params, many, elapsed, failed):
+        key, normalized = self._fingerprint(sql)
+        slow = elapsed >= settings.SLOW_QUERY_THRESHOLD_MS
+        now = time.monotonic()
+        pending_key = (get_current_tenant_id(), key)
+        with self._lock:
+            stats = self._pending.get(pending_key)
+            if stats is None:
+                stats = self._pending[pending_key] = [normalized, 0, 0, 0.0, 0.0]
+            stats[1] += 1
+            stats[2] += slow
+            stats[3] += elapsed
+            stats[4] = max(stats[4], elapsed)
+            capture = (
+                slow and not failed and not many
+                and normalized[:7].upper() == 'SELECT '
+                and now - self._explained_at.get(key, -1e9) >= settings.SLOW_QUERY_EXPLAIN_INTERVAL
+            )
+            if capture:
+                self._explained_at[key] = now
+
+        if capture:
+            url_name, role, tenant_id = _request_context()
+            with self._lock:
+                self._captures.append({
+                    'fingerprint': key, 'sql': sql, 'duration_ms': round(elapsed, 3),
+                    'database': connection.alias, 'url_name': url_name or '', 'role': role,
+                    'tenant_id': tenant_id, 'created_at': timezone.now(),
+                    'params': tuple(params) if isinstance(params, list) else params,
+                })
+
+    def start(self):
+        """Flush from a background thread every ``SLOW_QUERY_FLUSH_INTERVAL`` seconds"""
+        threading.Thread(target=self._flush_loop, name='slow-query-flush', daemon=True).start()
+
+    def _after_fork(self):
+        # The parent flushes what it had pending, the child starts empty
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._captures = []
+        self.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(settings.SLOW_QUERY_FLUSH_INTERVAL)
+            try:
+                self._flush()
+            except Exception:
+                logger.exception('Query statistics flush failed')
+
+    def flush(self):
+        """Write what this worker has pending now and wait for it"""
+        thread = threading.Thread(target=self._flush, name='slow-query-flush')
+        thread.start()
+        thread.join()
+
+    def _flush(self):
+        # Runs in a thread of its own, on connections of its own
+        from apps.core.models import QueryFingerprint, SlowQuery
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            captures, self._captures = self._captures, []
+        if not pending and not captures:
+            return
+
+        token = _suspended.set(True)
+        try:
+            for capture in captures:
+                params = capture.pop('params')
+                capture['plan'] = explain(connections[capture['database']], capture['sql'], params)
+            now = timezone.now()
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                fingerprints = QueryFingerprint._base_manager.using(DEFAULT_DB_ALIAS)
+                for (tenant_id, key), (normalized, calls, slow_calls, total, longest) in pending.items():
+                    updated = fingerprints.filter(tenant_id=tenant_id, fingerprint=key).update(
+                        calls=F('calls') + calls,
+                        slow_calls=F('slow_calls') + slow_calls,
+                        total_ms=F('total_ms') + total,
+                        max_ms=Greatest(F('max_ms'), longest),
+                        last_seen=now,
+                    )
+                    if not updated:
+                        fingerprints.bulk_create([QueryFingerprint(
+                            tenant_id=tenant_id, fingerprint=key, sql=normalized, calls=calls,
+                            slow_calls=slow_calls, total_ms=total, max_ms=longest,
+                            first_seen=now, last_seen=now,
+                        )], ignore_conflicts=True)
+                if captures:
+                    SlowQuery.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                        [SlowQuery(**capture) for capture in captures]
+                    )
+                    cutoff = now - timedelta(days=settings.SLOW_QUERY_RETENTION_DAYS)
+                    SlowQuery.objects.using(DEFAULT_DB_ALIAS).filter(created_at__lt=cutoff).delete()
+        except DatabaseError:
+            # E.g. tables not migrated yet; statistics of this interval are lost
+            logger.warning('Could not flush query statistics', exc_info=True)
+        finally:
+            _suspended.reset(token)
+            connections.close_all()
+
+
+recorder = QueryRecorder()
+
+
+def _install(sender, connection, **kwargs):
+    if recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(recorder)
+
+
+def install():
+    """Time the queries of every connection opened from now on"""
+    from django.db.backends.signals import connection_created
+    connection_created.connect(_install, dispatch_uid='config.slow_queries')
+    recorder.start()
+    # Threads do not survive a fork, e.g. of a preloading server
+    os.register_at_fork(after_in_child=recorder._after_fork)
+
+
+class SlowQueryMiddleware:
+    """Remembers the request for the URL name and role of slow queries"""
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
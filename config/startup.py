@@ -0,0 +1,141 @@
+"""
+Worker startup.
+
+``warm_up`` runs once in config.wsgi / config.asgi, before the first request:
+
+* compiles and populates the URL resolvers of the API (the admin and docs
+  URLconfs listed in ``config.urls.LAZY_URLCONFS`` stay unimported)
+* imports the DRF classes configured as strings in ``REST_FRAMEWORK``
+* builds the fields of every serializer once, which fills the model
+  ``_meta`` caches and imports lazily referenced modules
+* loads the password hashers
+
+``import_time_report`` runs a fresh interpreter with ``-X importtime`` to
+measure what a worker boot imports, per module.
+"""
+import inspect
+import logging
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.urls import URLResolver, get_resolver
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+REST_FRAMEWORK_CLASSES = (
+    'DEFAULT_RENDERER_CLASSES',
+    'DEFAULT_PARSER_CLASSES',
+    'DEFAULT_AUTHENTICATION_CLASSES',
+    'DEFAULT_PERMISSION_CLASSES',
+    'DEFAULT_THROTTLE_CLASSES',
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+    'DEFAULT_FILTER_BACKENDS',
+    'DEFAULT_PAGINATION_CLASS',
+)
+
+
+def _warm_patterns(patterns, lazy):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.urlconf_name in lazy:
+                continue
+            pattern.pattern.regex
+            _warm_patterns(pattern.url_patterns, lazy)
+            # Reverse lookups within the include
+            pattern._populate()
+        else:
+            pattern.pattern.regex
+
+
+def warm_url_resolver():
+    resolver = get_resolver()
+    lazy = getattr(import_module(settings.ROOT_URLCONF), 'LAZY_URLCONFS', ())
+    _warm_patterns(resolver.url_patterns, lazy)
+
+
+def warm_serializers():
+    """Build the fields of the serializers defined in the local apps"""
+    for app_config in apps.get_app_configs():
+        if not app_config.name.startswith('apps.'):
+            continue
+        try:
+            module = import_module(f'{app_config.name}.serializers')
+        except ModuleNotFoundError:
+            continue
+        for _, serializer_class in inspect.getmembers(module, inspect.isclass):
+            if (issubclass(serializer_class, serializers.BaseSerializer) and
+                    serializer_class.__module__ == module.__name__):
+                try:
+                    serializer_class().fields
+                except Exception:
+                    # e.g. serializers that need a request in their context
+                    logger.debug('Could not warm %s', serializer_class, exc_info=True)
+
+
+def warm_up():
+    if not settings.STARTUP_WARM_UP:
+        return
+    warm_url_resolver()
+    for name in REST_FRAMEWORK_CLASSES:
+        getattr(api_settings, name)
+    warm_serializers()
+    get_hashers()
+
+
+_IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_time_report(entry_point='config.wsgi', profile='api'):
+    """
+    Import ``entry_point`` in a new interpreter with ``APP_PROFILE=profile``.
+
+    Returns ``{'total_ms', 'packages': [{'package', 'self_ms'}],
+    'modules': [{'module', 'self_ms', 'cumulative_ms', 'imported_by'}]}``,
+    both lists sorted by self time, the import cost of the module alone.
+    ``imported_by`` is the chain of modules whose import pulled it in,
+    innermost first.
+    """
+    env = {**os.environ, 'APP_PROFILE': profile}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {entry_point}'],
+        env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f'Importing {entry_point} failed:\n{result.stderr[-2000:]}')
+
+    modules = []
+    packages = defaultdict(int)
+    # -X importtime prints a module after the ones it imported, indented one
+    # level deeper; read backwards, the importer comes first
+    importers = []
+    for line in reversed(result.stderr.splitlines()):
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, module = int(match[1]), int(match[2]), match[4]
+        depth = len(match[3]) // 2
+        del importers[depth:]
+        modules.append({'module': module, 'self_ms': self_us / 1000,
+                        'cumulative_ms': cumulative_us / 1000,
+                        'imported_by': importers[::-1]})
+        importers.append(module)
+        packages[module.split('.')[0]] += self_us
+
+    modules.sort(key=lambda entry: entry['self_ms'], reverse=True)
+    return {
+        'total_ms': sum(entry['self_ms'] for entry in modules),
+        'packages': sorted(
+            ({'package': package, 'self_ms': self_us / 1000} for package, self_us in packages.items()),
+            key=lambda entry: entry['self_ms'], reverse=True,
+        ),
+        'modules': modules,
+    }
@@ -0,0 +1,322 @@
+"""
+Token bucket throttling tiered by role and endpoint class.
+
+Every request is charged to one bucket per client (user id, or address for
+anonymous clients) and tier:
+
+* ``read``  - safe requests for a single object, and cheap function views
+* ``list``  - safe requests to list views, the expensive lists and searches
+* ``write`` - every unsafe method
+
+A view may pin its tier with a ``throttle_tier`` attribute. Bucket size
+(burst) and refill rate (sustained) come from ``THROTTLE_RATES`` per role
+and tier.
+
+Buckets live in a store selected by ``THROTTLE_STORE``:
+
+* ``LocalBucketStore`` (default) keeps buckets in process memory, so a check
+  is a dict lookup under a lock. Every ``THROTTLE_SYNC_INTERVAL`` seconds a
+  background thread adds the tokens consumed locally to per-bucket counters
+  in the Django cache and deducts the consumption of the other workers from
+  the local buckets: limits hold across workers, approximately.
+* ``CacheBucketStore`` keeps buckets in the shared cache, one read and one
+  write per request.
+
+With a process-local cache (the default ``locmem://``) the local store
+keeps per-process limits, and the ``manage.py check --deploy`` warning
+``check_shared_cache`` points at it; ``CacheBucketStore`` needs a shared
+cache and the ``check_cache_store`` error says so.
+Anonymous clients are identified by address; behind load balancers set
+``NUM_PROXIES`` so that only the entries they appended to X-Forwarded-For
+are trusted.
+
+Allowed requests carry ``X-RateLimit-*`` headers (``ThrottleHeadersMiddleware``),
+throttled ones get a 429 with ``Retry-After``. ``throttle_metrics`` returns
+the per-process allowed/throttled counters.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core import checks
+from django.utils.module_loading import import_string
+from rest_framework.mixins import ListModelMixin
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+TIERS = ('read', 'list', 'write')
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+_RATE_RE = re.compile(r'^\s*(\d+)\s*,\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*$')
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def parse_rate(rate):
+    """``'<burst>,<requests>/<period>'`` -> ``(capacity, tokens per second)``"""
+    match = _RATE_RE.match(rate)
+    if not match or match.group(4) not in PERIODS:
+        raise ValueError(f'Invalid throttle rate "{rate}", expected e.g. "30,300/min"')
+    burst, requests, count, unit = match.groups()
+    seconds = int(count or 1) * PERIODS[unit]
+    return int(burst), int(requests) / seconds
+
+
+def parse_overrides(value):
+    """``'user.list=20,120/min;anon.write=5,10/min'`` -> ``{('user', 'list'): rate}``"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in value.split(';'))):
+        name, _, rate = item.partition('=')
+        role, _, tier = name.strip().partition('.')
+        overrides[(role, tier)] = rate.strip()
+    return overrides
+
+
+def _local_cache():
+    """Backend of the default cache when the workers do not share it"""
+    backend = settings.CACHES['default']['BACKEND']
+    return backend if settings.THROTTLE_ENABLED and backend in PROCESS_LOCAL_CACHES else None
+
+
+def check_cache_store(app_configs, **kwargs):
+    """System check: ``CacheBucketStore`` keeps every bucket in the cache"""
+    backend = _local_cache()
+    if backend is None or import_string(settings.THROTTLE_STORE) is not CacheBucketStore:
+        return []
+    return [checks.Error(
+        f'CacheBucketStore needs a cache shared by all workers, {backend} is per process.',
+        hint='Set CACHE_URL to a redis:// or memcached:// server, or use LocalBucketStore.',
+        id='throttling.E001',
+    )]
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Deploy check: with a per-process cache the limits are per process"""
+    backend = _local_cache()
+    if backend is None:
+        return []
+    return [checks.Warning(
+        f'Throttle buckets are not synced across workers, {backend} is per process: '
+        'each worker enforces the limits on its own.',
+        hint='Set CACHE_URL to a redis:// or memcached:// server.',
+        id='throttling.W001',
+    )]
+
+
+class LocalBucketStore:
+    """In-process buckets with periodic, approximate sync through the cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [tokens, updated_at, capacity, refill, consumed since sync, last shared total]
+        self._buckets = {}
+        # The sync thread does not survive a fork, so it is started per process
+        self._sync_pid = None
+
+    def consume(self, key, capacity, refill):
+        """Take a token; returns ``(allowed, remaining tokens)``"""
+        if self._sync_pid != os.getpid():
+            self._start_sync()
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now, capacity, refill, 0, None]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill)
+                bucket[1] = now
+            allowed = bucket[0] >= 1
+            if allowed:
+                bucket[0] -= 1
+                bucket[4] += 1
+            remaining = bucket[0]
+        return allowed, remaining
+
+    def _start_sync(self):
+        with self._lock:
+            if self._sync_pid == os.getpid():
+                return
+            self._sync_pid = os.getpid()
+        threading.Thread(target=self._sync_loop, name='throttle-sync', daemon=True).start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(settings.THROTTLE_SYNC_INTERVAL)
+            try:
+                self.sync()
+            except Exception:
+                # Buckets stay local until the cache is reachable again
+                logger.exception('Throttle sync failed')
+
+    def sync(self):
+        """Publish local consumption and deduct what the other workers consumed"""
+        now = time.monotonic()
+        with self._lock:
+            # Full buckets that saw no traffic carry no information
+            for key, bucket in list(self._buckets.items()):
+                full_at = bucket[1] + (bucket[2] - bucket[0]) / bucket[3]
+                if not bucket[4] and now > full_at:
+                    del self._buckets[key]
+            pending = [(key, bucket[4]) for key, bucket in self._buckets.items() if bucket[4]]
+            for key, _ in pending:
+                self._buckets[key][4] = 0
+
+        timeout = settings.THROTTLE_SYNC_INTERVAL * 10 + 60
+        for key, consumed in pending:
+            cache_key = f'throttle:consumed:{key}'
+            if cache.add(cache_key, consumed, timeout):
+                total = consumed
+            else:
+                try:
+                    total = cache.incr(cache_key, consumed)
+                except ValueError:
+                    # Evicted between add and incr
+                    cache.set(cache_key, consumed, timeout)
+                    total = consumed
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                previous, bucket[5] = bucket[5], total
+                if previous is not None:
+                    others = total - previous - consumed
+                    if others > 0:
+                        bucket[0] = max(-bucket[2], bucket[0] - others)
+
+
+class CacheBucketStore:
+    """Buckets in the shared Django cache; read-modify-write, so approximate under races"""
+
+    def consume(self, key, capacity, refill):
+        now = time.time()
+        cache_key = f'throttle:bucket:{key}'
+        tokens, updated_at = cache.get(cache_key) or (float(capacity), now)
+        tokens = min(capacity, tokens + (now - updated_at) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(cache_key, (tokens, now), int(capacity / refill) + 1)
+        return allowed, tokens
+
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, role, tier, allowed):
+        with self._lock:
+            self._counts[(role, tier, 'allowed' if allowed else 'throttled')] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        metrics = {}
+        for (role, tier, outcome), value in counts.items():
+            metrics.setdefault(f'{role}.{tier}', {'allowed': 0, 'throttled': 0})[outcome] = value
+        return metrics
+
+
+_metrics = _Metrics()
+_store = None
+_rates = None
+
+
+def throttle_metrics():
+    """``{'<role>.<tier>': {'allowed': n, 'throttled': n}}`` for this process"""
+    return _metrics.snapshot()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.THROTTLE_STORE)()
+    return _store
+
+
+def get_rates():
+    """``{(role, tier): (capacity, refill per second)}``"""
+    global _rates
+    if _rates is None:
+        rates = {
+            (role, tier): rate
+            for role, tiers in settings.THROTTLE_RATES.items() for tier, rate in tiers.items()
+        }
+        rates.update(parse_overrides(settings.THROTTLE_RATE_OVERRIDES))
+        _rates = {key: parse_rate(rate) for key, rate in rates.items()}
+    return _rates
+
+
+def endpoint_tier(request, view):
+    tier = getattr(view, 'throttle_tier', None)
+    if tier:
+        return tier
+    if request.method not in SAFE_METHODS:
+        return 'write'
+    if isinstance(view, ListModelMixin) and not getattr(view, 'kwargs', None):
+        return 'list'
+    return 'read'
+
+
+class RoleTokenBucketThrottle(BaseThrottle):
+    """DRF throttle charging the bucket of the caller's role and endpoint tier"""
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+
+        user = request.user
+        if user and user.is_authenticated:
+            role, ident = user.role, f'u{user.pk}'
+        else:
+            role, ident = 'anon', f'a{self.get_ident(request)}'
+        tier = endpoint_tier(request, view)
+        rate = get_rates().get((role, tier))
+        if rate is None:
+            return True
+
+        capacity, refill = rate
+        allowed, remaining = get_store().consume(f'{ident}:{tier}', capacity, refill)
+        _metrics.record(role, tier, allowed)
+
+        self.refill = refill
+        self.remaining = remaining
+        # Read by ThrottleHeadersMiddleware
+        request._request.throttle_state = {
+            'policy': f'{role}.{tier}',
+            'limit': capacity,
+            'remaining': max(int(remaining), 0),
+            'reset': int((capacity - max(remaining, 0)) / refill + 0.999),
+        }
+        return allowed
+
+    def wait(self):
+        return (1 - self.remaining) / self.refill
+
+
+class ThrottleHeadersMiddleware:
+    """Adds the bucket state of throttled endpoints to the response"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        state = getattr(request, 'throttle_state', None)
+        if state is not None:
+            response['X-RateLimit-Policy'] = state['policy']
+            response['X-RateLimit-Limit'] = str(state['limit'])
+            response['X-RateLimit-Remaining'] = str(state['remaining'])
+            # Seconds until the bucket is full again
+            response['X-RateLimit-Reset'] = str(state['reset'])
+        return response
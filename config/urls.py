@@ -1,29 +1,27 @@
-from django.contrib import admin
-from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from django.urls import path, include, URLResolver
+from django.urls.resolvers import RegexPattern, RoutePattern
 
-# Swagger documentation
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Access Control API",
-        default_version='v1',
-        description="API for testing role-based access control systems",
-        contact=openapi.Contact(email="admin@accesscontrol.com"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
+def lazy_include(pattern, urlconf, namespace=None):
+    """
+    Like ``include()``, but ``urlconf`` is imported on first use: the first
+    matching request or reverse() of one of its URL names
+    """
+    return URLResolver(pattern, urlconf, app_name=namespace, namespace=namespace)
+
+
+# Skipped by config.startup.warm_up
+LAZY_URLCONFS = ('config.admin_urls', 'config.docs_urls')
 
+urlpatterns = [
     # API endpoints
     path('api/auth/', include('apps.users.urls')),
     path('api/', include('apps.resources.urls')),
+    path('api/', include('apps.core.urls')),
+    path('api/', include('apps.jobs.urls')),
+
+    lazy_include(RoutePattern('admin/'), 'config.admin_urls', namespace='admin'),
 
-    # Documentation
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    # Documentation: /swagger/, /redoc/ and /openapi/
+    lazy_include(RegexPattern(r'^(?=swagger/|redoc/|openapi/)'), 'config.docs_urls'),
 ]
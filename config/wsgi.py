@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Pay for URL resolution, serializer setup and lazy imports before the first request
+from config.startup import warm_up  # noqa: E402
+
+warm_up()